@@ -0,0 +1,68 @@
+"""
+Benchmark case-insensitive lookups of nick keys
+
+Compares `KeyFoldDict`, which calls `str.casefold()` on each access, against `CaseMapDict`, which folds
+with the server's CASEMAPPING through a translate table and a cache of recently folded keys.
+
+Usage: python -m benchmarks.bench_casemap
+"""
+import random
+
+from benchmarks.util import report, timed
+from cloudbot.util.casemap import CaseMap, get_casemap
+from cloudbot.util.mapping import CaseMapDict, KeyFoldDict
+
+USER_COUNT = 5000
+LOOKUP_COUNT = 200000
+
+
+def gen_nicks(count, seed=0):
+    rand = random.Random(seed)
+    chars = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ[]\\^_|"
+    return ["".join(rand.choice(chars) for _ in range(rand.randint(4, 12))) + str(i) for i in range(count)]
+
+
+def gen_lookups(nicks, count, seed=1):
+    """
+    Lookups with the skew of channel traffic, where a few users send most of the lines
+    """
+    rand = random.Random(seed)
+    return [nicks[min(int(rand.expovariate(1 / 200)), len(nicks) - 1)] for _ in range(count)]
+
+
+def lookup(data, keys):
+    for key in keys:
+        data.get(key)
+        key in data
+
+
+def fold(func, keys):
+    for key in keys:
+        func(key)
+
+
+def main():
+    nicks = gen_nicks(USER_COUNT)
+    lookups = gen_lookups(nicks, LOOKUP_COUNT)
+    rfc1459 = get_casemap('rfc1459')
+    uncached = CaseMap('rfc1459', cache_size=0)
+    table = rfc1459.table
+
+    print("{} lookups of {} nicks".format(len(lookups), len(nicks)))
+    report("str.casefold", timed(fold, str.casefold, lookups), len(lookups), "key")
+    report("str.translate", timed(fold, lambda key: key.translate(table), lookups), len(lookups), "key")
+    report("CaseMap.fold (no cache)", timed(fold, uncached.fold, lookups), len(lookups), "key")
+    report("CaseMap.fold", timed(fold, rfc1459.fold, lookups), len(lookups), "key")
+
+    for name, data in (
+            ("KeyFoldDict get+contains", KeyFoldDict((nick, None) for nick in nicks)),
+            ("CaseMapDict get+contains", CaseMapDict(((nick, None) for nick in nicks), casemap=rfc1459)),
+    ):
+        report(name, timed(lookup, data, lookups), len(lookups), "key")
+
+    info = rfc1459.fold.cache_info()
+    print("fold cache: {} hits, {} misses".format(info.hits, info.misses))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Measure the memory used by chan_track's user and channel data
+
+Fills the tracking data with synthetic users spread over many channels, as a
+NAMES/WHO sync of a large network would, and reports the memory held per user.
+
+Usage: python -m benchmarks.bench_chan_track [user_count] [channel_count]
+"""
+import gc
+import random
+import sys
+import time
+import tracemalloc
+
+from plugins import chan_track
+from plugins.core.server_info import clear_isupport, handle_prefixes
+
+USER_COUNT = 50000
+CHANNEL_COUNT = 2000
+MAX_CHANNELS_PER_USER = 5
+OP_RATIO = 0.05
+
+
+class MockConn:
+    name = 'bench'
+    server = 'irc.example.com'
+    nick = 'BenchBot'
+
+    def __init__(self):
+        self.memory = {}
+        self.config = {}
+
+
+def gen_members(user_count, channel_count, seed=0):
+    """
+    Generate (channel, nick, ident, host, status) for each membership
+    """
+    rand = random.Random(seed)
+    for i in range(user_count):
+        nick = "User{}".format(i)
+        ident = "~user{}".format(i % 1000)
+        host = "{}.example.com".format(rand.choice(("cloak", "isp", "vpn"))) if i % 3 else \
+            "user{}.example.com".format(i)
+        for chan in rand.sample(range(channel_count), rand.randint(1, MAX_CHANNELS_PER_USER)):
+            yield "#chan{}".format(chan), nick, ident, host, rand.random() < OP_RATIO
+
+
+def fill(conn, members):
+    statuses = conn.memory["server_info"]["statuses"]
+    op_status = [statuses['@']]
+    chans = chan_track.get_chans(conn)
+    for chan, nick, ident, host, is_op in members:
+        chan_track.update_member(conn, chans.getchan(chan), nick, op_status if is_op else [], ident=ident, host=host)
+
+
+def main(args):
+    user_count = int(args[0]) if args else USER_COUNT
+    channel_count = int(args[1]) if len(args) > 1 else CHANNEL_COUNT
+
+    conn = MockConn()
+    clear_isupport(conn)
+    handle_prefixes('(ov)@+', conn.memory["server_info"])
+    members = list(gen_members(user_count, channel_count))
+
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    fill(conn, members)
+    duration = time.perf_counter() - start
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print("{} users, {} channels, {} memberships".format(user_count, channel_count, len(members)))
+    print("{:<40} {:>10.1f} MiB total {:>10.0f} bytes/user".format("memory", size / 2 ** 20, size / user_count))
+    print("{:<40} {:>10.3f} s".format("fill time (traced)", duration))
+
+    start = time.perf_counter()
+    checks = 0
+    for chan, nick, _, _, _ in members[:100000]:
+        chan_track.perm_check(chan, conn, nick)
+        checks += 1
+
+    duration = time.perf_counter() - start
+    print("{:<40} {:>10.3f} us/check".format("perm_check", duration * 1e6 / checks))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,54 @@
+"""
+Benchmark resolution of abbreviated or unknown commands against the registered aliases
+
+Usage: python -m benchmarks.bench_command_prefix
+"""
+import random
+
+from benchmarks.util import report, timed
+from cloudbot.util.mapping import PrefixDict
+
+ALIAS_COUNT = 1500
+LOOKUP_COUNT = 20000
+
+
+def gen_aliases(count, seed=0):
+    rand = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    aliases = set()
+    while len(aliases) < count:
+        aliases.add("".join(rand.choice(letters) for _ in range(rand.randint(2, 10))))
+
+    return sorted(aliases)
+
+
+def linear_scan(commands, lookups):
+    for name in lookups:
+        [(alias, hook) for alias, hook in commands.items() if alias.startswith(name)]
+
+
+def indexed(commands, lookups):
+    for name in lookups:
+        commands.startswith(name)
+
+
+def main():
+    aliases = gen_aliases(ALIAS_COUNT)
+    plain = {alias: object() for alias in aliases}
+    index = PrefixDict(plain)
+
+    rand = random.Random(1)
+    # Mostly misses, as with chat that happens to start with the command prefix, plus some abbreviations
+    lookups = [rand.choice(aliases)[:rand.randint(1, 4)] if rand.random() < 0.2 else "xq" + str(i)
+               for i in range(LOOKUP_COUNT)]
+
+    assert [sorted(a for a in plain if a.startswith(n)) for n in lookups[:500]] == \
+        [[a for a, _ in index.startswith(n)] for n in lookups[:500]]
+
+    print("Resolving {} prefixes against {} aliases".format(len(lookups), len(aliases)))
+    report("dict scan", timed(linear_scan, plain, lookups, repeat=3), len(lookups), "lookup")
+    report("PrefixDict.startswith", timed(indexed, index, lookups, repeat=3), len(lookups), "lookup")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark decoding of incoming IRC lines with mixed encodings
+
+Usage: python -m benchmarks.bench_decoding [capture_file]
+"""
+import random
+import sys
+
+from benchmarks.util import gen_channel_log, load_capture, report, timed
+from cloudbot.util.decoding import DECODERS
+
+LINE_COUNT = 100000
+
+MIXES = {
+    # Roughly the mix seen on a large network: mostly ASCII, some UTF-8, and a few legacy clients
+    'utf-8 network': (
+        (0.85, 'ascii', ""),
+        (0.10, 'utf-8', " caf\xe9 \u2603 \xfcber"),
+        (0.03, 'iso-8859-1', " caf\xe9 \xfcber"),
+        (0.02, 'cp1252', " caf\xe9 \u20ac"),
+    ),
+    # A network where most clients still send latin-1
+    'latin-1 network': (
+        (0.50, 'ascii', ""),
+        (0.10, 'utf-8', " caf\xe9 \u2603 \xfcber"),
+        (0.40, 'iso-8859-1', " caf\xe9 \xfcber"),
+    ),
+}
+
+
+def gen_lines(count, mix, seed=0):
+    rand = random.Random(seed)
+    for line in gen_channel_log(count, seed):
+        value = rand.random()
+        for weight, codec, extra in mix:
+            if value < weight:
+                break
+
+            value -= weight
+
+        yield (line + extra).encode(codec)
+
+
+def decode(bytestring):
+    """
+    The previous `cloudbot.clients.irc.decode`, which now uses the default decoder
+    """
+    for codec in ('utf-8', 'iso-8859-1', 'shift_jis', 'cp1252'):
+        try:
+            return bytestring.decode(codec)
+        except UnicodeDecodeError:
+            continue
+    return bytestring.decode('utf-8', errors='ignore')
+
+
+def decode_legacy(lines):
+    for line in lines:
+        decode(line)
+
+
+def decode_with(decoder):
+    def _decode(lines):
+        for line in lines:
+            decoder.decode(line)
+
+    return _decode
+
+
+def main(args):
+    if args:
+        run(args[0], load_capture(args[0]))
+    else:
+        for name, mix in sorted(MIXES.items()):
+            run(name, list(gen_lines(LINE_COUNT, mix)))
+
+
+def run(name, lines):
+    print("Decoding {} lines ({})".format(len(lines), name))
+    report("irc.decode", timed(decode_legacy, lines), len(lines))
+    for strategy, decoder_type in sorted(DECODERS.items()):
+        for fallbacks in (('iso-8859-1',), ('cp1252', 'iso-8859-1')):
+            decoder = decoder_type(fallbacks)
+            if fallbacks == ('iso-8859-1',):
+                # The default fallbacks must match the legacy decoder exactly
+                assert [decoder.decode(line) for line in lines] == [decode(line) for line in lines]
+
+            duration = timed(decode_with(decoder), lines)
+            report("{} {}".format(strategy, ','.join(fallbacks)), duration, len(lines))
+
+            # Count a single pass
+            decoder.stats.clear()
+            decode_with(decoder)(lines)
+            print("    " + ", ".join("{}={}".format(k, v) for k, v in sorted(decoder.stats.items())))
+
+    print()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,89 @@
+"""
+Measure allocations made while creating the per-hook events in `CloudBot.process()`
+
+Reports the bytes, allocated blocks and live objects per line, as well as throughput
+measured separately without tracing.
+
+Usage: python -m benchmarks.bench_event_alloc [capture_file]
+"""
+import asyncio
+import gc
+import sys
+import time
+import tracemalloc
+
+from benchmarks.bench_process import MockConn, PRIVMSG_RE, make_bot, make_events, make_hook, run_process
+from benchmarks.util import gen_channel_log, load_capture
+from cloudbot.event import EventType
+
+LINE_COUNT = 5000
+HOOKS_PER_TYPE = 5
+
+
+class RecordingBot:
+    """
+    Wraps the benchmark bot to keep every launched event alive, so tracemalloc sees them
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.events = []
+        bot.plugin_manager.launch = self.launch
+
+    async def launch(self, hook, event):
+        self.events.append(event)
+
+
+def register_hooks(bot, count):
+    manager = bot.plugin_manager
+    for _ in range(count):
+        manager.catch_all_triggers.append(make_hook(threaded=False))
+        manager.raw_triggers.setdefault('PRIVMSG', []).append(make_hook())
+        manager.event_type_hooks.setdefault(EventType.message, []).append(make_hook())
+
+
+def main(args):
+    if args:
+        lines = [line.decode() for line in load_capture(args[0])]
+        lines = [line for line in lines if PRIVMSG_RE.match(line)]
+    else:
+        lines = list(gen_channel_log(LINE_COUNT))
+
+    loop = asyncio.get_event_loop()
+    bot = make_bot(loop)
+    register_hooks(bot, HOOKS_PER_TYPE)
+    recorder = RecordingBot(bot)
+    events = list(make_events(bot, MockConn(), lines))
+
+    # Warm up caches, so only per-line allocations are counted
+    run_process(bot, events[:100])
+    recorder.events.clear()
+
+    gc.collect()
+    objects_before = len(gc.get_objects())
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    run_process(bot, events)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    gc.collect()
+    objects = len(gc.get_objects()) - objects_before
+
+    recorder.events.clear()
+    start = time.perf_counter()
+    run_process(bot, events)
+    duration = time.perf_counter() - start
+
+    stats = after.compare_to(before, 'filename')
+    size = sum(stat.size_diff for stat in stats)
+    count = sum(stat.count_diff for stat in stats)
+
+    print("Processed {} messages, launching {} hook events".format(len(events), len(recorder.events)))
+    print("{:>10.1f} bytes/line {:>8.1f} blocks/line {:>8.1f} objects/line {:>8.1f} bytes/event".format(
+        size / len(events), count / len(events), objects / len(events), size / len(recorder.events)
+    ))
+    print("{:>10.0f} msgs/sec".format(len(events) / duration))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,98 @@
+"""
+Benchmark ignore checks, as run by the ignore sieve for every command and regex hook
+
+Compares the previous scan of every ignore entry with `match_mask` against the indexed
+ignores, with and without the result cache.
+
+Usage: python -m benchmarks.bench_ignore
+"""
+import random
+
+from irclib.util.compare import match_mask
+
+from benchmarks.util import report, timed
+from cloudbot.util.casemap import get_casemap
+from plugins.ignore import IgnoreIndex
+
+CONN_COUNT = 3
+CHANNEL_COUNT = 50
+IGNORE_COUNT = 500
+GLOBAL_RATIO = 0.1
+CHECK_COUNT = 20000
+
+
+def gen_ignores(count, seed=0):
+    rand = random.Random(seed)
+    for i in range(count):
+        conn = "net{}".format(rand.randrange(CONN_COUNT))
+        chan = "*" if rand.random() < GLOBAL_RATIO else "#chan{}".format(rand.randrange(CHANNEL_COUNT))
+        if rand.random() < 0.5:
+            mask = "*!*@spammer{}.example.com".format(i)
+        else:
+            mask = "Spammer{}!*@*".format(i)
+
+        yield conn, chan, mask
+
+
+def gen_checks(count, seed=1, skewed=True):
+    """
+    Generate checks from senders across all channels, skewed towards a few active users in each as with normal
+    chat, or spread evenly over all users, which defeats the result cache
+    """
+    rand = random.Random(seed)
+    for _ in range(count):
+        user = min(int(rand.expovariate(1 / 10)), 499) if skewed else rand.randrange(500)
+        yield "net{}".format(rand.randrange(CONN_COUNT)), "#chan{}".format(rand.randrange(CHANNEL_COUNT)), \
+            "Nick{}!user{}@host{}.example.com".format(user, user, user)
+
+
+def linear_is_ignored(ignores, conn, chan, mask):
+    mask_cf = mask.casefold()
+    for _conn, _chan, _mask in ignores:
+        _mask_cf = _mask.casefold()
+        if _chan == "*":
+            if match_mask(mask_cf, _mask_cf):
+                return True
+        else:
+            if (conn, chan) != (_conn, _chan):
+                continue
+            if match_mask(mask_cf, _mask_cf):
+                return True
+
+    return False
+
+
+def linear(ignores, checks):
+    for conn, chan, mask in checks:
+        linear_is_ignored(ignores, conn, chan, mask)
+
+
+def indexed(index, checks):
+    casemap = get_casemap()
+    for conn, chan, mask in checks:
+        index._is_ignored(conn, chan, mask, casemap)
+
+
+def cached(index, checks):
+    for conn, chan, mask in checks:
+        index.is_ignored(conn, chan, mask)
+
+
+def main():
+    ignores = list(gen_ignores(IGNORE_COUNT))
+    index = IgnoreIndex()
+    index.load(ignores)
+
+    for name, skewed in (("chat-like senders", True), ("uniform senders", False)):
+        checks = list(gen_checks(CHECK_COUNT, skewed=skewed))
+        assert [linear_is_ignored(ignores, *check) for check in checks[:500]] == \
+            [index.is_ignored(*check) for check in checks[:500]]
+
+        print("{} checks against {} ignores, {}".format(len(checks), len(ignores), name))
+        report("match_mask per ignore", timed(linear, ignores, checks, repeat=1), len(checks), "check")
+        report("IgnoreIndex", timed(indexed, index, checks), len(checks), "check")
+        report("IgnoreIndex + LRU", timed(cached, index, checks), len(checks), "check")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark framing of a large burst of IRC lines, as seen during a netsplit rejoin or a large WHO reply
+
+Usage: python -m benchmarks.bench_line_framer [capture_file]
+"""
+import sys
+
+from benchmarks.util import gen_who_burst, load_capture, report, timed
+from cloudbot.clients.irc import DEFAULT_MAX_INPUT_LINE
+from cloudbot.util.framing import LineFramer
+
+LINE_COUNT = 50000
+CHUNK_SIZE = 16384
+
+
+def split_buffer(chunks):
+    """
+    The previous implementation, splitting an immutable bytes buffer
+    """
+    buffer = b""
+    count = 0
+    for data in chunks:
+        buffer += data
+        while b"\r\n" in buffer:
+            _, buffer = buffer.split(b"\r\n", 1)
+            count += 1
+
+    return count
+
+
+def frame_lines(chunks):
+    framer = LineFramer(DEFAULT_MAX_INPUT_LINE)
+    count = 0
+    for data in chunks:
+        count += len(framer.feed(data))
+
+    return count
+
+
+def make_chunks(lines):
+    data = b"".join(line + b"\r\n" for line in lines)
+    return [data[i:i + CHUNK_SIZE] for i in range(0, len(data), CHUNK_SIZE)]
+
+
+def main(args):
+    if args:
+        lines = load_capture(args[0])
+    else:
+        lines = [line.encode() for line in gen_who_burst(LINE_COUNT)]
+
+    # Simulate the whole burst arriving at once, and in socket-sized reads
+    burst = [b"".join(line + b"\r\n" for line in lines)]
+    chunks = make_chunks(lines)
+
+    assert split_buffer(chunks) == frame_lines(chunks) == len(lines)
+
+    print("Framing {} lines ({} bytes)".format(len(lines), len(burst[0])))
+    report("bytes.split, chunked", timed(split_buffer, chunks), len(lines))
+    report("LineFramer, chunked", timed(frame_lines, chunks), len(lines))
+    report("bytes.split, single read", timed(split_buffer, burst, repeat=1), len(lines))
+    report("LineFramer, single read", timed(frame_lines, burst, repeat=1), len(lines))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
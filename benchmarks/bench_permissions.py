@@ -0,0 +1,86 @@
+"""
+Benchmark permission checks against a large permissions config
+
+Compares matching each allowed mask with `match_mask`, as PermissionManager used to, against the
+compiled mask index, with and without the result cache.
+
+Usage: python -m benchmarks.bench_permissions
+"""
+import random
+
+from irclib.util.compare import match_mask
+
+from benchmarks.util import report, timed
+from cloudbot.permissions import PermissionManager
+
+GROUP_COUNT = 20
+MASKS_PER_GROUP = 25
+CHECK_COUNT = 20000
+
+
+class MockConn:
+    name = 'bench'
+
+    def __init__(self, config):
+        self.config = config
+
+
+def gen_config(seed=0):
+    rand = random.Random(seed)
+    perms = ["perm{}".format(i) for i in range(10)] + ["botcontrol", "chanop"]
+    groups = {}
+    for i in range(GROUP_COUNT):
+        users = []
+        for j in range(MASKS_PER_GROUP):
+            if rand.random() < 0.5:
+                users.append("*!*@user{}-{}.example.com".format(i, j))
+            else:
+                users.append("nick{}-{}!ident@host{}.example.com".format(i, j, j))
+
+        groups["group{}".format(i)] = {'users': users, 'perms': rand.sample(perms, 3)}
+
+    return {'permissions': groups}, perms
+
+
+def gen_checks(perms, count, seed=1):
+    rand = random.Random(seed)
+    # Most checks come from a few active users, most of whom have no permissions
+    users = ["nick{}!ident@host{}.example.com".format(i, i) for i in range(50)] + \
+            ["nick{}-{}!ident@host{}.example.com".format(i % GROUP_COUNT, i, i) for i in range(10)]
+    return [(rand.choice(users), rand.choice(perms)) for _ in range(count)]
+
+
+def linear(manager, checks):
+    for mask, perm in checks:
+        mask = mask.lower()
+        for allowed_mask in manager.perm_users.get(perm, ()):
+            if match_mask(mask, allowed_mask):
+                break
+
+
+def indexed(manager, checks):
+    for mask, perm in checks:
+        manager._has_perm_mask(mask.lower(), perm)
+
+
+def cached(manager, checks):
+    for mask, perm in checks:
+        manager.has_perm_mask(mask, perm, notice=False)
+
+
+def main():
+    config, perms = gen_config()
+    manager = PermissionManager(MockConn(config))
+    checks = gen_checks(perms, CHECK_COUNT)
+
+    assert [any(match_mask(m.lower(), a) for a in manager.perm_users.get(p, ())) for m, p in checks[:1000]] == \
+        [manager.has_perm_mask(m, p, notice=False) for m, p in checks[:1000]]
+
+    print("{} checks against {} groups of {} masks".format(len(checks), GROUP_COUNT, MASKS_PER_GROUP))
+    report("match_mask per allowed mask", timed(linear, manager, checks, repeat=3), len(checks), "check")
+    report("MaskIndex", timed(indexed, manager, checks), len(checks), "check")
+    report("MaskIndex + LRU", timed(cached, manager, checks), len(checks), "check")
+
+
+if __name__ == '__main__':
+    main()
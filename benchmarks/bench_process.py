@@ -0,0 +1,133 @@
+"""
+Benchmark throughput of channel messages through `CloudBot.process()`
+
+Hooks are registered but never run, so this measures the cost of dispatch alone.
+
+Usage: python -m benchmarks.bench_process [capture_file]
+"""
+import asyncio
+import re
+import sys
+import time
+from types import SimpleNamespace
+
+import cloudbot.bot
+from benchmarks.util import WORDS, gen_channel_log, load_capture
+from cloudbot.bot import CloudBot, CommandMatch, _build_cmd_regex
+from cloudbot.event import Event, EventType
+from cloudbot.hook import Action
+from cloudbot.plugin import PluginManager
+
+LINE_COUNT = 50000
+
+PRIVMSG_RE = re.compile(r"^:(?P<nick>[^!]+)!(?P<user>[^@]+)@(?P<host>\S+) PRIVMSG (?P<chan>\S+) :(?P<content>.*)$")
+
+
+class MockConn:
+    type = 'irc'
+    name = 'bench'
+
+    def __init__(self, nick='BenchBot', config=None):
+        self.nick = nick
+        self.config = config or {'command_prefix': '.'}
+        self.cmd_matcher = None
+
+
+class MockBot:
+    def __init__(self, loop):
+        self.loop = loop
+        self.config = {}
+        self.plugin_manager = PluginManager(self)
+        self.plugin_manager.launch = self.launch
+        self.launched = 0
+
+    async def launch(self, hook, event):
+        self.launched += 1
+
+
+class LegacyMatcher:
+    """
+    Rebuilds the command regex for every message, as `process()` used to
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def match(self, content, is_pm=False):
+        command_prefix = self.conn.config.get('command_prefix', '.')
+        cmd_match = _build_cmd_regex(command_prefix, self.conn.nick, is_pm).match(content)
+        if not cmd_match:
+            return None
+
+        return CommandMatch(
+            cmd_match.group('prefix') or command_prefix[0],
+            cmd_match.group('command').lower(),
+            cmd_match.group('text').strip(),
+        )
+
+
+def make_hook(threaded=True):
+    return SimpleNamespace(clients=[], action=Action.CONTINUE, doc=None, threaded=threaded)
+
+
+def make_bot(loop, command_count=400):
+    bot = MockBot(loop)
+    commands = bot.plugin_manager.commands
+    for word in WORDS[:8]:
+        commands[word] = make_hook()
+
+    for i in range(command_count - len(commands)):
+        commands["cmd{}".format(i)] = make_hook()
+
+    return bot
+
+
+def make_events(bot, conn, lines):
+    for line in lines:
+        match = PRIVMSG_RE.match(line)
+        yield Event(
+            bot=bot, conn=conn, event_type=EventType.message, content=match.group('content'),
+            channel=match.group('chan'), nick=match.group('nick'), user=match.group('user'),
+            host=match.group('host'), irc_raw=line, irc_command='PRIVMSG',
+        )
+
+
+def run_process(bot, events):
+    async def _run():
+        for event in events:
+            await CloudBot.process(bot, event)
+
+    start = time.perf_counter()
+    bot.loop.run_until_complete(_run())
+    return time.perf_counter() - start
+
+
+def main(args):
+    if args:
+        lines = [line.decode() for line in load_capture(args[0])]
+        lines = [line for line in lines if PRIVMSG_RE.match(line)]
+    else:
+        lines = list(gen_channel_log(LINE_COUNT))
+
+    loop = asyncio.get_event_loop()
+    bot = make_bot(loop)
+    conn = MockConn()
+    events = list(make_events(bot, conn, lines))
+
+    print("Processing {} messages".format(len(events)))
+
+    get_cmd_matcher = cloudbot.bot.get_cmd_matcher
+    for name, matcher_factory in (("get_cmd_regex per message", LegacyMatcher), ("CommandMatcher", get_cmd_matcher)):
+        cloudbot.bot.get_cmd_matcher = matcher_factory
+        try:
+            duration = min(run_process(bot, events) for _ in range(3))
+            bot.launched = 0
+            run_process(bot, events)
+        finally:
+            cloudbot.bot.get_cmd_matcher = get_cmd_matcher
+
+        print("{:<40} {:>10.0f} msgs/sec ({} hooks launched)".format(name, len(events) / duration, bot.launched))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
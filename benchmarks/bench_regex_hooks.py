@@ -0,0 +1,101 @@
+"""
+Benchmark regex hook dispatch with many registered regex hooks
+
+Usage: python -m benchmarks.bench_regex_hooks [capture_file]
+"""
+import random
+import re
+import sys
+from types import SimpleNamespace
+
+from benchmarks.util import PRIVMSG, gen_text, load_capture, report, timed
+from cloudbot.util.regex_dispatch import RegexDispatcher
+
+HOOK_COUNT = 200
+LINE_COUNT = 20000
+
+SITES = (
+    "youtube.com", "youtu.be", "twitter.com", "reddit.com", "github.com", "gitlab.com", "imgur.com",
+    "twitch.tv", "soundcloud.com", "spotify.com", "wikipedia.org", "amazon.com", "ebay.com", "steamcommunity.com",
+    "store.steampowered.com", "vimeo.com", "dailymotion.com", "instagram.com", "facebook.com", "tumblr.com",
+    "pastebin.com", "gist.github.com", "stackoverflow.com", "news.ycombinator.com", "bbc.co.uk", "cnn.com",
+    "nytimes.com", "imdb.com", "goodreads.com", "etsy.com", "bandcamp.com", "mixcloud.com", "xkcd.com",
+    "npmjs.com", "pypi.org", "crates.io", "docs.python.org", "arxiv.org", "medium.com", "vine.co",
+)
+
+
+def gen_patterns(count, seed=0):
+    rand = random.Random(seed)
+    patterns = [
+        (r"(\w+)\+\+", 0),
+        (r"^s/(.+?)/(.*?)/?$", 0),
+        (r"\br/(\w+)", re.I),
+        (r"^(hi|hello|hey)\W", re.I),
+    ]
+    while len(patterns) < count:
+        site = rand.choice(SITES)
+        path = rand.choice(("", "/watch", "/r/", "/status/", "/item", "/p/", "/user/", "/wiki/"))
+        patterns.append((
+            r"(?:https?://)?(?:www\.)?" + re.escape(site + path) + r"([\w/?=&-]*)",
+            rand.choice((0, re.I)),
+        ))
+
+    return patterns
+
+
+def gen_lines(count, seed=0, url_ratio=0.05):
+    rand = random.Random(seed)
+    for _ in range(count):
+        text = gen_text(rand)
+        if rand.random() < url_ratio:
+            text += " https://www.{}/watch?v={}".format(rand.choice(SITES), rand.randrange(1 << 30))
+
+        yield PRIVMSG.format(user=rand.randrange(500), chan=rand.randrange(50), text=text).split(' :', 1)[1]
+
+
+def dispatch(regex_hooks, contents):
+    """
+    The regex section of `CloudBot.process`
+    """
+    matched = []
+    for content in contents:
+        regex_matched = False
+        for regex, regex_hook in regex_hooks(content):
+            if regex_hook.only_no_match and regex_matched:
+                continue
+
+            regex_match = regex.search(content)
+            if regex_match:
+                regex_matched = True
+                matched.append(regex_hook)
+
+    return matched
+
+
+def main(args):
+    if args:
+        contents = [line.decode(errors='replace').split(' :', 1)[-1] for line in load_capture(args[0])]
+    else:
+        contents = list(gen_lines(LINE_COUNT))
+
+    patterns = gen_patterns(HOOK_COUNT)
+    regex_hooks = [
+        (re.compile(pattern, flags), SimpleNamespace(only_no_match=i % 10 == 0))
+        for i, (pattern, flags) in enumerate(patterns)
+    ]
+    dispatcher = RegexDispatcher(regex_hooks)
+
+    def search_all(_):
+        return regex_hooks
+
+    assert dispatch(search_all, contents) == dispatch(dispatcher.candidates, contents)
+
+    print("Dispatching {} messages to {} regex hooks ({} prefiltered)".format(
+        len(contents), len(regex_hooks), dispatcher.filtered_count
+    ))
+    report("search every regex", timed(dispatch, search_all, contents, repeat=3), len(contents), "msg")
+    report("RegexDispatcher", timed(dispatch, dispatcher.candidates, contents, repeat=3), len(contents), "msg")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,99 @@
+"""
+Benchmark throughput of outgoing lines through `_IrcProtocol.send()` and the core irc_out hooks
+
+Compares running the synchronous out hooks inline against launching each one as a task in a thread.
+
+Usage: python -m benchmarks.bench_send
+"""
+import asyncio
+import random
+import time
+from operator import attrgetter
+
+from benchmarks.util import gen_text
+from cloudbot.clients.irc import _IrcProtocol
+from cloudbot.plugin import Plugin, PluginManager
+from plugins.core import core_out
+
+LINE_COUNT = 20000
+
+
+class MockTransport:
+    def __init__(self):
+        self.written = 0
+
+    def write(self, data):
+        self.written += 1
+
+
+class MockBot:
+    def __init__(self, loop):
+        self.loop = loop
+        self.config = {}
+        self.plugin_manager = PluginManager(self)
+
+
+class MockConn:
+    name = 'bench'
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.loop = bot.loop
+        self.config = {'connection': {}}
+        self.lines_out = 0
+
+
+def gen_out_lines(count, seed=0, cmd_ratio=0.05):
+    rand = random.Random(seed)
+    for _ in range(count):
+        text = gen_text(rand)
+        if rand.random() < cmd_ratio:
+            text = "." + text
+
+        yield "PRIVMSG #chan{} :{}".format(rand.randrange(50), text)
+
+
+def make_proto(loop):
+    bot = MockBot(loop)
+    plugin = Plugin(core_out.__file__, 'core_out.py', 'core.core_out', core_out)
+    bot.plugin_manager.out_sieves.extend(sorted(plugin.hooks['irc_out'], key=attrgetter('priority')))
+
+    proto = _IrcProtocol(MockConn(bot))
+    proto.connection_made(MockTransport())
+    return bot, proto
+
+
+def run_send(proto, lines):
+    async def _run():
+        for line in lines:
+            await proto.send(line, log=False)
+
+    start = time.perf_counter()
+    proto.loop.run_until_complete(_run())
+    return time.perf_counter() - start
+
+
+def main():
+    lines = list(gen_out_lines(LINE_COUNT))
+    loop = asyncio.get_event_loop()
+    bot, proto = make_proto(loop)
+    out_sieves = bot.plugin_manager.out_sieves
+
+    print("Sending {} lines through {} out hooks".format(len(lines), len(out_sieves)))
+
+    for name, inline in (("task per hook", False), ("inline", True)):
+        for out_sieve in out_sieves:
+            out_sieve.inline = inline
+
+        duration = min(run_send(proto, lines) for _ in range(3))
+        proto._transport.written = 0
+        run_send(proto, lines)
+        print("{:<40} {:>10.0f} lines/sec {:>8} writes".format(
+            name, len(lines) / duration, proto._transport.written
+        ))
+
+    bot.plugin_manager.executors.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Shared helpers for the benchmark scripts
+"""
+import random
+import time
+
+WHO_REPLY = ":irc.example.net 352 MyBot #chan{chan} user{user} host{user}.example.com irc.example.net " \
+            "Nick{user} H :0 Real Name {user}"
+
+PRIVMSG = ":Nick{user}!user{user}@host{user}.example.com PRIVMSG #chan{chan} :{text}"
+
+WORDS = (
+    "the", "quick", "brown", "fox", "jumps", "over", "lazy", "dog", "lol", "what", "is", "going", "on", "here",
+    "http://example.com/foo", "ok", "thanks", "anyone", "know", "how", "to", "fix", "this", "error",
+)
+
+
+def gen_text(rand, min_words=1, max_words=15):
+    return " ".join(rand.choice(WORDS) for _ in range(rand.randint(min_words, max_words)))
+
+
+def gen_who_burst(count, seed=0):
+    """
+    Generate `count` lines resembling the server's response to a large WHO request
+    """
+    rand = random.Random(seed)
+    for i in range(count):
+        yield WHO_REPLY.format(chan=rand.randrange(50), user=i)
+
+
+def gen_channel_log(count, seed=0, cmd_ratio=0.05, prefix='.'):
+    """
+    Generate `count` PRIVMSG lines resembling normal channel traffic,
+    `cmd_ratio` of which will be bot commands
+    """
+    rand = random.Random(seed)
+    for _ in range(count):
+        text = gen_text(rand)
+        if rand.random() < cmd_ratio:
+            text = prefix + rand.choice(WORDS[:8]) + " " + text
+
+        yield PRIVMSG.format(user=rand.randrange(500), chan=rand.randrange(50), text=text)
+
+
+def load_capture(path):
+    """
+    Load a raw traffic capture, one IRC line per line of the file
+    """
+    with open(path, 'rb') as f:
+        return [line.rstrip(b"\r\n") for line in f]
+
+
+def timed(func, *args, repeat=5):
+    """
+    Run `func` `repeat` times and return the best wall-clock time
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        duration = time.perf_counter() - start
+        if best is None or duration < best:
+            best = duration
+
+    return best
+
+
+def report(name, duration, count, unit="line"):
+    print("{:<40} {:>10.3f} ms total {:>10.3f} us/{}".format(
+        name, duration * 1000, duration * 1e6 / count, unit
+    ))
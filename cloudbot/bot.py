@@ -20,6 +20,7 @@ from cloudbot.client import Client
 from cloudbot.config import Config
 from cloudbot.event import Event, CommandEvent, RegexEvent, EventType
 from cloudbot.hook import Action
+from cloudbot.metrics import MetricsServer
 from cloudbot.plugin import PluginManager
 from cloudbot.reloader import PluginReloader, ConfigReloader
 from cloudbot.util import database, formatting, async_util
@@ -61,11 +62,9 @@ def clean_name(n):
     return re.sub('[^A-Za-z0-9_]+', '', n.replace(" ", "_"))
 
 
-def get_cmd_regex(event):
-    conn = event.conn
-    is_pm = event.chan.lower() == event.nick.lower()
-    command_prefix = re.escape(conn.config.get('command_prefix', '.'))
-    conn_nick = re.escape(event.conn.nick)
+def _build_cmd_regex(command_prefix, conn_nick, is_pm):
+    command_prefix = re.escape(command_prefix)
+    conn_nick = re.escape(conn_nick)
     cmd_re = re.compile(
         r"""
         ^
@@ -84,6 +83,108 @@ def get_cmd_regex(event):
     return cmd_re
 
 
+def get_cmd_regex(event):
+    conn = event.conn
+    is_pm = event.chan.lower() == event.nick.lower()
+    return _build_cmd_regex(conn.config.get('command_prefix', '.'), conn.nick, is_pm)
+
+
+CommandMatch = collections.namedtuple('CommandMatch', 'prefix command text')
+
+
+class CommandMatcher:
+    """
+    Matches command invocations for a single connection prefix and nick
+
+    Messages starting with the command prefix are matched without a regex where possible,
+    anything the fast path can't decide is passed to the same regex `get_cmd_regex` builds.
+
+    >>> matcher = CommandMatcher('.', 'Bot')
+    >>> matcher.match('.Foo  bar baz ')
+    CommandMatch(prefix='.', command='foo', text='bar baz')
+    >>> matcher.match('bot: foo')
+    CommandMatch(prefix='.', command='foo', text='')
+    >>> matcher.match('foo bar') is None
+    True
+    >>> matcher.match('foo bar', is_pm=True)
+    CommandMatch(prefix='.', command='foo', text='bar')
+
+    :type command_prefix: str
+    :type nick: str
+    """
+
+    def __init__(self, command_prefix, nick):
+        self.command_prefix = command_prefix
+        self.nick = nick
+
+        self._chan_re = _build_cmd_regex(command_prefix, nick, False)
+        self._pm_re = _build_cmd_regex(command_prefix, nick, True)
+
+        self._prefix_chars = frozenset(command_prefix)
+        # If the nick starts with a prefix character, the regex has to decide which alternative matches
+        self._fast_path = bool(nick) and nick[0] not in self._prefix_chars and nick[0] < '\x80'
+
+        # Channel messages starting with anything else can never match
+        first_chars = set()
+        for char in command_prefix + nick[:1]:
+            first_chars.update((char.lower(), char.upper(), char.casefold()))
+
+        self._first_chars = frozenset(first_chars)
+
+    def is_valid_for(self, command_prefix, nick):
+        """
+        Check whether this matcher was built for the given prefix and nick
+        :type command_prefix: str
+        :type nick: str
+        :rtype: bool
+        """
+        return self.command_prefix == command_prefix and self.nick == nick
+
+    def match(self, content, is_pm=False):
+        """
+        :type content: str
+        :type is_pm: bool
+        :rtype: CommandMatch | None
+        """
+        if self._fast_path and content and '\n' not in content:
+            first = content[0]
+            if first in self._prefix_chars:
+                rest = content[1:]
+                if rest and not rest[0].isspace():
+                    parts = rest.split(None, 1)
+                    command = parts[0]
+                    if command.isalnum():
+                        text = parts[1].strip() if len(parts) > 1 else ''
+                        return CommandMatch(first, command.lower(), text)
+            elif not is_pm and first < '\x80' and first not in self._first_chars:
+                return None
+
+        cmd_match = (self._pm_re if is_pm else self._chan_re).match(content)
+        if not cmd_match:
+            return None
+
+        return CommandMatch(
+            cmd_match.group('prefix') or self.command_prefix[0],
+            cmd_match.group('command').lower(),
+            cmd_match.group('text').strip(),
+        )
+
+
+def get_cmd_matcher(conn):
+    """
+    Get the command matcher for a connection, rebuilding it if the nick or command prefix has changed
+
+    :type conn: cloudbot.client.Client
+    :rtype: CommandMatcher
+    """
+    command_prefix = conn.config.get('command_prefix', '.')
+    matcher = conn.cmd_matcher
+    if matcher is None or not matcher.is_valid_for(command_prefix, conn.nick):
+        conn.cmd_matcher = matcher = CommandMatcher(command_prefix, conn.nick)
+
+    return matcher
+
+
 class CloudBot:
     """
     :type start_time: float
@@ -169,6 +270,8 @@ class CloudBot:
 
         self.observer = Observer()
 
+        self.metrics_server = MetricsServer.from_config(self, self.config.get("metrics", {}))
+
         if self.plugin_reloading_enabled:
             self.plugin_reloader = PluginReloader(self)
 
@@ -191,6 +294,7 @@ class CloudBot:
         restart = self.loop.run_until_complete(self.stopped_future)
         logger.debug("Waiting for plugin unload")
         self.loop.run_until_complete(self.plugin_manager.unload_all())
+        self.plugin_manager.executors.shutdown(wait=False)
         logger.debug("Unload complete")
         self.loop.close()
         return restart
@@ -229,6 +333,10 @@ class CloudBot:
 
         self.observer.stop()
 
+        if self.metrics_server is not None:
+            logger.debug("Stopping metrics server.")
+            self.metrics_server.stop()
+
         logger.debug("Stopping connect loops and shutting down clients")
         for connection in self.connections.values():
             connection.active = False
@@ -281,6 +389,12 @@ class CloudBot:
 
         self.observer.start()
 
+        if self.metrics_server is not None:
+            try:
+                await self.metrics_server.start()
+            except OSError:
+                logger.exception("Unable to start metrics server")
+
         for conn in self.connections.values():
             conn.active = True
 
@@ -354,13 +468,11 @@ class CloudBot:
 
         if event.type is EventType.message:
             # Commands
-            cmd_match = get_cmd_regex(event).match(event.content)
+            is_pm = event.chan.lower() == event.nick.lower()
+            cmd_match = get_cmd_matcher(event.conn).match(event.content, is_pm)
 
             if cmd_match:
-                command_prefix = event.conn.config.get('command_prefix', '.')
-                prefix = cmd_match.group('prefix') or command_prefix[0]
-                command = cmd_match.group('command').lower()
-                text = cmd_match.group('text').strip()
+                prefix, command, text = cmd_match
                 cmd_event = partial(
                     CommandEvent, text=text, triggered_command=command, base_event=event, cmd_prefix=prefix
                 )
@@ -370,11 +482,7 @@ class CloudBot:
                     add_hook(command_hook, command_event)
                     matched_command = True
                 else:
-                    potential_matches = []
-                    for potential_match, plugin in self.plugin_manager.commands.items():
-                        if potential_match.startswith(command):
-                            potential_matches.append((potential_match, plugin))
-
+                    potential_matches = self.plugin_manager.commands.startswith(command)
                     if potential_matches:
                         matched_command = True
                         if len(potential_matches) == 1:
@@ -389,7 +497,8 @@ class CloudBot:
         if event.type in (EventType.message, EventType.action):
             # Regex hooks
             regex_matched = False
-            for regex, regex_hook in self.plugin_manager.regex_hooks:
+            # Hooks the dispatcher leaves out can't match this message, so skipping them changes nothing
+            for regex, regex_hook in self.plugin_manager.regex_dispatcher.candidates(event.content):
                 if not regex_hook.run_on_cmd and matched_command:
                     continue
 
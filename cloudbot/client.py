@@ -41,6 +41,9 @@ class Client:
     :type vars: dict
     :type history: dict[str, list[tuple]]
     :type permissions: PermissionManager
+    :type cmd_matcher: cloudbot.bot.CommandMatcher
+    :type lines_in: int
+    :type lines_out: int
     """
 
     def __init__(self, bot, _type, name, nick, *, channels=None, config=None):
@@ -75,6 +78,13 @@ class Client:
         # for plugins to abuse
         self.memory = collections.defaultdict()
 
+        # built on demand by cloudbot.bot.get_cmd_matcher
+        self.cmd_matcher = None
+
+        # line counts for the metrics exporter
+        self.lines_in = 0
+        self.lines_out = 0
+
         # set when on_load in core_misc is done
         self.ready = False
 
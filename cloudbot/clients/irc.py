@@ -4,6 +4,7 @@ import random
 import re
 import socket
 import ssl
+import time
 import traceback
 from functools import partial
 
@@ -12,6 +13,11 @@ from irclib.parser import Message
 from cloudbot.client import Client, client, ClientConnectError
 from cloudbot.event import Event, EventType, IrcOutEvent
 from cloudbot.util import async_util
+from cloudbot.util.casemap import get_casemap
+from cloudbot.util.decoding import get_decoder
+from cloudbot.util.framing import LineFramer, TLS_RECORD_SIZE, WriteCoalescer
+from cloudbot.util.send_queue import OutboundQueue, URGENT
+from cloudbot.util.tokenbucket import TokenBucket
 
 logger = logging.getLogger("cloudbot")
 
@@ -25,6 +31,9 @@ def irc_clean(dirty):
     return irc_clean_re.sub('', dirty)
 
 
+# 512 bytes for the message itself and 8191 for IRCv3 message tags
+DEFAULT_MAX_INPUT_LINE = 512 + 8191
+
 irc_command_to_event_type = {
     "PRIVMSG": EventType.message,
     "JOIN": EventType.join,
@@ -34,16 +43,16 @@ irc_command_to_event_type = {
 }
 
 
+_default_decoder = get_decoder({})
+
+
 def decode(bytestring):
     """
     Tries to decode a bytestring using multiple encoding formats
+
+    Incoming lines are decoded by the connection's `decoder`, this uses the default one, see `cloudbot.util.decoding`
     """
-    for codec in ('utf-8', 'iso-8859-1', 'shift_jis', 'cp1252'):
-        try:
-            return bytestring.decode(codec)
-        except UnicodeDecodeError:
-            continue
-    return bytestring.decode('utf-8', errors='ignore')
+    return _default_decoder.decode(bytestring)
 
 
 @client("irc")
@@ -54,6 +63,9 @@ class IrcClient(Client):
     :type server: str
     :type port: int
     :type _ignore_cert_errors: bool
+    :type decoder: cloudbot.util.decoding.Decoder
+    :type send_queue: OutboundQueue | None
+    :type casemap: cloudbot.util.casemap.CaseMap
     """
 
     def __init__(self, bot, _type, name, nick, *, channels=None, config=None):
@@ -77,6 +89,12 @@ class IrcClient(Client):
             local_bind = False
 
         self.local_bind = local_bind
+
+        self.decoder = get_decoder(config.get('decoding', {}))
+
+        # the server's CASEMAPPING, updated from ISUPPORT
+        self.casemap = get_casemap()
+
         # create SSL context
         if self.use_ssl:
             self.ssl_context = ssl.create_default_context()
@@ -94,6 +112,24 @@ class IrcClient(Client):
 
         self._connecting = False
 
+        # outgoing flood control, lines are sent straight to the protocol if it is disabled
+        queue_config = config.get('send_queue', {})
+        if queue_config.get('enabled', False):
+            self.send_queue = OutboundQueue(
+                admin_targets=[config.get('log_channel')], coalesce=queue_config.get('coalesce', True)
+            )
+            restore_rate = queue_config.get('restore_rate', 1)
+            if restore_rate > 0:
+                self._send_bucket = TokenBucket(queue_config.get('max_tokens', 5), restore_rate)
+            else:
+                # Lines are still sent in priority order, but as fast as they are queued
+                self._send_bucket = None
+        else:
+            self.send_queue = None
+            self._send_bucket = None
+
+        self._drain_task = None
+
     def describe_server(self):
         if self.use_ssl:
             return "+{}:{}".format(self.server, self.port)
@@ -271,7 +307,55 @@ class IrcClient(Client):
         :type line: str
         :type log: bool
         """
-        async_util.wrap_future(self._protocol.send(line, log=log), loop=self.loop)
+        if self.send_queue is None:
+            async_util.wrap_future(self._protocol.send(line, log=log), loop=self.loop)
+            return
+
+        self.send_queue.push(line, log)
+        if self._drain_task is None:
+            self._drain_task = async_util.wrap_future(self._drain_send_queue(), loop=self.loop)
+
+    async def _wait_for_token(self):
+        bucket = self._send_bucket
+        if bucket is None:
+            return
+
+        while not bucket.consume(1):
+            await asyncio.sleep((1 - bucket.tokens) / bucket.fill_rate)
+
+    async def _drain_send_queue(self):
+        """
+        Send queued lines in order of priority, as fast as the token bucket allows
+
+        Urgent lines such as PONG are sent without waiting for a token
+        """
+        queue = self.send_queue
+        try:
+            while queue:
+                if queue.peek_priority() == URGENT:
+                    if self._send_bucket is not None:
+                        self._send_bucket.consume(1)
+                else:
+                    await self._wait_for_token()
+
+                line, log = queue.pop()
+                try:
+                    await self._protocol.send(line, log=log)
+                except ValueError:
+                    dropped = queue.clear()
+                    if dropped:
+                        logger.warning("[%s] Connection closed, discarded %d queued line(s)", self.name, dropped)
+                except Exception:
+                    logger.exception("[%s] Error sending queued line", self.name)
+        finally:
+            self._drain_task = None
+
+    def clear_send_queue(self):
+        """
+        Discard any lines waiting to be sent, e.g. when the connection is lost
+        """
+        if self.send_queue is not None:
+            self.send_queue.clear()
 
     @property
     def connected(self):
@@ -286,9 +370,10 @@ class _IrcProtocol(asyncio.Protocol):
     :type loop: asyncio.events.AbstractEventLoop
     :type conn: IrcClient
     :type bot: cloudbot.bot.CloudBot
-    :type _input_buffer: bytes
+    :type _framer: LineFramer
     :type _connected: bool
     :type _transport: asyncio.transports.Transport
+    :type _writer: WriteCoalescer | None
     :type _connected_future: asyncio.Future
     """
 
@@ -301,7 +386,9 @@ class _IrcProtocol(asyncio.Protocol):
         self.conn = conn
 
         # input buffer
-        self._input_buffer = b""
+        self._framer = LineFramer(
+            conn.config['connection'].get('max_input_line_length', DEFAULT_MAX_INPUT_LINE)
+        )
 
         # connected
         self._connected = False
@@ -310,11 +397,23 @@ class _IrcProtocol(asyncio.Protocol):
         # transport
         self._transport = None
 
+        # output buffer, created once we have a transport to write to
+        self._writer = None
+
         # Future that waits until we are connected
         self._connected_future = async_util.create_future(self.loop)
 
     def connection_made(self, transport):
         self._transport = transport
+        self.conn.casemap = get_casemap()
+        conn_config = self.conn.config['connection']
+        if conn_config.get('coalesce_writes', True):
+            self._writer = WriteCoalescer(
+                transport.write, self.loop,
+                max_size=conn_config.get('write_buffer_size', TLS_RECORD_SIZE),
+                max_delay=conn_config.get('write_flush_delay', 0),
+            )
+
         self._connecting = False
         self._connected = True
         self._connected_future.set_result(None)
@@ -323,6 +422,10 @@ class _IrcProtocol(asyncio.Protocol):
 
     def connection_lost(self, exc):
         self._connected = False
+        self.conn.clear_send_queue()
+        if self._writer:
+            self._writer.clear()
+
         if exc:
             logger.error("[%s] Connection lost: %s", self.conn.name, exc)
 
@@ -331,6 +434,9 @@ class _IrcProtocol(asyncio.Protocol):
     def close(self):
         self._connecting = False
         self._connected = False
+        if self._writer:
+            self._writer.flush()
+
         if self._transport:
             self._transport.close()
 
@@ -351,24 +457,40 @@ class _IrcProtocol(asyncio.Protocol):
                 raise ValueError("Attempted to send data to a closed connection")
 
         old_line = line
-        filtered = bool(self.bot.plugin_manager.out_sieves)
+        out_sieves = self.bot.plugin_manager.out_sieves
+        filtered = bool(out_sieves)
 
-        for out_sieve in self.bot.plugin_manager.out_sieves:
-            event = IrcOutEvent(
-                bot=self.bot, hook=out_sieve, conn=self.conn, irc_raw=line
-            )
+        # The parsed form of `line`, kept until a sieve changes the line so it is only parsed once
+        parsed = None
+
+        for out_sieve in out_sieves:
+            if out_sieve.inline:
+                ok, new_line, parsed = self._run_inline_sieve(out_sieve, line, parsed)
+            else:
+                event = IrcOutEvent(
+                    bot=self.bot, hook=out_sieve, conn=self.conn, irc_raw=line, parsed_line=parsed
+                )
+
+                ok, new_line = await self.bot.plugin_manager.internal_launch(out_sieve, event)
+                parsed = event.parsed_line
 
-            ok, new_line = await self.bot.plugin_manager.internal_launch(out_sieve, event)
             if not ok:
                 logger.warning("Error occurred in outgoing sieve, falling back to old behavior")
                 logger.debug("Line was: %s", line)
                 filtered = False
                 break
 
-            line = new_line
-            if line is not None and not isinstance(line, bytes):
-                line = str(line)
+            if isinstance(new_line, Message):
+                parsed = new_line
+                new_line = str(new_line)
+            else:
+                if new_line is not None and not isinstance(new_line, bytes):
+                    new_line = str(new_line)
 
+                if new_line != line:
+                    parsed = None
+
+            line = new_line
             if not line:
                 return
 
@@ -384,14 +506,56 @@ class _IrcProtocol(asyncio.Protocol):
         if log:
             logger.info("[%s|out] >> %r", self.conn.name, line)
 
-        self._transport.write(line)
+        self.conn.lines_out += 1
+        if self._writer:
+            self._writer.write(line)
+        else:
+            self._transport.write(line)
+
+    def _run_inline_sieve(self, out_sieve, line, parsed):
+        """
+        Run a synchronous irc_out hook directly, without creating an event or task
+
+        :type out_sieve: cloudbot.plugin_hooks.IrcOutHook
+        :type line: str | bytes
+        :type parsed: Message | None
+        :return: A tuple of (ok, result, parsed line)
+        """
+        if parsed is None and out_sieve.wants_parsed_line:
+            try:
+                parsed = Message.parse(str(line))
+            except Exception:
+                logger.exception("Unable to parse line requested by hook %s", out_sieve)
+
+        args = {'bot': self.bot, 'conn': self.conn, 'line': str(line), 'irc_raw': line, 'parsed_line': parsed}
+        start = time.perf_counter()
+        try:
+            result = out_sieve.function(*out_sieve.binder.bind(args))
+        except Exception:
+            logger.exception("Error in hook %s", out_sieve.description)
+            return False, None, parsed
+        finally:
+            self.bot.plugin_manager.latency.get(out_sieve).run.record(time.perf_counter() - start)
+
+        return True, result, parsed
 
     def data_received(self, data):
-        self._input_buffer += data
+        framer = self._framer
+        dropped = framer.dropped
+        lines = framer.feed(data)
+        if framer.dropped != dropped:
+            logger.warning(
+                "[%s] Discarded %d line(s) longer than %d bytes from %s",
+                self.conn.name, framer.dropped - dropped, framer.max_line_length, self.conn.describe_server()
+            )
 
-        while b"\r\n" in self._input_buffer:
-            line_data, self._input_buffer = self._input_buffer.split(b"\r\n", 1)
-            line = decode(line_data)
+        self.conn.lines_in += len(lines)
+
+        for line_data in lines:
+            if not line_data:
+                continue
+
+            line = self.conn.decoder.decode(line_data)
 
             try:
                 message = Message.parse(line)
@@ -409,6 +573,9 @@ class _IrcProtocol(asyncio.Protocol):
 
             if command == "PING":
                 self.conn.send("PONG " + command_params[-1], log=False)
+            elif command == "005":
+                # Fold identifiers in the rest of the burst with the new mapping straight away
+                self._update_casemap(command_params)
 
             # Parse the command and params
 
@@ -492,17 +659,32 @@ class _IrcProtocol(asyncio.Protocol):
                 if channel == self.conn.nick.lower():
                     channel = nick.lower()
 
+            # Fold identifiers once here, rather than in every hook that compares them
+            casemap = self.conn.casemap
+            folded_nick = casemap.fold(nick) if nick else None
+            folded_chan = casemap.fold(channel) if channel else None
+
             # Set up parsed message
             # TODO: Do we really want to send the raw `prefix` and `command_params` here?
             event = Event(
                 bot=self.bot, conn=self.conn, event_type=event_type, content_raw=content_raw, content=content,
                 target=target, channel=channel, nick=nick, user=user, host=host, mask=mask, irc_raw=line,
-                irc_prefix=mask, irc_command=command, irc_paramlist=command_params, irc_ctcp_text=ctcp_text
+                irc_prefix=mask, irc_command=command, irc_paramlist=command_params, irc_ctcp_text=ctcp_text,
+                folded_nick=folded_nick, folded_chan=folded_chan,
             )
 
             # handle the message, async
             async_util.wrap_future(self.bot.process(event), loop=self.loop)
 
+    def _update_casemap(self, params):
+        """
+        :type params: list[str]
+        """
+        for token in params[1:-1]:
+            name, _, value = token.partition('=')
+            if name.upper() == "CASEMAPPING":
+                self.conn.casemap = get_casemap(value)
+
     @property
     def connected(self):
         return self._connected
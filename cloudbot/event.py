@@ -2,9 +2,13 @@ import concurrent.futures
 import enum
 import logging
 from functools import partial
+from operator import attrgetter
+from types import SimpleNamespace
 
 from irclib.parser import Message
 
+from cloudbot.util.casemap import get_casemap
+
 logger = logging.getLogger("cloudbot")
 
 
@@ -20,6 +24,86 @@ class EventType(enum.Enum):
     other = 6
 
 
+class EventData:
+    """
+    The message data of an event, shared between an event and all events copied from it
+
+    Events copied from a base event share its data until one of them assigns to a field,
+    at which point that event takes its own copy. This makes the per-hook copies of an
+    event made in `CloudBot.process` a handful of pointer assignments.
+    """
+
+    __slots__ = (
+        'type', 'content', 'content_raw', 'target', 'chan', 'nick', 'user', 'host', 'mask',
+        'irc_raw', 'irc_prefix', 'irc_command', 'irc_paramlist', 'irc_ctcp_text', 'folded_nick', 'folded_chan',
+        'shared',
+    )
+
+    def __init__(self, event_type=EventType.other, content=None, content_raw=None, target=None, chan=None,
+                 nick=None, user=None, host=None, mask=None, irc_raw=None, irc_prefix=None, irc_command=None,
+                 irc_paramlist=None, irc_ctcp_text=None, folded_nick=None, folded_chan=None):
+        self.type = event_type
+        self.content = content
+        self.content_raw = content_raw
+        self.target = target
+        self.chan = chan
+        self.nick = nick
+        self.user = user
+        self.host = host
+        self.mask = mask
+        self.irc_raw = irc_raw
+        self.irc_prefix = irc_prefix
+        self.irc_command = irc_command
+        self.irc_paramlist = irc_paramlist
+        self.irc_ctcp_text = irc_ctcp_text
+        self.folded_nick = folded_nick
+        self.folded_chan = folded_chan
+        self.shared = False
+
+    def copy(self):
+        """
+        :rtype: EventData
+        """
+        return EventData(
+            self.type, self.content, self.content_raw, self.target, self.chan, self.nick, self.user, self.host,
+            self.mask, self.irc_raw, self.irc_prefix, self.irc_command, self.irc_paramlist, self.irc_ctcp_text,
+            self.folded_nick, self.folded_chan,
+        )
+
+
+def _data_property(name, folded=None):
+    def _set(self, value):
+        data = self._data
+        if data.shared:
+            # Copy on write, so the change isn't seen by the other events sharing this data
+            self._data = data = data.copy()
+
+        setattr(data, name, value)
+        if folded is not None:
+            # Refolded from the new value on the next access
+            setattr(data, folded, None)
+
+    return property(attrgetter('_data.' + name), _set)
+
+
+def _folded_property(name, source):
+    def _get(self):
+        data = self._data
+        value = getattr(data, name)
+        if value is None:
+            value = getattr(data, source)
+            if value is None:
+                return None
+
+            value = self.casemap.fold(value)
+            # Shared events all fold the same value, so this is safe to store without copying
+            setattr(data, name, value)
+
+        return value
+
+    return property(_get)
+
+
 class Event:
     """
     :type bot: cloudbot.bot.CloudBot
@@ -40,11 +124,16 @@ class Event:
     :type irc_command: str
     :type irc_paramlist: str
     :type irc_ctcp_text: str
+    :type folded_nick: str
+    :type folded_chan: str
     """
 
+    __slots__ = ('db', 'db_executor', 'bot', 'conn', 'hook', '_data', '_ext')
+
     def __init__(self, *, bot=None, hook=None, conn=None, base_event=None, event_type=EventType.other, content=None,
                  content_raw=None, target=None, channel=None, nick=None, user=None, host=None, mask=None, irc_raw=None,
-                 irc_prefix=None, irc_command=None, irc_paramlist=None, irc_ctcp_text=None):
+                 irc_prefix=None, irc_command=None, irc_paramlist=None, irc_ctcp_text=None, folded_nick=None,
+                 folded_chan=None):
         """
         All of these parameters except for `bot` and `hook` are optional.
         The irc_* parameters should only be specified for IRC events.
@@ -70,6 +159,8 @@ class Event:
         :param irc_paramlist: The list of params for the IRC command. If the last param is a content param, the ':'
                                 should be removed from the front.
         :param irc_ctcp_text: CTCP text if this message is a CTCP command
+        :param folded_nick: `nick` folded with the connection's case mapping, folded on first access if not given
+        :param folded_chan: `channel` folded with the connection's case mapping, folded on first access if not given
         :type bot: cloudbot.bot.CloudBot
         :type conn: cloudbot.client.Client
         :type hook: cloudbot.plugin_hooks.Hook
@@ -86,9 +177,12 @@ class Event:
         :type irc_command: str
         :type irc_paramlist: list[str]
         :type irc_ctcp_text: str
+        :type folded_nick: str
+        :type folded_chan: str
         """
         self.db = None
         self.db_executor = None
+        self._ext = None
         self.bot = bot
         self.conn = conn
         self.hook = hook
@@ -101,39 +195,34 @@ class Event:
             if self.hook is None and base_event.hook is not None:
                 self.hook = base_event.hook
 
-            # If base_event is provided, don't check these parameters, just inherit
-            self.type = base_event.type
-            self.content = base_event.content
-            self.content_raw = base_event.content_raw
-            self.target = base_event.target
-            self.chan = base_event.chan
-            self.nick = base_event.nick
-            self.user = base_event.user
-            self.host = base_event.host
-            self.mask = base_event.mask
-            # clients-specific parameters
-            self.irc_raw = base_event.irc_raw
-            self.irc_prefix = base_event.irc_prefix
-            self.irc_command = base_event.irc_command
-            self.irc_paramlist = base_event.irc_paramlist
-            self.irc_ctcp_text = base_event.irc_ctcp_text
+            # If base_event is provided, don't check these parameters, just share the base event's data
+            self._data = base_event._data
+            self._data.shared = True
         else:
             # Since base_event wasn't provided, we can take these parameters
-            self.type = event_type
-            self.content = content
-            self.content_raw = content_raw
-            self.target = target
-            self.chan = channel
-            self.nick = nick
-            self.user = user
-            self.host = host
-            self.mask = mask
-            # clients-specific parameters
-            self.irc_raw = irc_raw
-            self.irc_prefix = irc_prefix
-            self.irc_command = irc_command
-            self.irc_paramlist = irc_paramlist
-            self.irc_ctcp_text = irc_ctcp_text
+            self._data = EventData(
+                event_type, content, content_raw, target, channel, nick, user, host, mask,
+                irc_raw, irc_prefix, irc_command, irc_paramlist, irc_ctcp_text, folded_nick, folded_chan,
+            )
+
+    type = _data_property('type')
+    content = _data_property('content')
+    content_raw = _data_property('content_raw')
+    target = _data_property('target')
+    chan = _data_property('chan', 'folded_chan')
+    nick = _data_property('nick', 'folded_nick')
+    user = _data_property('user')
+    host = _data_property('host')
+    mask = _data_property('mask')
+    # clients-specific parameters
+    irc_raw = _data_property('irc_raw')
+    irc_prefix = _data_property('irc_prefix')
+    irc_command = _data_property('irc_command')
+    irc_paramlist = _data_property('irc_paramlist')
+    irc_ctcp_text = _data_property('irc_ctcp_text')
+    # `nick` and `chan` folded with the server's CASEMAPPING, for comparing and keying identifiers
+    folded_nick = _folded_property('folded_nick', 'nick')
+    folded_chan = _folded_property('folded_chan', 'chan')
 
     async def prepare(self):
         """
@@ -216,10 +305,59 @@ class Event:
         """
         return self
 
+    @property
+    def ext(self):
+        """
+        A namespace for plugins to attach their own data to this event
+
+        Events are slotted, so arbitrary attributes can't be set on them directly.
+        Attributes set here can still be read as attributes of the event itself,
+        and so can be requested as hook arguments if the hook lists them in `ext_args`.
+
+        >>> event = Event()
+        >>> event.ext.foo = 1
+        >>> event.foo
+        1
+
+        :rtype: types.SimpleNamespace
+        """
+        if self._ext is None:
+            self._ext = SimpleNamespace()
+
+        return self._ext
+
+    def __getattr__(self, name):
+        # Only called when normal attribute lookup fails, so this costs nothing for regular attributes
+        try:
+            ext = object.__getattribute__(self, '_ext')
+        except AttributeError:
+            ext = None
+
+        if ext is not None:
+            try:
+                return getattr(ext, name)
+            except AttributeError:
+                pass
+
+        raise AttributeError("{!r} object has no attribute {!r}".format(type(self).__name__, name))
+
     @property
     def loop(self):
         return self.bot.loop
 
+    @property
+    def casemap(self):
+        """
+        The case mapping of this event's connection
+
+        :rtype: cloudbot.util.casemap.CaseMap
+        """
+        casemap = getattr(self.conn, 'casemap', None)
+        if casemap is None:
+            casemap = get_casemap()
+
+        return casemap
+
     @property
     def logger(self):
         return logger
@@ -397,6 +535,8 @@ class CommandEvent(Event):
     :type triggered_command: str
     """
 
+    __slots__ = ('text', 'doc', 'triggered_command', 'triggered_prefix')
+
     def __init__(self, *, bot=None, hook, text, triggered_command, cmd_prefix,
                  conn=None, base_event=None, event_type=None, content=None,
                  content_raw=None, target=None, channel=None, nick=None,
@@ -448,6 +588,8 @@ class RegexEvent(Event):
     :type match: re.__Match
     """
 
+    __slots__ = ('match',)
+
     def __init__(self, *, bot=None, hook, match, conn=None, base_event=None,
                  event_type=None, content=None, content_raw=None, target=None,
                  channel=None, nick=None, user=None, host=None, mask=None,
@@ -468,6 +610,8 @@ class RegexEvent(Event):
 
 
 class CapEvent(Event):
+    __slots__ = ('cap', 'cap_param')
+
     def __init__(self, *args, cap, cap_param=None, **kwargs):
         super().__init__(*args, **kwargs)
         self.cap = cap
@@ -475,14 +619,20 @@ class CapEvent(Event):
 
 
 class IrcOutEvent(Event):
-    def __init__(self, *args, **kwargs):
+    __slots__ = ('parsed_line',)
+
+    def __init__(self, *args, parsed_line=None, **kwargs):
+        """
+        :param parsed_line: The already parsed line, if any, so it isn't parsed again
+        :type parsed_line: irclib.parser.Message | None
+        """
         super().__init__(*args, **kwargs)
-        self.parsed_line = None
+        self.parsed_line = parsed_line
 
     async def prepare(self):
         await super().prepare()
 
-        if "parsed_line" in self.hook.required_args:
+        if self.parsed_line is None and "parsed_line" in self.hook.required_args:
             try:
                 self.parsed_line = Message.parse(self.line)
             except Exception:
@@ -494,7 +644,7 @@ class IrcOutEvent(Event):
     def prepare_threaded(self):
         super().prepare_threaded()
 
-        if "parsed_line" in self.hook.required_args:
+        if self.parsed_line is None and "parsed_line" in self.hook.required_args:
             try:
                 self.parsed_line = Message.parse(self.line)
             except Exception:
@@ -509,6 +659,8 @@ class IrcOutEvent(Event):
 
 
 class PostHookEvent(Event):
+    __slots__ = ('launched_hook', 'launched_event', 'result', 'error')
+
     def __init__(self, *args, launched_hook=None, launched_event=None,
                  result=None, error=None, **kwargs):
         super().__init__(*args, **kwargs)
@@ -323,6 +323,8 @@ def regex(regex_param, **kwargs):
 
 def sieve(param=None, **kwargs):
     """External sieve decorator. Can be used directly as a decorator, or with args to return a decorator
+
+    Pass `hook_types` to only run the sieve for hooks of those types, e.g. `@hook.sieve(hook_types=["command"])`
     :type param: function | None
     """
 
@@ -464,6 +466,16 @@ connect = on_connect
 
 
 def irc_out(param=None, **kwargs):
+    """
+    This hook is passed each outgoing line, and returns the line to send in its place
+
+    A plain (non-async) function which only takes the arguments bot, conn, line, irc_raw
+    and parsed_line is treated as a pure transform of the line and run directly in the
+    send path, rather than in a thread. Pass inline=False to run it in a thread anyway.
+
+    A hook which modifies parsed_line should return it, rather than the original line.
+    """
+
     def _decorate(func):
         hook = _get_hook(func, "irc_out")
         if hook is None:
@@ -482,6 +494,13 @@ def irc_out(param=None, **kwargs):
 def post_hook(param=None, **kwargs):
     """
     This hook will be fired just after a hook finishes executing
+
+    It can be limited with these keyword arguments:
+    - errors_only: Only fire for hooks which raised an error
+    - hook_types: Only fire for hooks of these types
+    - sample_rate: Only fire for this fraction of successful launches, errors are always passed
+    - batch_successes: Don't fire for successful launches, they are instead collected in
+        `bot.plugin_manager.hook_results` for the plugin to drain
     """
 
     def _decorate(func):
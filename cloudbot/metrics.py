@@ -0,0 +1,283 @@
+"""
+An optional HTTP endpoint exposing the bot's internal metrics in the Prometheus text format
+
+The exporter only uses asyncio, and is enabled with the "metrics" section of the bot config:
+
+    "metrics": {
+        "enabled": true,
+        "host": "127.0.0.1",
+        "port": 9330
+    }
+
+Metrics are served at /metrics. Counters are totals since the bot started,
+so rates such as lines per second are left to the scraper.
+"""
+
+import asyncio
+import gc
+import logging
+import os
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+__all__ = (
+    'MetricFamily',
+    'collect_metrics',
+    'format_metrics',
+    'MetricsServer',
+)
+
+logger = logging.getLogger("cloudbot")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 9330
+
+# Limit the size of the request we are willing to read
+MAX_REQUEST_LINE = 8192
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class MetricFamily:
+    """
+    A named metric and its samples
+
+    >>> family = MetricFamily('cloudbot_example', 'gauge', 'An example')
+    >>> family.add(1.5, connection='test "net"')
+    >>> print(family.format(), end='')
+    # HELP cloudbot_example An example
+    # TYPE cloudbot_example gauge
+    cloudbot_example{connection="test \\"net\\""} 1.5
+
+    :type name: str
+    :type type: str
+    :type help: str
+    :type samples: list[(dict[str, str], float)]
+    """
+
+    __slots__ = ('name', 'type', 'help', 'samples')
+
+    def __init__(self, name, metric_type, help_text):
+        self.name = name
+        self.type = metric_type
+        self.help = help_text
+        self.samples = []
+
+    def add(self, value, **labels):
+        self.samples.append((labels, value))
+
+    def format(self):
+        lines = [
+            "# HELP {} {}".format(self.name, self.help),
+            "# TYPE {} {}".format(self.name, self.type),
+        ]
+        for labels, value in self.samples:
+            if labels:
+                label_text = ','.join(
+                    '{}="{}"'.format(name, _escape_label(label)) for name, label in sorted(labels.items())
+                )
+                lines.append("{}{{{}}} {}".format(self.name, label_text, value))
+            else:
+                lines.append("{} {}".format(self.name, value))
+
+        return '\n'.join(lines) + '\n'
+
+
+def format_metrics(families):
+    """
+    :type families: collections.abc.Iterable[MetricFamily]
+    :rtype: str
+    """
+    return ''.join(family.format() for family in families)
+
+
+def _connection_metrics(bot):
+    lag = MetricFamily('cloudbot_connection_lag_seconds', 'gauge', 'Last measured server lag')
+    connected = MetricFamily('cloudbot_connection_connected', 'gauge', 'Whether the connection is connected')
+    lines_in = MetricFamily('cloudbot_lines_received_total', 'counter', 'Lines received from the server')
+    lines_out = MetricFamily('cloudbot_lines_sent_total', 'counter', 'Lines sent to the server')
+    queue_depth = MetricFamily('cloudbot_send_queue_depth', 'gauge', 'Lines waiting to be sent, by priority')
+    queue_max = MetricFamily('cloudbot_send_queue_max_depth', 'gauge', 'Most lines ever waiting to be sent')
+    coalesced = MetricFamily(
+        'cloudbot_send_queue_coalesced_total', 'counter', 'Lines dropped as duplicates of a queued line'
+    )
+    for conn in bot.connections.values():
+        name = conn.name
+        connected.add(int(conn.connected), connection=name)
+        lines_in.add(conn.lines_in, connection=name)
+        lines_out.add(conn.lines_out, connection=name)
+        if "lag" in conn.memory:
+            lag.add(conn.memory["lag"], connection=name)
+
+        send_queue = getattr(conn, 'send_queue', None)
+        if send_queue is not None:
+            for priority, depth in send_queue.depths.items():
+                queue_depth.add(depth, connection=name, priority=priority)
+
+            queue_max.add(send_queue.max_depth, connection=name)
+            coalesced.add(send_queue.coalesced, connection=name)
+
+    return [lag, connected, lines_in, lines_out, queue_depth, queue_max, coalesced]
+
+
+def _hook_metrics(manager):
+    launches = MetricFamily('cloudbot_hook_launches_total', 'counter', 'Hooks launched, by hook type')
+    for hook_type, count in sorted(manager.launch_counts.items()):
+        launches.add(count, type=hook_type)
+
+    workers = MetricFamily('cloudbot_executor_workers', 'gauge', 'Worker threads in each hook executor pool')
+    pending = MetricFamily('cloudbot_executor_pending', 'gauge', 'Calls queued or running in each hook executor pool')
+    rejected = MetricFamily('cloudbot_executor_rejected_total', 'counter', 'Calls rejected by each hook executor pool')
+    for name, pool in sorted(manager.executors.pools.items()):
+        workers.add(pool.max_workers, pool=name)
+        pending.add(pool.pending, pool=name)
+        rejected.add(pool.rejected, pool=name)
+
+    tasks = MetricFamily('cloudbot_plugin_tasks', 'gauge', 'In-flight tasks in each plugin')
+    started = MetricFamily('cloudbot_plugin_tasks_started_total', 'counter', 'Tasks started by each plugin')
+    for plugin in manager.plugins.values():
+        tasks.add(plugin.tasks.in_flight, plugin=plugin.title)
+        started.add(plugin.tasks.started, plugin=plugin.title)
+
+    return [launches, workers, pending, rejected, tasks, started]
+
+
+def _db_metrics(bot):
+    pool = bot.db_executor_pool
+    executors = MetricFamily('cloudbot_db_executors', 'gauge', 'Database executors, by state')
+    executors.add(pool.size - pool.free, state='in_use')
+    executors.add(pool.free, state='free')
+    return [executors]
+
+
+def _memory_metrics():
+    families = []
+    if psutil:
+        rss = MetricFamily('cloudbot_process_resident_memory_bytes', 'gauge', 'Resident memory size')
+        rss.add(psutil.Process(os.getpid()).memory_info().rss)
+        families.append(rss)
+    elif resource:
+        # ru_maxrss is in kilobytes on Linux
+        max_rss = MetricFamily('cloudbot_process_max_resident_memory_bytes', 'gauge', 'Peak resident memory size')
+        max_rss.add(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+        families.append(max_rss)
+
+    # gc.get_count(): net allocations since the last generation 0 collection, then the number of collections of
+    # the younger generation since the last collection of generations 1 and 2
+    gc_counts = MetricFamily(
+        'cloudbot_gc_allocations', 'gauge', 'Garbage collector counts towards the collection threshold of each generation'
+    )
+    for generation, count in enumerate(gc.get_count()):
+        gc_counts.add(count, generation=generation)
+
+    families.append(gc_counts)
+    return families
+
+
+def collect_metrics(bot):
+    """
+    Gather the current metrics for a bot
+
+    :type bot: cloudbot.bot.CloudBot
+    :rtype: list[MetricFamily]
+    """
+    families = _connection_metrics(bot)
+    families.extend(_hook_metrics(bot.plugin_manager))
+    families.extend(_db_metrics(bot))
+    families.extend(_memory_metrics())
+    return families
+
+
+class MetricsServer:
+    """
+    A minimal HTTP server which serves the bot's metrics
+
+    :type bot: cloudbot.bot.CloudBot
+    :type host: str
+    :type port: int
+    """
+
+    def __init__(self, bot, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.bot = bot
+        self.host = host
+        self.port = port
+        self._server = None
+
+    @classmethod
+    def from_config(cls, bot, config):
+        """
+        :type config: dict
+        :rtype: MetricsServer | None
+        """
+        if not config.get("enabled", False):
+            return None
+
+        return cls(bot, config.get("host", DEFAULT_HOST), config.get("port", DEFAULT_PORT))
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info("Serving metrics on http://%s:%d/metrics", self.host, self.port)
+
+    def stop(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+
+    @property
+    def sockets(self):
+        return self._server.sockets if self._server else []
+
+    def render(self, path):
+        """
+        Get the (status, content type, body) of the response for a request path
+        """
+        if path.partition('?')[0] != '/metrics':
+            return "404 Not Found", "text/plain", "Not Found\n"
+
+        return "200 OK", CONTENT_TYPE, format_metrics(collect_metrics(self.bot))
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await reader.readline()
+            if len(request) > MAX_REQUEST_LINE:
+                return
+
+            # Skip the request headers
+            while True:
+                header = await reader.readline()
+                if header in (b'\r\n', b'\n', b''):
+                    break
+
+            parts = request.decode('latin-1').split()
+            if len(parts) < 2 or parts[0] != 'GET':
+                status, content_type, body = "405 Method Not Allowed", "text/plain", "Method Not Allowed\n"
+            else:
+                try:
+                    status, content_type, body = self.render(parts[1])
+                except Exception:
+                    logger.exception("Error collecting metrics")
+                    status, content_type, body = "500 Internal Server Error", "text/plain", "Error\n"
+
+            data = body.encode()
+            writer.write(
+                "HTTP/1.0 {}\r\nContent-Type: {}\r\nContent-Length: {}\r\nConnection: close\r\n\r\n".format(
+                    status, content_type, len(data)
+                ).encode() + data
+            )
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
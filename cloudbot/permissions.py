@@ -1,9 +1,15 @@
 import logging
+from functools import lru_cache
 
 from irclib.util.compare import match_mask
 
+from cloudbot.util.mask_index import MaskIndex
+
 logger = logging.getLogger("cloudbot")
 
+# The number of (mask, permission) results to remember, cleared on reload
+CACHE_SIZE = 1024
+
 # put your hostmask here for magic
 # it's disabled by default, see has_perm_mask()
 backdoor = None
@@ -16,6 +22,8 @@ class PermissionManager(object):
     :type group_perms: dict[str, list[str]]
     :type group_users: dict[str, list[str]]
     :type perm_users: dict[str, list[str]]
+    :type perm_index: dict[str, MaskIndex]
+    :type group_index: dict[str, MaskIndex]
     """
 
     def __init__(self, conn):
@@ -35,6 +43,10 @@ class PermissionManager(object):
         self.group_users = {}
         self.perm_users = {}
 
+        self.perm_index = {}
+        self.group_index = {}
+        self._check_mask = lru_cache(maxsize=CACHE_SIZE)(self._has_perm_mask)
+
         self.reload()
 
     def reload(self):
@@ -70,6 +82,10 @@ class PermissionManager(object):
                     self.perm_users[perm] = []
                 self.perm_users[perm].extend(users)
 
+        self.perm_index = {perm: MaskIndex(users) for perm, users in self.perm_users.items()}
+        self.group_index = {group: MaskIndex(users) for group, users in self.group_users.items()}
+        self._check_mask.cache_clear()
+
         logger.debug(
             "[%s|permissions] Group permissions: %s",
             self.name, self.group_perms
@@ -94,22 +110,28 @@ class PermissionManager(object):
             if match_mask(user_mask.lower(), backdoor.lower()):
                 return True
 
-        if not perm.lower() in self.perm_users:
-            # no one has access
-            return False
+        if self._check_mask(user_mask.lower(), perm.lower()):
+            if notice:
+                logger.info(
+                    "[%s|permissions] Allowed user %s access to %s",
+                    self.name, user_mask, perm
+                )
+            return True
 
-        allowed_users = self.perm_users[perm.lower()]
+        return False
 
-        for allowed_mask in allowed_users:
-            if match_mask(user_mask.lower(), allowed_mask):
-                if notice:
-                    logger.info(
-                        "[%s|permissions] Allowed user %s access to %s",
-                        self.name, user_mask, perm
-                    )
-                return True
+    def _has_perm_mask(self, user_mask, perm):
+        """
+        :type user_mask: str
+        :type perm: str
+        :rtype: bool
+        """
+        index = self.perm_index.get(perm)
+        if index is None:
+            # no one has access
+            return False
 
-        return False
+        return index.match(user_mask)
 
     def get_groups(self):
         return set().union(self.group_perms.keys(), self.group_users.keys())
@@ -133,25 +155,16 @@ class PermissionManager(object):
         :type user_mask: str
         :rtype: list[str]
         """
-        permissions = set()
-        for permission, users in self.perm_users.items():
-            for mask_to_check in users:
-                if match_mask(user_mask.lower(), mask_to_check):
-                    permissions.add(permission)
-        return permissions
+        user_mask = user_mask.lower()
+        return {permission for permission, index in self.perm_index.items() if index.match(user_mask)}
 
     def get_user_groups(self, user_mask):
         """
         :type user_mask: str
         :rtype: list[str]
         """
-        groups = []
-        for group, users in self.group_users.items():
-            for mask_to_check in users:
-                if match_mask(user_mask.lower(), mask_to_check):
-                    groups.append(group)
-                    continue
-        return groups
+        user_mask = user_mask.lower()
+        return [group for group, index in self.group_index.items() if index.match(user_mask)]
 
     def group_exists(self, group):
         """
@@ -168,13 +181,11 @@ class PermissionManager(object):
         :type user_mask: str
         :rtype: bool
         """
-        users = self.group_users.get(group.lower())
-        if not users:
+        index = self.group_index.get(group.lower())
+        if not index:
             return False
-        for mask_to_check in users:
-            if match_mask(user_mask.lower(), mask_to_check):
-                return True
-        return False
+
+        return index.match(user_mask.lower())
 
     def remove_group_user(self, group, user_mask):
         """
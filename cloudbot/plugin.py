@@ -2,8 +2,8 @@ import asyncio
 import importlib
 import logging
 import sys
+import time
 from collections import defaultdict
-from functools import partial
 from itertools import chain
 from operator import attrgetter
 from pathlib import Path
@@ -15,10 +15,19 @@ import sqlalchemy
 from cloudbot.event import Event, PostHookEvent
 from cloudbot.plugin_hooks import hook_name_to_plugin
 from cloudbot.util import HOOK_ATTR, LOADED_ATTR, async_util, database
-from cloudbot.util.func_utils import call_with_args
+from cloudbot.util.func_utils import ParameterError
+from cloudbot.util.hook_executor import ExecutorFullError, HookExecutors
+from cloudbot.util.latency import LatencyTracker
+from cloudbot.util.mapping import PrefixDict
+from cloudbot.util.regex_dispatch import RegexDispatcher
+from cloudbot.util.ring_buffer import RingBuffer
+from cloudbot.util.task_registry import TaskRegistry
 
 logger = logging.getLogger("cloudbot")
 
+# Hook types which are launched without running any sieves
+UNSIEVED_HOOK_TYPES = ("on_start", "on_stop", "periodic")
+
 
 def find_hooks(parent, module):
     """
@@ -35,9 +44,16 @@ def find_hooks(parent, module):
                 func_hooks = getattr(func, HOOK_ATTR)
 
                 for hook_type, func_hook in func_hooks.items():
-                    hooks[hook_type].append(
-                        hook_name_to_plugin(hook_type)(parent, func_hook)
-                    )
+                    try:
+                        _hook = hook_name_to_plugin(hook_type)(parent, func_hook)
+                    except (ParameterError, ValueError) as e:
+                        logger.error(
+                            "Not registering %s hook %s from %s: %s", hook_type, func_hook.function.__name__,
+                            parent.title, e
+                        )
+                        continue
+
+                    hooks[hook_type].append(_hook)
             except (NotImplementedError, AttributeError, LookupError):
                 continue
 
@@ -77,13 +93,18 @@ class PluginManager:
 
     :type bot: cloudbot.bot.CloudBot
     :type plugins: dict[str, Plugin]
-    :type commands: dict[str, cloudbot.plugin_hooks.CommandHook]
+    :type commands: cloudbot.util.mapping.PrefixDict[str, cloudbot.plugin_hooks.CommandHook]
     :type raw_triggers: dict[str, list[cloudbot.plugin_hooks.RawHook]]
     :type catch_all_triggers: list[cloudbot.plugin_hooks.RawHook]
     :type event_type_hooks: dict[cloudbot.event.EventType,
         list[cloudbot.plugin_hooks.EventHook]]
     :type regex_hooks: list[(re.__Regex, cloudbot.plugin_hooks.RegexHook)]
+    :type regex_dispatcher: RegexDispatcher
     :type sieves: list[cloudbot.plugin_hooks.SieveHook]
+    :type latency: LatencyTracker
+    :type executors: HookExecutors
+    :type launch_counts: dict[str, int]
+    :type hook_results: RingBuffer
     """
 
     def __init__(self, bot):
@@ -95,17 +116,26 @@ class PluginManager:
 
         self.plugins = {}
         self._plugin_name_map = WeakValueDictionary()
-        self.commands = {}
+        self.commands = PrefixDict()
         self.raw_triggers = {}
         self.catch_all_triggers = []
         self.event_type_hooks = {}
         self.regex_hooks = []
+        self.regex_dispatcher = RegexDispatcher(self.regex_hooks)
         self.sieves = []
+        self._sieve_chains = {}
         self.cap_hooks = {"on_available": defaultdict(list), "on_ack": defaultdict(list)}
         self.connect_hooks = []
         self.out_sieves = []
         self.hook_hooks = defaultdict(list)
+        self._post_hook_chains = {}
+        # (hook, connection name, channel) for successful launches, for post hooks with batch_successes set
+        self.hook_results = RingBuffer(self.bot.config.get("hook_result_buffer", 10000))
         self.perm_hooks = defaultdict(list)
+        # The number of launches of each hook type
+        self.launch_counts = defaultdict(int)
+        self.latency = LatencyTracker()
+        self.executors = HookExecutors(self.bot.config.get("hook_executors"), latency=self.latency)
 
     def _add_plugin(self, plugin: 'Plugin'):
         self.plugins[plugin.file_path] = plugin
@@ -272,7 +302,7 @@ class PluginManager:
 
         for periodic_hook in plugin.hooks["periodic"]:
             task = async_util.wrap_future(self._start_periodic(periodic_hook))
-            plugin.tasks.append(task)
+            plugin.tasks.add(task)
             self._log_hook(periodic_hook)
 
         # register commands
@@ -341,6 +371,7 @@ class PluginManager:
 
         # Sort hooks
         self.regex_hooks.sort(key=lambda x: x[1].priority)
+        self._update_regex_dispatcher()
         dicts_of_lists_of_hooks = (self.event_type_hooks, self.raw_triggers, self.perm_hooks, self.hook_hooks)
         lists_of_hooks = [self.catch_all_triggers, self.sieves, self.connect_hooks, self.out_sieves]
         lists_of_hooks.extend(chain.from_iterable(d.values() for d in dicts_of_lists_of_hooks))
@@ -348,6 +379,9 @@ class PluginManager:
         for lst in lists_of_hooks:
             lst.sort(key=attrgetter("priority"))
 
+        self._update_sieve_chains()
+        self._update_post_hook_chains()
+
         # we don't need this anymore
         del plugin.hooks["on_start"]
 
@@ -415,10 +449,14 @@ class PluginManager:
             for regex_match in regex_hook.regexes:
                 self.regex_hooks.remove((regex_match, regex_hook))
 
+        self._update_regex_dispatcher()
+
         # unregister sieves
         for sieve_hook in plugin.hooks["sieve"]:
             self.sieves.remove(sieve_hook)
 
+        self._update_sieve_chains()
+
         # unregister connect hooks
         for connect_hook in plugin.hooks["on_connect"]:
             self.connect_hooks.remove(connect_hook)
@@ -429,6 +467,8 @@ class PluginManager:
         for post_hook in plugin.hooks["post_hook"]:
             self.hook_hooks["post"].remove(post_hook)
 
+        self._update_post_hook_chains()
+
         for perm_hook in plugin.hooks["perm_check"]:
             for perm in perm_hook.perms:
                 self.perm_hooks[perm].remove(perm_hook)
@@ -441,14 +481,14 @@ class PluginManager:
         # unregister databases
         plugin.unregister_tables(self.bot)
 
-        task_count = len(plugin.tasks)
-        if task_count > 0:
+        if plugin.tasks:
             logger.debug("Cancelling running tasks in %s", plugin.title)
-            for task in plugin.tasks:
-                task.cancel()
-
+            task_count = plugin.tasks.cancel_all()
             logger.info("Cancelled %d tasks from %s", task_count, plugin.title)
 
+        # Threaded hooks already running finish in the background
+        self.executors.shutdown_plugin(plugin.title)
+
         # remove last reference to plugin
         self._rem_plugin(plugin)
 
@@ -457,6 +497,94 @@ class PluginManager:
 
         return True
 
+    def _update_regex_dispatcher(self):
+        """
+        Rebuild the regex hook prefilter from the current list of regex hooks
+        """
+        enabled = self.bot.config.get("regex_prefilter", True)
+        self.regex_dispatcher = RegexDispatcher(self.regex_hooks, enabled=enabled)
+
+    def _update_sieve_chains(self):
+        """
+        Discard the cached sieve chains after the list of sieves changes
+        """
+        self._sieve_chains = {}
+
+    def get_sieves(self, hook_type):
+        """
+        Get the sieves which apply to hooks of a type, in priority order
+
+        The chain for each hook type is built once, then reused until sieves are loaded or unloaded.
+
+        :type hook_type: str
+        :rtype: tuple[cloudbot.plugin_hooks.SieveHook]
+        """
+        try:
+            return self._sieve_chains[hook_type]
+        except LookupError:
+            pass
+
+        if hook_type in UNSIEVED_HOOK_TYPES:
+            sieves = ()
+        else:
+            sieves = tuple(sieve for sieve in self.sieves if sieve.applies_to(hook_type))
+
+        self._sieve_chains[hook_type] = sieves
+        return sieves
+
+    def _update_post_hook_chains(self):
+        """
+        Discard the cached post hook chains after the list of post hooks changes
+        """
+        self._post_hook_chains = {}
+
+    def get_post_hooks(self, hook_type):
+        """
+        Get the post hooks which apply to hooks of a type, in priority order
+
+        :type hook_type: str
+        :return: A tuple of (post_hooks, record_successes), where record_successes is True if any
+            of the post hooks reads successful launches from `hook_results`
+        :rtype: (tuple[cloudbot.plugin_hooks.PostHookHook], bool)
+        """
+        try:
+            return self._post_hook_chains[hook_type]
+        except LookupError:
+            pass
+
+        post_hooks = tuple(post_hook for post_hook in self.hook_hooks["post"] if post_hook.applies_to(hook_type))
+        chain = (post_hooks, any(post_hook.batch_successes for post_hook in post_hooks))
+        self._post_hook_chains[hook_type] = chain
+        return chain
+
+    async def _run_post_hooks(self, hook, event, result, error):
+        """
+        :type hook: cloudbot.plugin_hooks.Hook
+        :type event: cloudbot.event.Event
+        """
+        post_hooks, record_successes = self.get_post_hooks(hook.type)
+        if record_successes and error is None:
+            conn = event.conn
+            self.hook_results.append((hook, conn.name if conn else None, event.chan))
+
+        start = time.perf_counter()
+        ran = False
+        for post_hook in post_hooks:
+            if not post_hook.should_run(error):
+                continue
+
+            ran = True
+            post_event = PostHookEvent(
+                launched_hook=hook, launched_event=event, bot=event.bot, conn=event.conn,
+                result=result, error=error, hook=post_hook
+            )
+            success, res = await self.internal_launch(post_hook, post_event)
+            if success and res is False:
+                break
+
+        if ran:
+            self.latency.get(hook).post.record(time.perf_counter() - start)
+
     def _log_hook(self, hook):
         """
         Logs registering a given hook
@@ -475,7 +603,7 @@ class PluginManager:
         event.prepare_threaded()
 
         try:
-            return call_with_args(hook.function, event)
+            return hook.function(*hook.binder.bind_attrs(event))
         finally:
             event.close_threaded()
 
@@ -487,7 +615,7 @@ class PluginManager:
         await event.prepare()
 
         try:
-            return await call_with_args(hook.function, event)
+            return await hook.function(*hook.binder.bind_attrs(event))
         finally:
             await event.close()
 
@@ -499,22 +627,29 @@ class PluginManager:
         :return: a tuple of (ok, result) where ok is a boolean that determines if the hook ran without error and result
             is the result from the hook
         """
+        # Threaded hooks have their wait and run times recorded by the executor
         if hook.threaded:
-            coro = self.bot.loop.run_in_executor(None, self._execute_hook_threaded, hook, event)
+            coro = self.executors.run(hook, self._execute_hook_threaded, hook, event)
+            start = None
         else:
             coro = self._execute_hook_sync(hook, event)
+            start = time.perf_counter()
 
-        task = async_util.wrap_future(coro)
-        hook.plugin.tasks.append(task)
+        task = hook.plugin.tasks.add(async_util.wrap_future(coro))
         try:
             out = await task
             ok = True
+        except ExecutorFullError as e:
+            logger.warning("Not running hook %s: %s", hook.description, e)
+            ok = False
+            out = sys.exc_info()
         except Exception:
             logger.exception("Error in hook %s", hook.description)
             ok = False
             out = sys.exc_info()
 
-        hook.plugin.tasks.remove(task)
+        if start is not None:
+            self.latency.get(hook).run.record(time.perf_counter() - start)
 
         return ok, out
 
@@ -535,14 +670,7 @@ class PluginManager:
         else:
             error = out
 
-        post_event = partial(
-            PostHookEvent, launched_hook=hook, launched_event=event, bot=event.bot,
-            conn=event.conn, result=result, error=error
-        )
-        for post_hook in self.hook_hooks["post"]:
-            success, res = await self.internal_launch(post_hook, post_event(hook=post_hook))
-            if success and res is False:
-                break
+        await self._run_post_hooks(hook, event, result, error)
 
         return ok
 
@@ -554,29 +682,27 @@ class PluginManager:
         :rtype: cloudbot.event.Event
         """
         if sieve.threaded:
-            coro = self.bot.loop.run_in_executor(None, sieve.function, self.bot, event, hook)
+            coro = self.executors.run(sieve, sieve.function, self.bot, event, hook)
+            start = None
         else:
             coro = sieve.function(self.bot, event, hook)
+            start = time.perf_counter()
 
         result, error = None, None
-        task = async_util.wrap_future(coro)
-        sieve.plugin.tasks.append(task)
+        task = sieve.plugin.tasks.add(async_util.wrap_future(coro))
         try:
             result = await task
+        except ExecutorFullError as e:
+            logger.warning("Not running sieve %s on %s: %s", sieve.description, hook.description, e)
+            error = sys.exc_info()
         except Exception:
             logger.exception("Error running sieve %s on %s:", sieve.description, hook.description)
             error = sys.exc_info()
 
-        sieve.plugin.tasks.remove(task)
+        if start is not None:
+            self.latency.get(sieve).run.record(time.perf_counter() - start)
 
-        post_event = partial(
-            PostHookEvent, launched_hook=sieve, launched_event=event, bot=event.bot,
-            conn=event.conn, result=result, error=error
-        )
-        for post_hook in self.hook_hooks["post"]:
-            success, res = await self.internal_launch(post_hook, post_event(hook=post_hook))
-            if success and res is False:
-                break
+        await self._run_post_hooks(sieve, event, result, error)
 
         return result
 
@@ -601,11 +727,18 @@ class PluginManager:
         :rtype: bool
         """
 
-        if hook.type not in ("on_start", "on_stop", "periodic"):  # we don't need sieves on on_start hooks.
-            for sieve in self.bot.plugin_manager.sieves:
+        self.launch_counts[hook.type] += 1
+        sieves = self.get_sieves(hook.type)
+        if sieves:
+            start = time.perf_counter()
+            for sieve in sieves:
                 event = await self._sieve(sieve, event, hook)
                 if event is None:
-                    return False
+                    break
+
+            self.latency.get(hook).sieve.record(time.perf_counter() - start)
+            if event is None:
+                return False
 
         if hook.lock:
             async with hook.lock:
@@ -627,6 +760,7 @@ class Plugin:
     :type title: str
     :type hooks: dict
     :type tables: list[sqlalchemy.Table]
+    :type tasks: TaskRegistry
     """
 
     def __init__(self, filepath, filename, title, code):
@@ -635,7 +769,7 @@ class Plugin:
         :type filename: str
         :type code: object
         """
-        self.tasks = []
+        self.tasks = TaskRegistry()
         self.file_path = filepath
         self.file_name = filename
         self.title = title
@@ -1,8 +1,10 @@
 import asyncio
-import inspect
 import logging
+import random
 
+from cloudbot.event import CapEvent, CommandEvent, Event, IrcOutEvent, PostHookEvent, RegexEvent
 from cloudbot.hook import Action, Priority
+from cloudbot.util.func_utils import get_binder
 
 logger = logging.getLogger("cloudbot")
 
@@ -17,28 +19,41 @@ class Hook:
     :type function: callable
     :type function_name: str
     :type required_args: list[str]
+    :type binder: cloudbot.util.func_utils.ArgBinder
+    :type ext_args: list[str]
     :type threaded: bool
     :type permissions: list[str]
     :type single_thread: bool
     """
 
+    # The type of event this hook is called with, used to check the hook's arguments when it is loaded
+    event_class = Event
+
     def __init__(self, _type, plugin, func_hook):
         """
         :type _type: str
         :type plugin: Plugin
         :type func_hook: hook._Hook
+        :raises cloudbot.util.func_utils.ParameterError: If the function takes an argument its event can't provide
         """
         self.type = _type
         self.plugin = plugin
         self.function = func_hook.function
         self.function_name = self.function.__name__
 
-        sig = inspect.signature(self.function)
-
         # don't process args starting with "_"
-        self.required_args = [
-            arg for arg in sig.parameters.keys() if not arg.startswith('_')
-        ]
+        self.binder = get_binder(self.function)
+        self.required_args = list(self.binder.arg_names)
+
+        # Arguments which sieves provide through `Event.ext`, the event class can't know about these
+        self.ext_args = func_hook.kwargs.pop("ext_args", [])
+        if isinstance(self.ext_args, str):
+            self.ext_args = [self.ext_args]
+
+        if self.event_class is not None:
+            valid_args = {name for name in dir(self.event_class) if not name.startswith('_')}
+            valid_args.update(self.ext_args)
+            self.binder.validate(valid_args)
 
         if asyncio.iscoroutine(self.function) or asyncio.iscoroutinefunction(
             self.function
@@ -95,6 +110,8 @@ class CommandHook(Hook):
     :type auto_help: bool
     """
 
+    event_class = CommandEvent
+
     def __init__(self, plugin, cmd_hook):
         """
         :type plugin: Plugin
@@ -130,6 +147,8 @@ class RegexHook(Hook):
     :type regexes: set[re.__Regex]
     """
 
+    event_class = RegexEvent
+
     def __init__(self, plugin, regex_hook):
         """
         :type plugin: Plugin
@@ -209,13 +228,34 @@ class RawHook(Hook):
 
 
 class SieveHook(Hook):
+    """
+    :type hook_types: frozenset[str] | None
+    """
+
+    # Sieves are called directly with (bot, event, hook)
+    event_class = None
+
     def __init__(self, plugin, sieve_hook):
         """
         :type plugin: Plugin
         :type sieve_hook: cloudbot.util.hook._SieveHook
         """
+        hook_types = sieve_hook.kwargs.pop("hook_types", None)
+        if isinstance(hook_types, str):
+            hook_types = [hook_types]
+
+        # None means the sieve applies to all hook types
+        self.hook_types = None if hook_types is None else frozenset(hook_types)
+
         super().__init__("sieve", plugin, sieve_hook)
 
+    def applies_to(self, hook_type):
+        """
+        :type hook_type: str
+        :rtype: bool
+        """
+        return self.hook_types is None or hook_type in self.hook_types
+
     def __repr__(self):
         return "Sieve[{}]".format(Hook.__repr__(self))
 
@@ -275,6 +315,8 @@ class OnStopHook(Hook):
 
 
 class CapHook(Hook):
+    event_class = CapEvent
+
     def __init__(self, _type, plugin, base_hook):
         self.caps = base_hook.caps
         super().__init__("on_cap_{}".format(_type), plugin, base_hook)
@@ -317,10 +359,28 @@ class OnConnectHook(Hook):
         )
 
 
+# The arguments available to an irc_out hook run inline
+INLINE_OUT_ARGS = frozenset({'bot', 'conn', 'line', 'irc_raw', 'parsed_line'})
+
+
 class IrcOutHook(Hook):
+    """
+    :type inline: bool
+    :type wants_parsed_line: bool
+    """
+
+    event_class = IrcOutEvent
+
     def __init__(self, plugin, out_hook):
+        inline = out_hook.kwargs.pop("inline", True)
         super().__init__("irc_out", plugin, out_hook)
 
+        # Plain functions of the line are run directly on the event loop, without an event, task or thread
+        self.inline = (
+            bool(inline) and self.threaded and self.lock is None and INLINE_OUT_ARGS.issuperset(self.required_args)
+        )
+        self.wants_parsed_line = "parsed_line" in self.required_args
+
     def __repr__(self):
         return "Irc_Out[{}]".format(Hook.__repr__(self))
 
@@ -329,9 +389,56 @@ class IrcOutHook(Hook):
 
 
 class PostHookHook(Hook):
+    """
+    :type errors_only: bool
+    :type hook_types: frozenset[str] | None
+    :type sample_rate: float
+    :type batch_successes: bool
+    """
+
+    event_class = PostHookEvent
+
     def __init__(self, plugin, out_hook):
+        self.errors_only = out_hook.kwargs.pop("errors_only", False)
+
+        hook_types = out_hook.kwargs.pop("hook_types", None)
+        if isinstance(hook_types, str):
+            hook_types = [hook_types]
+
+        # None means the post hook applies to all hook types
+        self.hook_types = None if hook_types is None else frozenset(hook_types)
+
+        self.sample_rate = out_hook.kwargs.pop("sample_rate", 1.0)
+        if not 0 <= self.sample_rate <= 1:
+            raise ValueError("sample_rate must be between 0 and 1")
+
+        self.batch_successes = out_hook.kwargs.pop("batch_successes", False)
+
         super().__init__("post_hook", plugin, out_hook)
 
+    def applies_to(self, hook_type):
+        """
+        :type hook_type: str
+        :rtype: bool
+        """
+        return self.hook_types is None or hook_type in self.hook_types
+
+    def should_run(self, error):
+        """
+        Determine whether to run this post hook for a launch, errors are always passed to post hooks
+        which apply to the launched hook's type
+
+        :param error: The launched hook's error, or None if it succeeded
+        :rtype: bool
+        """
+        if error is not None:
+            return True
+
+        if self.errors_only or self.batch_successes:
+            return False
+
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
     def __repr__(self):
         return "Post_hook[{}]".format(Hook.__repr__(self))
 
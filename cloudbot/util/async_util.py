@@ -6,7 +6,7 @@ import asyncio
 import sys
 from functools import partial
 
-from cloudbot.util.func_utils import call_with_args
+from cloudbot.util.func_utils import get_binder
 
 
 def wrap_future(fut, *, loop=None):
@@ -31,10 +31,11 @@ async def run_func_with_args(loop, func, arg_data, executor=None):
     if asyncio.iscoroutine(func):
         raise TypeError('A coroutine function or a normal, non-async callable are required')
 
+    args = get_binder(func).bind(arg_data)
     if asyncio.iscoroutinefunction(func):
-        coro = call_with_args(func, arg_data)
+        coro = func(*args)
     else:
-        coro = loop.run_in_executor(executor, call_with_args, func, arg_data)
+        coro = loop.run_in_executor(executor, partial(func, *args))
 
     return await coro
 
@@ -0,0 +1,101 @@
+"""
+IRC case mappings, as announced by the server's CASEMAPPING ISUPPORT token
+
+IRC servers compare nicks and channel names with one of a few fixed mappings rather than
+Unicode case folding, so keys should be folded with the mapping the server uses.
+
+>>> casemap = get_casemap('rfc1459')
+>>> casemap.fold('Nick[away]^')
+'nick{away}~'
+>>> get_casemap('ascii').fold('Nick[away]^')
+'nick[away]^'
+>>> casemap.equals('[Foo]', '{foo}')
+True
+"""
+import logging
+import string
+from functools import lru_cache
+
+__all__ = (
+    'ASCII',
+    'RFC1459',
+    'STRICT_RFC1459',
+    'DEFAULT_CASEMAPPING',
+    'CaseMap',
+    'get_casemap',
+)
+
+logger = logging.getLogger("cloudbot")
+
+ASCII = 'ascii'
+RFC1459 = 'rfc1459'
+STRICT_RFC1459 = 'strict-rfc1459'
+
+# Servers which don't send CASEMAPPING are assumed to use rfc1459
+DEFAULT_CASEMAPPING = RFC1459
+
+# The number of folded keys to keep for each mapping
+CACHE_SIZE = 4096
+
+TABLES = {
+    ASCII: str.maketrans(string.ascii_uppercase, string.ascii_lowercase),
+    RFC1459: str.maketrans(string.ascii_uppercase + "[]\\^", string.ascii_lowercase + "{}|~"),
+    STRICT_RFC1459: str.maketrans(string.ascii_uppercase + "[]\\", string.ascii_lowercase + "{}|"),
+}
+
+
+class CaseMap:
+    """
+    Folds identifiers with an IRC case mapping, caching recently folded keys
+    """
+
+    __slots__ = ('name', 'table', 'fold')
+
+    def __init__(self, name=DEFAULT_CASEMAPPING, cache_size=CACHE_SIZE):
+        """
+        :type name: str
+        :type cache_size: int
+        """
+        name = name.lower()
+        if name not in TABLES:
+            logger.warning("Unknown CASEMAPPING '%s', falling back to %s", name, DEFAULT_CASEMAPPING)
+            name = DEFAULT_CASEMAPPING
+
+        self.name = name
+        self.table = table = TABLES[name]
+
+        def _fold(text):
+            return text.translate(table)
+
+        self.fold = lru_cache(maxsize=cache_size)(_fold)
+
+    def __repr__(self):
+        return "{}({!r})".format(type(self).__name__, self.name)
+
+    def equals(self, a, b):
+        """
+        Compare two identifiers under this mapping
+
+        :type a: str
+        :type b: str
+        :rtype: bool
+        """
+        return self.fold(a) == self.fold(b)
+
+
+_casemaps = {}
+
+
+def get_casemap(name=None):
+    """
+    Get the shared `CaseMap` for a CASEMAPPING value, so the key cache is shared between its users
+
+    :type name: str | None
+    :rtype: CaseMap
+    """
+    name = (name or DEFAULT_CASEMAPPING).lower()
+    try:
+        return _casemaps[name]
+    except KeyError:
+        _casemaps[name] = casemap = CaseMap(name)
+        return casemap
@@ -0,0 +1,117 @@
+"""
+Compact in-memory counters for keys made of repeated strings
+"""
+
+import sys
+from array import array
+from threading import Lock
+
+__all__ = (
+    'CounterStore',
+)
+
+
+class CounterStore:
+    """
+    A fixed number of integer counters for each of a set of keys
+
+    Each key is a tuple of strings, which are interned so keys sharing a hook or
+    channel name share the string. Each key is given a slot in a single flat
+    array of counters, rather than a dict or Counter of its own.
+
+    >>> store = CounterStore(('success', 'failure'))
+    >>> store.add(('plugin.hook', 'net', '#chan'), 'success')
+    >>> store.add(('plugin.hook', 'net', '#chan'), 'failure', 2)
+    >>> store.get(('plugin.hook', 'net', '#chan'))
+    (1, 2)
+    >>> store.drain()
+    [(('plugin.hook', 'net', '#chan'), (1, 2))]
+    >>> len(store)
+    0
+
+    :type columns: tuple[str]
+    """
+
+    def __init__(self, columns):
+        """
+        :param columns: The names of the counters kept for each key
+        :type columns: collections.abc.Iterable[str]
+        """
+        self.columns = tuple(columns)
+        self._column_index = {name: i for i, name in enumerate(self.columns)}
+        self._slots = {}
+        self._keys = []
+        self._counts = array('Q')
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _get_slot(self, key):
+        try:
+            return self._slots[key]
+        except LookupError:
+            pass
+
+        key = tuple(sys.intern(part) for part in key)
+        slot = len(self._keys)
+        self._slots[key] = slot
+        self._keys.append(key)
+        self._counts.extend([0] * len(self.columns))
+        return slot
+
+    def add(self, key, column, amount=1):
+        """
+        Add to one of the counters for a key
+
+        :type key: tuple[str]
+        :type column: str
+        :type amount: int
+        """
+        offset = self._column_index[column]
+        with self._lock:
+            self._counts[self._get_slot(key) * len(self.columns) + offset] += amount
+
+    def get(self, key):
+        """
+        Get the counters for a key, in column order
+
+        :type key: tuple[str]
+        :rtype: tuple[int]
+        """
+        width = len(self.columns)
+        with self._lock:
+            try:
+                slot = self._slots[key]
+            except LookupError:
+                return (0,) * width
+
+            return tuple(self._counts[slot * width:(slot + 1) * width])
+
+    def drain(self):
+        """
+        Remove all keys and return their counters
+
+        :rtype: list[(tuple[str], tuple[int])]
+        """
+        width = len(self.columns)
+        with self._lock:
+            keys, counts = self._keys, self._counts
+            self._slots = {}
+            self._keys = []
+            self._counts = array('Q')
+
+        return [(key, tuple(counts[i * width:(i + 1) * width])) for i, key in enumerate(keys)]
+
+    def merge(self, items):
+        """
+        Add counters previously returned by `drain()` back in to the store
+
+        :type items: collections.abc.Iterable[(tuple[str], tuple[int])]
+        """
+        width = len(self.columns)
+        with self._lock:
+            for key, counts in items:
+                base = self._get_slot(key) * width
+                for i, count in enumerate(counts):
+                    self._counts[base + i] += count
@@ -0,0 +1,300 @@
+"""
+Strategies for decoding incoming IRC lines
+
+IRC has no defined encoding, so lines are decoded as UTF-8 where possible, and
+with a configurable chain of fallback codecs otherwise.
+
+The strategy used for a connection is selected with the "strategy" key of the
+connection's "decoding" config section:
+- multi: Try UTF-8, then each fallback codec in turn
+- fast: Skip codecs which can't succeed, using cheap byte scans before decoding
+- remember: As `fast`, but remember which fallback codec last worked for each sender and channel
+"""
+
+import logging
+import re
+from abc import ABC, abstractmethod
+from collections import OrderedDict, defaultdict
+
+__all__ = (
+    'Decoder',
+    'MultiCodecDecoder',
+    'FastPathDecoder',
+    'RememberingDecoder',
+    'DECODERS',
+    'DEFAULT_FALLBACKS',
+    'DEFAULT_STRATEGY',
+    'get_decoder',
+)
+
+logger = logging.getLogger("cloudbot")
+
+DEFAULT_FALLBACKS = ('iso-8859-1',)
+
+_non_ascii_re = re.compile(b'[\x80-\xff]')
+# Any non-ASCII text which is valid UTF-8 must contain a lead byte followed by a continuation byte
+_utf8_seq_re = re.compile(b'[\xc2-\xf4][\x80-\xbf]')
+
+if hasattr(bytes, 'isascii'):
+    # Python 3.7+ can check this without a regex scan
+    is_ascii = bytes.isascii
+else:  # pragma: no cover
+    def is_ascii(data):
+        return _non_ascii_re.search(data) is None
+
+
+def may_be_utf8(data):
+    """
+    Determine whether non-ASCII data could possibly be valid UTF-8
+
+    >>> may_be_utf8("caf\\xe9".encode('utf-8'))
+    True
+    >>> may_be_utf8("caf\\xe9".encode('iso-8859-1'))
+    False
+    """
+    return _utf8_seq_re.search(data) is not None
+
+
+def get_line_keys(data):
+    """
+    Get the (sender, target) of a raw IRC line, without decoding it
+
+    >>> get_line_keys(b":Foo!bar@baz PRIVMSG #Chan :hi")
+    (b'foo', b'#chan')
+    >>> get_line_keys(b"@time=1 :Foo PRIVMSG Bar :hi")
+    (b'foo', b'bar')
+    >>> get_line_keys(b"PING :foo")
+    (None, None)
+    """
+    if data[:1] == b'@':
+        data = data.partition(b' ')[2].lstrip(b' ')
+
+    if data[:1] != b':':
+        return None, None
+
+    parts = data.split(None, 3)
+    sender = parts[0][1:].partition(b'!')[0].lower()
+    if len(parts) > 2 and parts[2][:1] != b':':
+        target = parts[2].lower()
+    else:
+        target = None
+
+    return sender, target
+
+
+class Decoder(ABC):
+    """
+    Base class for decoding strategies
+
+    :type fallbacks: tuple[str]
+    :type stats: defaultdict[str, int]
+    """
+
+    # Config keys, other than "fallbacks", which are passed to the constructor
+    options = ()
+
+    def __init__(self, fallbacks=DEFAULT_FALLBACKS):
+        self.fallbacks = tuple(fallbacks)
+        # A defaultdict is noticeably cheaper to increment than a Counter, which matters on the ASCII path
+        self.stats = defaultdict(int)
+
+    @abstractmethod
+    def decode(self, data):
+        """
+        Decode a single raw line
+
+        :type data: bytes
+        :rtype: str
+        """
+        raise NotImplementedError
+
+    def _try_codecs(self, data, codecs, stat_name="codec"):
+        for codec in codecs:
+            try:
+                text = data.decode(codec)
+            except UnicodeDecodeError:
+                self.stats[codec + "-failed"] += 1
+                continue
+
+            self.stats["{}:{}".format(stat_name, codec)] += 1
+            return codec, text
+
+        return None, None
+
+    def _decode_lossy(self, data):
+        self.stats["lossy"] += 1
+        return data.decode('utf-8', errors='ignore')
+
+
+class MultiCodecDecoder(Decoder):
+    """
+    Try UTF-8 and each fallback codec in order, this matches the original behavior of `cloudbot.clients.irc.decode`
+
+    >>> decoder = MultiCodecDecoder()
+    >>> decoder.decode("caf\\xe9".encode('utf-8'))
+    'café'
+    >>> decoder.decode("caf\\xe9".encode('iso-8859-1'))
+    'café'
+    >>> sorted(decoder.stats.items())
+    [('codec:iso-8859-1', 1), ('codec:utf-8', 1), ('utf-8-failed', 1)]
+    """
+
+    def decode(self, data):
+        codec, text = self._try_codecs(data, ('utf-8',) + self.fallbacks)
+        if codec is None:
+            return self._decode_lossy(data)
+
+        return text
+
+
+class FastPathDecoder(Decoder):
+    """
+    Decode pure ASCII lines directly, and only attempt UTF-8 when the line could be valid UTF-8
+
+    >>> decoder = FastPathDecoder()
+    >>> decoder.decode(b"PING :foo")
+    'PING :foo'
+    >>> decoder.decode("caf\\xe9".encode('utf-8'))
+    'café'
+    >>> decoder.decode("caf\\xe9".encode('iso-8859-1'))
+    'café'
+    >>> sorted(decoder.stats.items())
+    [('ascii', 1), ('fallback:iso-8859-1', 1), ('utf-8', 1)]
+    """
+
+    def decode(self, data):
+        if is_ascii(data):
+            self.stats["ascii"] += 1
+            return data.decode('ascii')
+
+        if may_be_utf8(data):
+            try:
+                text = data.decode('utf-8')
+            except UnicodeDecodeError:
+                self.stats["utf-8-failed"] += 1
+            else:
+                self.stats["utf-8"] += 1
+                return text
+
+        return self._decode_fallback(data)
+
+    def _decode_fallback(self, data):
+        codec, text = self._try_codecs(data, self.fallbacks, "fallback")
+        if codec is None:
+            return self._decode_lossy(data)
+
+        return text
+
+
+class RememberingDecoder(FastPathDecoder):
+    """
+    Remember the last fallback codec which worked for each sender and channel,
+    and try that first for lines which aren't UTF-8
+
+    >>> decoder = RememberingDecoder(fallbacks=('shift_jis', 'cp1252'))
+    >>> decoder.decode(b":Foo!a@b PRIVMSG #chan :caf\\xe9 \\x80")
+    ':Foo!a@b PRIVMSG #chan :café €'
+    >>> decoder.decode(b":Foo!a@b PRIVMSG #chan :caf\\xe9")
+    ':Foo!a@b PRIVMSG #chan :café'
+    >>> decoder.stats["remembered:cp1252"]
+    1
+
+    :type cache_size: int
+    """
+
+    options = ('cache_size',)
+
+    def __init__(self, fallbacks=DEFAULT_FALLBACKS, cache_size=1024):
+        super().__init__(fallbacks)
+        self.cache_size = cache_size
+        self._codecs = OrderedDict()
+
+    def get_codec(self, key):
+        """
+        Get the remembered codec for a sender or channel
+        :type key: bytes
+        :rtype: str | None
+        """
+        codec = self._codecs.get(key)
+        if codec is not None:
+            self._codecs.move_to_end(key)
+
+        return codec
+
+    def set_codec(self, key, codec):
+        """
+        Remember a codec for a sender or channel, evicting the least recently used entry if the cache is full
+        :type key: bytes
+        :type codec: str
+        """
+        self._codecs[key] = codec
+        self._codecs.move_to_end(key)
+        while len(self._codecs) > self.cache_size:
+            self._codecs.popitem(last=False)
+
+    def _decode_fallback(self, data):
+        keys = [key for key in get_line_keys(data) if key is not None]
+        remembered = []
+        for key in keys:
+            codec = self.get_codec(key)
+            if codec is not None and codec not in remembered:
+                remembered.append(codec)
+
+        codec, text = self._try_codecs(data, remembered, "remembered")
+        if codec is None:
+            codec, text = self._try_codecs(data, [c for c in self.fallbacks if c not in remembered], "fallback")
+            if codec is None:
+                return self._decode_lossy(data)
+
+        for key in keys:
+            self.set_codec(key, codec)
+
+        return text
+
+    def clear(self):
+        """
+        Forget all remembered codecs
+        """
+        self._codecs.clear()
+
+
+DECODERS = {
+    'multi': MultiCodecDecoder,
+    'fast': FastPathDecoder,
+    'remember': RememberingDecoder,
+}
+
+# Used when the config has no strategy, or an unknown one
+DEFAULT_STRATEGY = 'fast'
+
+
+def get_decoder(config):
+    """
+    Create a decoder from a connection's "decoding" config section
+
+    >>> type(get_decoder({})).__name__
+    'FastPathDecoder'
+    >>> get_decoder({'strategy': 'remember', 'fallbacks': ['cp1252']}).fallbacks
+    ('cp1252',)
+
+    :type config: dict
+    :rtype: Decoder
+    """
+    config = dict(config)
+    strategy = config.pop("strategy", DEFAULT_STRATEGY)
+    try:
+        decoder_type = DECODERS[strategy]
+    except LookupError:
+        logger.warning("Unknown decoding strategy %r, using %r", strategy, DEFAULT_STRATEGY)
+        strategy = DEFAULT_STRATEGY
+        decoder_type = DECODERS[strategy]
+
+    fallbacks = config.pop("fallbacks", DEFAULT_FALLBACKS)
+    options = {}
+    for key, value in config.items():
+        if key in decoder_type.options:
+            options[key] = value
+        else:
+            logger.warning("Ignoring unknown option %r for the %r decoding strategy", key, strategy)
+
+    return decoder_type(fallbacks, **options)
@@ -41,6 +41,20 @@ class ExecutorPool:
         self._free_executors = []
         self._executor_waiter = create_future()
 
+    @property
+    def size(self):
+        """
+        The number of executors created so far
+        """
+        return len(self._executors)
+
+    @property
+    def free(self):
+        """
+        The number of created executors not currently in use
+        """
+        return len(self._free_executors)
+
     def get(self):
         return ExecutorWrapper(self, self._get())
 
@@ -0,0 +1,245 @@
+"""
+Line framing for line-based network protocols like IRC
+
+The buffer is a single `bytearray` which is only compacted once per chunk of
+received data, so framing a burst of lines is linear in the size of the burst
+rather than quadratic.
+
+Outgoing lines are collected by a `WriteCoalescer`, so a burst of lines sent
+in the same loop iteration reaches the transport as a single write.
+"""
+
+__all__ = (
+    'LineFramer',
+    'WriteCoalescer',
+    'TLS_RECORD_SIZE',
+)
+
+# The largest plaintext payload of a single TLS record
+TLS_RECORD_SIZE = 16384
+
+
+class LineFramer:
+    """
+    Splits a stream of bytes in to lines
+
+    Lines may be terminated by either `\\r\\n` or a bare `\\n`, the terminator is
+    not included in the returned lines.
+
+    >>> framer = LineFramer()
+    >>> framer.feed(b"PING :foo\\r\\nPING :b")
+    [b'PING :foo']
+    >>> framer.feed(b"ar\\nPI")
+    [b'PING :bar']
+    >>> framer.pending
+    2
+
+    Lines longer than `max_line_length` are discarded, along with all following
+    data up to the next line terminator.
+
+    >>> framer = LineFramer(max_line_length=4)
+    >>> framer.feed(b"abcdefgh\\nabc\\r\\n")
+    [b'abc']
+    >>> framer.dropped
+    1
+
+    :type max_line_length: int | None
+    :type dropped: int
+    """
+
+    def __init__(self, max_line_length=None):
+        """
+        :param max_line_length: The maximum length of a line, excluding the
+            terminator. If None, lines may be any length.
+        """
+        self.max_line_length = max_line_length
+        self.dropped = 0
+
+        self._buffer = bytearray()
+        # Offset in to the buffer we have already searched for a terminator
+        self._scan_pos = 0
+        # Whether we are currently skipping the rest of an oversized line
+        self._discarding = False
+
+    @property
+    def pending(self):
+        """
+        The number of buffered bytes not yet returned as part of a line
+        """
+        return len(self._buffer)
+
+    def clear(self):
+        """
+        Discard all buffered data
+        """
+        self._buffer.clear()
+        self._scan_pos = 0
+        self._discarding = False
+
+    def feed(self, data):
+        """
+        Add data to the buffer and return all lines it completed
+
+        :type data: bytes | bytearray | memoryview
+        :rtype: list[bytes]
+        """
+        buf = self._buffer
+        buf += data
+
+        max_len = self.max_line_length
+        lines = []
+        start = 0
+        pos = self._scan_pos
+        with memoryview(buf) as view:
+            while True:
+                end = buf.find(b"\n", pos)
+                if end < 0:
+                    break
+
+                pos = end + 1
+                if self._discarding:
+                    self._discarding = False
+                elif end > start and buf[end - 1] == 0x0D:
+                    line_end = end - 1
+                    if max_len is not None and line_end - start > max_len:
+                        self.dropped += 1
+                    else:
+                        lines.append(bytes(view[start:line_end]))
+                elif max_len is not None and end - start > max_len:
+                    self.dropped += 1
+                else:
+                    lines.append(bytes(view[start:end]))
+
+                start = pos
+
+        if start:
+            del buf[:start]
+
+        self._scan_pos = len(buf)
+
+        # Don't hold on to an unbounded partial line, drop it and skip ahead to the next terminator.
+        # Allow one extra byte for a trailing '\r' we haven't seen the '\n' for yet.
+        if max_len is not None and len(buf) > max_len + 1:
+            if not self._discarding:
+                self.dropped += 1
+
+            self._discarding = True
+            buf.clear()
+            self._scan_pos = 0
+
+        return lines
+
+
+class WriteCoalescer:
+    """
+    Collects outgoing data and passes it to `write` in as few calls as possible
+
+    Data is flushed once the event loop has run every callback already
+    scheduled. If `max_delay` is set and more data is written within
+    `max_delay` seconds of the last flush, as when the buffer keeps filling,
+    that data is held until `max_delay` after the last flush instead, so a
+    steady stream is flushed at most once per `max_delay`. A flush is never
+    larger than `max_size` bytes unless a single piece of data is, so with the
+    default size each write fits in one TLS record.
+
+    >>> import asyncio
+    >>> loop = asyncio.new_event_loop()
+    >>> writes = []
+    >>> coalescer = WriteCoalescer(writes.append, loop, max_size=20)
+    >>> for data in (b"JOIN #a\\r\\n", b"JOIN #b\\r\\n", b"JOIN #c\\r\\n"):
+    ...     coalescer.write(data)
+    >>> writes
+    [b'JOIN #a\\r\\nJOIN #b\\r\\n']
+    >>> loop.run_until_complete(asyncio.sleep(0))
+    >>> writes
+    [b'JOIN #a\\r\\nJOIN #b\\r\\n', b'JOIN #c\\r\\n']
+    >>> loop.close()
+
+    :type max_size: int
+    :type max_delay: float
+    :type writes: int
+    :type lines: int
+    """
+
+    def __init__(self, write, loop, max_size=TLS_RECORD_SIZE, max_delay=0.0):
+        """
+        :param write: The function to pass coalesced data to, e.g. `transport.write`
+        :param max_size: The most data to pass in a single write
+        :param max_delay: The shortest time between flushes of data written
+            right after the previous flush, in seconds. If 0, data is always
+            flushed in the next iteration of the event loop.
+        :type loop: asyncio.AbstractEventLoop
+        """
+        self._write = write
+        self.loop = loop
+        self.max_size = max_size
+        self.max_delay = max_delay
+
+        self._buffer = []
+        self._size = 0
+        self._handle = None
+        self._last_flush = None
+
+        self.writes = 0
+        self.lines = 0
+
+    @property
+    def pending(self):
+        """
+        The number of bytes waiting to be flushed
+        """
+        return self._size
+
+    def write(self, data):
+        """
+        Queue data to be written
+
+        :type data: bytes
+        """
+        if self._buffer and self._size + len(data) > self.max_size:
+            self.flush()
+
+        self._buffer.append(data)
+        self._size += len(data)
+        self.lines += 1
+
+        if self._size >= self.max_size:
+            self.flush()
+        elif self._handle is None:
+            delay = 0
+            if self.max_delay > 0 and self._last_flush is not None:
+                delay = self._last_flush + self.max_delay - self.loop.time()
+
+            if delay > 0:
+                self._handle = self.loop.call_later(delay, self.flush)
+            else:
+                self._handle = self.loop.call_soon(self.flush)
+
+    def flush(self):
+        """
+        Write all queued data now
+        """
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+        if not self._buffer:
+            return
+
+        data = b"".join(self._buffer)
+        self._buffer.clear()
+        self._size = 0
+        self.writes += 1
+        self._last_flush = self.loop.time()
+        self._write(data)
+
+    def clear(self):
+        """
+        Discard all queued data, e.g. when the connection is lost
+        """
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+        self._buffer.clear()
+        self._size = 0
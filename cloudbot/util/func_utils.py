@@ -1,4 +1,6 @@
 import inspect
+from operator import attrgetter, itemgetter
+from weakref import WeakKeyDictionary
 
 
 class ParameterError(Exception):
@@ -12,11 +14,107 @@ class ParameterError(Exception):
         self.valid_args = list(valid_args)
 
 
-def call_with_args(func, arg_data):
-    sig = inspect.signature(func)
+def _no_args(_):
+    return ()
+
+
+def _make_getter(getter_type, names):
+    if not names:
+        return _no_args
+
+    getter = getter_type(*names)
+    if len(names) == 1:
+        # Single item getters return the value rather than a 1-tuple
+        return lambda data: (getter(data),)
+
+    return getter
+
+
+class ArgBinder:
+    """
+    Binds a function's arguments by name from a mapping or object
+
+    The function signature is only inspected once, when the binder is created.
+    Parameters starting with '_' are not bound, and all other parameters are passed positionally.
+
+    The binder doesn't keep a reference to the function, so it can be cached per function.
+
+    >>> def func(nick, chan, _private=None):
+    ...     return nick, chan
+    >>> binder = ArgBinder(func)
+    >>> binder.arg_names
+    ('nick', 'chan')
+    >>> func(*binder.bind({'nick': 'foo', 'chan': '#bar', 'other': 1}))
+    ('foo', '#bar')
+
+    :type arg_names: tuple[str]
+    """
+
+    __slots__ = ('arg_names', '_get_items', '_get_attrs')
+
+    def __init__(self, func):
+        self.arg_names = tuple(
+            name for name in inspect.signature(func).parameters.keys() if not name.startswith('_')
+        )
+        self._get_items = _make_getter(itemgetter, self.arg_names)
+        self._get_attrs = _make_getter(attrgetter, self.arg_names)
+
+    def validate(self, valid_args):
+        """
+        Check that every argument can be bound from `valid_args`, raising ParameterError if not
+
+        :type valid_args: collections.abc.Collection[str]
+        """
+        for name in self.arg_names:
+            if name not in valid_args:
+                raise ParameterError(name, valid_args)
+
+    def bind(self, arg_data):
+        """
+        Get the arguments for the function from a mapping
+
+        :type arg_data: collections.abc.Mapping[str, object]
+        :rtype: tuple
+        """
+        try:
+            return self._get_items(arg_data)
+        except KeyError as e:
+            raise ParameterError(e.args[0], arg_data.keys()) from e
+
+    def bind_attrs(self, obj):
+        """
+        Get the arguments for the function from the attributes of an object, such as an Event
+
+        :rtype: tuple
+        """
+        try:
+            return self._get_attrs(obj)
+        except AttributeError as e:
+            name = next((name for name in self.arg_names if not hasattr(obj, name)), e.args[0])
+            raise ParameterError(name, [attr for attr in dir(obj) if not attr.startswith('_')]) from e
+
+
+_binders = WeakKeyDictionary()
+
+
+def get_binder(func):
+    """
+    Get the cached ArgBinder for a function, creating it if needed
+
+    :type func: callable
+    :rtype: ArgBinder
+    """
     try:
-        args = [arg_data[key] for key in sig.parameters.keys() if not key.startswith('_')]
-    except KeyError as e:
-        raise ParameterError(e.args[0], arg_data.keys()) from e
+        return _binders[func]
+    except KeyError:
+        binder = ArgBinder(func)
+    except TypeError:
+        # Not weak-referenceable, so it can't be cached
+        return ArgBinder(func)
 
-    return func(*args)
+    _binders[func] = binder
+    return binder
+
+
+def call_with_args(func, arg_data):
+    return func(*get_binder(func).bind(arg_data))
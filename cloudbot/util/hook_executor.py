@@ -0,0 +1,311 @@
+"""
+Bounded thread pools for running threaded hooks and sieves
+
+Threaded hooks used to all share the event loop's default executor, so a
+single slow plugin could occupy every worker thread and stall all other
+threaded hooks. Each hook is now run in a named pool, chosen by its plugin
+or hook type, and each pool has its own worker and queue limits.
+
+Pools are configured with the "hook_executors" section of the bot config:
+
+    "hook_executors": {
+        "pools": {
+            "default": {"max_workers": 10},
+            "slow": {"max_workers": 2, "max_queue": 10, "policy": "reject", "per_plugin": true}
+        },
+        "plugins": {"core.chan_log": "slow", "sherlock": "slow"},
+        "hook_types": {"sieve": "default"}
+    }
+
+A plugin mapping takes priority over a hook type mapping, and hooks with
+neither use the "default" pool. A pool with "per_plugin" set creates a
+separate instance of itself for each plugin assigned to it.
+
+When a pool already has `max_workers + max_queue` calls pending, its
+"policy" decides what happens to new calls:
+- wait: The caller waits for a pending call to finish before submitting
+- reject: The call fails immediately with `ExecutorFullError`
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+__all__ = (
+    'ExecutorFullError',
+    'HookMetrics',
+    'BoundedExecutor',
+    'HookExecutors',
+    'POLICIES',
+)
+
+logger = logging.getLogger("cloudbot")
+
+DEFAULT_POOL = 'default'
+
+POLICIES = ('wait', 'reject')
+
+
+class ExecutorFullError(Exception):
+    def __init__(self, pool_name, limit):
+        super().__init__("Executor pool {!r} is full ({} calls pending)".format(pool_name, limit))
+        self.pool_name = pool_name
+        self.limit = limit
+
+
+class HookMetrics:
+    """
+    Queue wait and run time totals for a single hook, in seconds
+
+    >>> metrics = HookMetrics()
+    >>> metrics.record(0.5, 2.0)
+    >>> metrics.record(0.25, 1.0)
+    >>> metrics.count, metrics.wait_max, metrics.run_total
+    (2, 0.5, 3.0)
+    >>> metrics.wait_avg, metrics.run_avg
+    (0.375, 1.5)
+
+    :type latency: cloudbot.util.latency.HookLatency | None
+    """
+
+    __slots__ = ('count', 'rejected', 'wait_total', 'wait_max', 'run_total', 'run_max', 'latency')
+
+    def __init__(self, latency=None):
+        """
+        :param latency: If given, each call is also recorded in these histograms
+        """
+        self.latency = latency
+        self.count = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.run_total = 0.0
+        self.run_max = 0.0
+
+    def record(self, wait, run):
+        self.count += 1
+        self.wait_total += wait
+        self.run_total += run
+        if wait > self.wait_max:
+            self.wait_max = wait
+
+        if run > self.run_max:
+            self.run_max = run
+
+        if self.latency is not None:
+            self.latency.record(wait, run)
+
+    @property
+    def wait_avg(self):
+        return self.wait_total / self.count if self.count else 0.0
+
+    @property
+    def run_avg(self):
+        return self.run_total / self.count if self.count else 0.0
+
+
+class BoundedExecutor:
+    """
+    A thread pool with a limit on the number of pending calls
+
+    :type name: str
+    :type max_workers: int | None
+    :type max_queue: int | None
+    :type policy: str
+    :type pending: int
+    :type rejected: int
+    """
+
+    def __init__(self, name, max_workers=None, max_queue=None, policy='wait'):
+        """
+        :param name: The name of the pool, used in thread names and logging
+        :param max_workers: The number of worker threads, if None the `ThreadPoolExecutor` default is used
+        :param max_queue: The number of calls which may wait for a free worker, if None the queue is unbounded
+        :param policy: What to do with calls made while the queue is full, one of `POLICIES`
+        """
+        if policy not in POLICIES:
+            raise ValueError("Unknown executor policy {!r}".format(policy))
+
+        if max_queue is not None and max_queue < 0:
+            raise ValueError("max_queue must not be negative")
+
+        self.name = name
+        self.max_queue = max_queue
+        self.policy = policy
+        self.pending = 0
+        self.rejected = 0
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='cloudbot-hook-' + name
+        )
+        self.max_workers = self._executor._max_workers
+
+        if max_queue is None:
+            self.limit = None
+        else:
+            self.limit = self.max_workers + max_queue
+
+        # Created on first use so it is bound to the running loop
+        self._slots = None
+
+    async def _acquire(self):
+        if self.limit is None:
+            return
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.limit)
+
+        if self._slots.locked() and self.policy == 'reject':
+            self.rejected += 1
+            raise ExecutorFullError(self.name, self.limit)
+
+        await self._slots.acquire()
+
+    def _release(self):
+        if self._slots is not None:
+            self._slots.release()
+
+    async def run(self, func, *args, metrics=None):
+        """
+        Run `func(*args)` in the pool and return its result
+
+        :param metrics: If given, the call's queue wait and run time are recorded in it
+        :type metrics: HookMetrics | None
+        """
+        queued = time.perf_counter()
+        try:
+            await self._acquire()
+        except ExecutorFullError:
+            if metrics is not None:
+                metrics.rejected += 1
+
+            raise
+
+        started = []
+
+        def _call():
+            started.append(time.perf_counter())
+            return func(*args)
+
+        self.pending += 1
+        try:
+            return await asyncio.wrap_future(self._executor.submit(_call))
+        finally:
+            self.pending -= 1
+            self._release()
+            if metrics is not None and started:
+                metrics.record(started[0] - queued, time.perf_counter() - started[0])
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+class HookExecutors:
+    """
+    Assigns hooks to their executor pools and tracks per-hook metrics
+
+    :type pools: dict[str, BoundedExecutor]
+    :type metrics: dict[str, HookMetrics]
+    """
+
+    def __init__(self, config=None, latency=None):
+        """
+        :param config: The "hook_executors" config section
+        :param latency: If given, the wait and run times of each call are also recorded in its histograms
+        :type config: dict | None
+        :type latency: cloudbot.util.latency.LatencyTracker | None
+        """
+        config = config or {}
+        self.latency = latency
+        self.pool_configs = dict(config.get("pools", {}))
+        self.pool_configs.setdefault(DEFAULT_POOL, {})
+        self.plugin_pools = dict(config.get("plugins", {}))
+        self.hook_type_pools = dict(config.get("hook_types", {}))
+
+        for pool_config in self.pool_configs.values():
+            policy = pool_config.get("policy", 'wait')
+            if policy not in POLICIES:
+                raise ValueError("Unknown executor policy {!r}".format(policy))
+
+        self.pools = {}
+        self.metrics = {}
+
+    def get_pool_name(self, hook):
+        """
+        Get the name of the pool a hook should run in
+
+        :type hook: cloudbot.plugin_hooks.Hook
+        :rtype: str
+        """
+        name = self.plugin_pools.get(hook.plugin.title)
+        if name is None:
+            name = self.hook_type_pools.get(hook.type, DEFAULT_POOL)
+
+        if name not in self.pool_configs:
+            logger.warning("Unknown executor pool %r for hook %s, using %r", name, hook.description, DEFAULT_POOL)
+            name = DEFAULT_POOL
+
+        if self.pool_configs[name].get("per_plugin", False):
+            return "{}:{}".format(name, hook.plugin.title)
+
+        return name
+
+    def get_executor(self, hook):
+        """
+        Get the executor pool for a hook, creating it if needed
+
+        :type hook: cloudbot.plugin_hooks.Hook
+        :rtype: BoundedExecutor
+        """
+        name = self.get_pool_name(hook)
+        try:
+            return self.pools[name]
+        except LookupError:
+            pass
+
+        pool_config = dict(self.pool_configs[name.partition(':')[0]])
+        pool_config.pop("per_plugin", None)
+        self.pools[name] = executor = BoundedExecutor(name, **pool_config)
+        return executor
+
+    def get_metrics(self, hook):
+        """
+        :type hook: cloudbot.plugin_hooks.Hook
+        :rtype: HookMetrics
+        """
+        try:
+            return self.metrics[hook.description]
+        except LookupError:
+            latency = None if self.latency is None else self.latency.get(hook)
+            self.metrics[hook.description] = metrics = HookMetrics(latency)
+            return metrics
+
+    async def run(self, hook, func, *args):
+        """
+        Run `func(*args)` in the pool for `hook`
+
+        :type hook: cloudbot.plugin_hooks.Hook
+        """
+        return await self.get_executor(hook).run(func, *args, metrics=self.get_metrics(hook))
+
+    def shutdown_plugin(self, title, wait=False):
+        """
+        Shut down the "per_plugin" pools created for a plugin, e.g. when it is unloaded
+
+        Shared pools are left running for the other plugins using them.
+
+        :param title: The plugin's title
+        :param wait: Whether to wait for calls already submitted to finish
+        :type title: str
+        :type wait: bool
+        """
+        names = [name for name in self.pools if name.partition(':')[2] == title]
+        for name in names:
+            self.pools.pop(name).shutdown(wait=wait)
+
+    def shutdown(self, wait=True):
+        for pool in self.pools.values():
+            pool.shutdown(wait=wait)
+
+        self.pools.clear()
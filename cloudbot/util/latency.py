@@ -0,0 +1,235 @@
+"""
+Fixed memory latency histograms for hooks
+
+Values are counted in log-linear buckets, in the style of HdrHistogram: each
+power of two range is split in to a fixed number of equal sub-buckets, so the
+relative error of any reported value is bounded regardless of its magnitude,
+and a histogram never grows no matter how many values are recorded.
+"""
+
+from array import array
+
+__all__ = (
+    'Histogram',
+    'HookLatency',
+    'LatencyTracker',
+    'PHASES',
+)
+
+# The phases of a hook launch which are timed
+# - wait: Time spent queued for a worker thread, only recorded for threaded hooks
+# - sieve: Time spent running the sieves for the hook
+# - run: Time spent running the hook itself
+# - post: Time spent running post hooks after the hook
+PHASES = ('wait', 'sieve', 'run', 'post')
+
+# Each power of two range is split in to 2 ** (SUB_BUCKET_BITS - 1) buckets, so values are accurate to within 1/16th
+SUB_BUCKET_BITS = 5
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+SUB_BUCKET_HALF = SUB_BUCKET_COUNT >> 1
+
+# Values are recorded in microseconds, up to about 19 hours
+UNITS_PER_SECOND = 1000000
+MAX_VALUE_BITS = 36
+
+
+def _bucket_index(value):
+    """
+    >>> [_bucket_index(v) for v in (0, 31, 32, 33, 34, 64, 68)]
+    [0, 31, 32, 32, 33, 48, 49]
+    """
+    if value < SUB_BUCKET_COUNT:
+        return value
+
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    return shift * SUB_BUCKET_HALF + (value >> shift)
+
+
+def _bucket_bounds(index):
+    """
+    Get the (lowest, highest) value counted in a bucket
+
+    >>> _bucket_bounds(5)
+    (5, 5)
+    >>> _bucket_bounds(49)
+    (68, 71)
+    """
+    if index < SUB_BUCKET_COUNT:
+        return index, index
+
+    block, pos = divmod(index - SUB_BUCKET_COUNT, SUB_BUCKET_HALF)
+    shift = block + 1
+    mantissa = SUB_BUCKET_HALF + pos
+    return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+
+BUCKET_COUNT = _bucket_index((1 << MAX_VALUE_BITS) - 1) + 1
+
+
+class Histogram:
+    """
+    A histogram of durations in seconds
+
+    >>> hist = Histogram()
+    >>> for ms in range(1, 101):
+    ...     hist.record(ms / 1000)
+    >>> hist.count, hist.max
+    (100, 0.1)
+    >>> round(hist.percentile(50), 3), round(hist.percentile(99), 3)
+    (0.05, 0.1)
+
+    :type count: int
+    :type total: float
+    :type min: float | None
+    :type max: float
+    """
+
+    __slots__ = ('_counts', 'count', 'total', 'min', 'max')
+
+    def __init__(self):
+        # The buckets are only allocated once a value is recorded
+        self._counts = None
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+
+    def record(self, seconds):
+        """
+        :type seconds: float
+        """
+        if seconds < 0:
+            seconds = 0.0
+
+        counts = self._counts
+        if counts is None:
+            self._counts = counts = array('I', [0]) * BUCKET_COUNT
+
+        value = int(seconds * UNITS_PER_SECOND)
+        counts[min(_bucket_index(value), BUCKET_COUNT - 1)] += 1
+
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percent):
+        """
+        Get the value below which `percent` percent of recorded values fall, in seconds
+
+        :type percent: float
+        :rtype: float
+        """
+        if not self.count:
+            return 0.0
+
+        target = max(1, int(round(self.count * percent / 100)))
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= target:
+                if index == BUCKET_COUNT - 1:
+                    # The last bucket also counts every value too large for the histogram
+                    return self.max
+
+                low, high = _bucket_bounds(index)
+                value = (low + high) / 2 / UNITS_PER_SECOND
+                # The bucket midpoint can be outside the range actually recorded
+                return min(max(value, self.min), self.max)
+
+        return self.max  # pragma: no cover
+
+    def snapshot(self):
+        """
+        Summarize the histogram for export
+
+        :rtype: dict
+        """
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'min': self.min or 0.0,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+        }
+
+
+class HookLatency:
+    """
+    The latency histograms for each phase of a single hook's launches
+    """
+
+    __slots__ = PHASES
+
+    def __init__(self):
+        for phase in PHASES:
+            setattr(self, phase, Histogram())
+
+    def record(self, wait, run):
+        """
+        Record a call made through an executor pool
+
+        :type wait: float
+        :type run: float
+        """
+        self.wait.record(wait)
+        self.run.record(run)
+
+    def snapshot(self):
+        """
+        :rtype: dict[str, dict]
+        """
+        return {phase: getattr(self, phase).snapshot() for phase in PHASES if getattr(self, phase).count}
+
+
+class LatencyTracker:
+    """
+    Latency histograms for every hook, keyed by hook description
+
+    :type hooks: dict[str, HookLatency]
+    """
+
+    def __init__(self):
+        self.hooks = {}
+
+    def get(self, hook):
+        """
+        :type hook: cloudbot.plugin_hooks.Hook
+        :rtype: HookLatency
+        """
+        try:
+            return self.hooks[hook.description]
+        except LookupError:
+            self.hooks[hook.description] = latency = HookLatency()
+            return latency
+
+    def slowest(self, phase='run', percent=99, count=10):
+        """
+        Get the hooks with the highest latency percentile in a phase
+
+        :rtype: list[(str, Histogram)]
+        """
+        hists = [(name, getattr(latency, phase)) for name, latency in self.hooks.items()]
+        hists = [(name, hist) for name, hist in hists if hist.count]
+        hists.sort(key=lambda item: item[1].percentile(percent), reverse=True)
+        return hists[:count]
+
+    def snapshot(self):
+        """
+        Summarize all histograms for export, e.g. as JSON
+
+        :rtype: dict[str, dict[str, dict]]
+        """
+        return {name: latency.snapshot() for name, latency in sorted(self.hooks.items())}
+
+    def clear(self):
+        self.hooks.clear()
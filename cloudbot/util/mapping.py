@@ -1,8 +1,13 @@
+from bisect import bisect_left, insort
 from collections import defaultdict
 
+from cloudbot.util.casemap import get_casemap
+
 __all__ = (
+    'CaseMapDict',
     'KeyFoldDict',
     'KeyFoldMixin',
+    'PrefixDict',
 )
 
 
@@ -69,3 +74,239 @@ class DefaultKeyFoldDict(KeyFoldMixin, defaultdict):
     """
     KeyFolded defaultdict
     """
+
+
+class CaseMapDict(dict):
+    """
+    A dict keyed by IRC identifiers, folded with the server's CASEMAPPING rather than `str.casefold()`
+
+    >>> data = CaseMapDict()
+    >>> data['Nick[m]'] = 1
+    >>> data['nick{M}']
+    1
+    >>> data = CaseMapDict(casemap='ascii')
+    >>> data['Nick[m]'] = 1
+    >>> 'nick{m}' in data
+    False
+    >>> data.set_casemap('rfc1459')
+    >>> 'nick{m}' in data
+    True
+    """
+
+    def __init__(self, *args, casemap=None, **kwargs):
+        """
+        :param casemap: The CASEMAPPING name, or a `CaseMap`
+        :type casemap: str | cloudbot.util.casemap.CaseMap | None
+        """
+        super().__init__()
+        self.casemap = None
+        self.fold = None
+        self.set_casemap(casemap)
+        self.update(*args, **kwargs)
+
+    def set_casemap(self, casemap):
+        """
+        Change the case mapping, refolding any existing keys
+
+        Keys are only stored folded, so this is only lossless when moving to a wider mapping,
+        e.g. when the server's CASEMAPPING arrives after keys were added with the default.
+
+        :type casemap: str | cloudbot.util.casemap.CaseMap | None
+        """
+        if casemap is None or isinstance(casemap, str):
+            casemap = get_casemap(casemap)
+
+        if casemap is self.casemap:
+            return
+
+        self.casemap = casemap
+        self.fold = casemap.fold
+        items = list(super().items())
+        super().clear()
+        for key, value in items:
+            super().__setitem__(self.fold(key), value)
+
+    def key_for(self, key, folded=None, casemap=None):
+        """
+        Get the stored form of `key`, reusing an already folded copy if it was folded with this dict's case mapping
+
+        This lets hooks pass an event's `folded_nick` or `folded_chan` straight through.
+
+        >>> data = CaseMapDict(casemap='rfc1459')
+        >>> data.key_for('Nick[m]', 'nick{m}', data.casemap)
+        'nick{m}'
+        >>> data.key_for('Nick[m]', 'nick[m]', get_casemap('ascii'))
+        'nick{m}'
+
+        :type key: str
+        :type folded: str | None
+        :type casemap: cloudbot.util.casemap.CaseMap | None
+        :rtype: str
+        """
+        if folded is not None and casemap is self.casemap:
+            return folded
+
+        return self.fold(key)
+
+    def get_folded(self, folded, default=None):
+        """
+        Wraps `dict.get`, for a key returned by `key_for()`
+        """
+        return super().get(folded, default)
+
+    def set_folded(self, folded, value):
+        """
+        Wraps `dict.__setitem__`, for a key returned by `key_for()`
+        """
+        super().__setitem__(folded, value)
+
+    def __contains__(self, item):
+        return super().__contains__(self.fold(item))
+
+    def __getitem__(self, item):
+        return super().__getitem__(self.fold(item))
+
+    def __setitem__(self, key, value):
+        return super().__setitem__(self.fold(key), value)
+
+    def __delitem__(self, key):
+        return super().__delitem__(self.fold(key))
+
+    def pop(self, key, *args):
+        """
+        Wraps `dict.pop`
+        """
+        return super().pop(self.fold(key), *args)
+
+    def get(self, key, default=None):
+        """
+        Wraps `dict.get`
+        """
+        return super().get(self.fold(key), default)
+
+    def setdefault(self, key, default=None):
+        """
+        Wraps `dict.setdefault`
+        """
+        return super().setdefault(self.fold(key), default)
+
+    def update(self, *args, **kwargs):
+        """
+        Wraps `dict.update`
+        """
+        if args:
+            mapping = args[0]
+            if hasattr(mapping, 'keys'):
+                for k in mapping.keys():
+                    self[k] = mapping[k]
+            else:
+                for k, v in mapping:
+                    self[k] = v
+
+        for k in kwargs:
+            self[k] = kwargs[k]
+
+
+class PrefixDict(dict):
+    """
+    A dict of string keys which keeps a sorted index of its keys, allowing
+    lookups of all keys starting with a prefix in O(log n + matches)
+
+    >>> data = PrefixDict(foo=1, foobar=2, bar=3)
+    >>> data.startswith('foo')
+    [('foo', 1), ('foobar', 2)]
+    >>> del data['foo']
+    >>> data.startswith('fo')
+    [('foobar', 2)]
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self._keys = []
+        self.update(*args, **kwargs)
+
+    def __setitem__(self, key, value):
+        if key not in self:
+            insort(self._keys, key)
+
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._remove_key(key)
+
+    def _remove_key(self, key):
+        del self._keys[bisect_left(self._keys, key)]
+
+    def pop(self, key, *args):
+        """
+        Wraps `dict.pop`
+        """
+        if key in self:
+            self._remove_key(key)
+
+        return super().pop(key, *args)
+
+    def popitem(self):
+        """
+        Wraps `dict.popitem`
+        """
+        key, value = super().popitem()
+        self._remove_key(key)
+        return key, value
+
+    def setdefault(self, key, default=None):
+        """
+        Wraps `dict.setdefault`
+        """
+        if key not in self:
+            self[key] = default
+
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        """
+        Wraps `dict.update`
+        """
+        if args:
+            mapping = args[0]
+            if hasattr(mapping, 'keys'):
+                for k in mapping.keys():
+                    self[k] = mapping[k]
+            else:
+                for k, v in mapping:
+                    self[k] = v
+
+        for k in kwargs:
+            self[k] = kwargs[k]
+
+    def clear(self):
+        """
+        Wraps `dict.clear`
+        """
+        super().clear()
+        self._keys.clear()
+
+    def copy(self):
+        """
+        Return a shallow copy, preserving the index
+        """
+        return type(self)(self)
+
+    def startswith(self, prefix):
+        """
+        Get all items whose key starts with `prefix`, sorted by key
+
+        :type prefix: str
+        :rtype: list[tuple[str, object]]
+        """
+        keys = self._keys
+        matches = []
+        for i in range(bisect_left(keys, prefix), len(keys)):
+            key = keys[i]
+            if not key.startswith(prefix):
+                break
+
+            matches.append((key, self[key]))
+
+        return matches
@@ -0,0 +1,142 @@
+"""
+Match a hostmask against many banmask-style patterns at once
+
+Patterns without wildcards are kept in a set, the rest are compiled into a single regex,
+so a lookup costs one hash and one regex match no matter how many patterns there are.
+Matching is case sensitive, callers should fold masks and patterns the same way.
+
+>>> index = MaskIndex(['admin!*@staff.example.com', 'op!op@host', '*!*@10.0.0.?'])
+>>> index.match('op!op@host')
+True
+>>> index.match('admin!x@staff.example.com')
+True
+>>> index.match('user!x@10.0.0.15')
+False
+>>> index.matching('user!x@10.0.0.1')
+['*!*@10.0.0.?']
+"""
+import re
+
+from irclib.util.compare import match_mask
+
+__all__ = ('MaskIndex', 'is_wildcard', 'mask_to_regex')
+
+WILDCARDS = frozenset('*?')
+
+GLOB_MAP = {
+    '?': '.',
+    '*': '.*',
+}
+
+
+def is_wildcard(pattern):
+    """
+    :type pattern: str
+    :rtype: bool
+    """
+    return not WILDCARDS.isdisjoint(pattern)
+
+
+def mask_to_regex(pattern):
+    """
+    Translate a banmask pattern to a regex, matching the same masks as `irclib.util.compare.match_mask`
+
+    :type pattern: str
+    :rtype: str
+    """
+    return ''.join(GLOB_MAP.get(c) or re.escape(c) for c in pattern)
+
+
+class MaskIndex:
+    """
+    A set of hostmask patterns
+    """
+
+    __slots__ = ('literal', 'wildcard', '_regex')
+
+    def __init__(self, patterns=()):
+        """
+        :type patterns: collections.abc.Iterable[str]
+        """
+        self.literal = set()
+        self.wildcard = set()
+        # Compiled on the next lookup after the patterns change
+        self._regex = None
+        for pattern in patterns:
+            self.add(pattern)
+
+    def __len__(self):
+        return len(self.literal) + len(self.wildcard)
+
+    def __iter__(self):
+        yield from self.literal
+        yield from self.wildcard
+
+    def __contains__(self, pattern):
+        return pattern in self.literal or pattern in self.wildcard
+
+    def add(self, pattern):
+        """
+        :type pattern: str
+        """
+        if is_wildcard(pattern):
+            if pattern not in self.wildcard:
+                self.wildcard.add(pattern)
+                self._regex = None
+        else:
+            self.literal.add(pattern)
+
+    def discard(self, pattern):
+        """
+        :type pattern: str
+        """
+        if pattern in self.wildcard:
+            self.wildcard.remove(pattern)
+            self._regex = None
+        else:
+            self.literal.discard(pattern)
+
+    def clear(self):
+        self.literal.clear()
+        self.wildcard.clear()
+        self._regex = None
+
+    @property
+    def regex(self):
+        """
+        The combined regex of all wildcard patterns, or None if there are none
+
+        :rtype: typing.Pattern | None
+        """
+        if self._regex is None and self.wildcard:
+            self._regex = re.compile('^(?:{})$'.format('|'.join(
+                mask_to_regex(pattern) for pattern in sorted(self.wildcard)
+            )))
+
+        return self._regex
+
+    def match(self, mask):
+        """
+        Check whether any pattern matches `mask`
+
+        :type mask: str
+        :rtype: bool
+        """
+        if mask in self.literal:
+            return True
+
+        regex = self.regex
+        return regex is not None and regex.match(mask) is not None
+
+    def matching(self, mask):
+        """
+        Get all patterns which match `mask`, for when it matters which ones did
+
+        :type mask: str
+        :rtype: list[str]
+        """
+        matches = [mask] if mask in self.literal else []
+        if self.match(mask):
+            matches.extend(sorted(pattern for pattern in self.wildcard if match_mask(mask, pattern)))
+
+        return matches
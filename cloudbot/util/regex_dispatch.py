@@ -0,0 +1,178 @@
+"""
+Prefiltering for regex hooks
+
+Most regex hooks can only match text containing some fixed string, a URL
+hook for example needs the domain name to appear in the message. The
+dispatcher extracts one such literal from each regex when the hooks are
+registered, and only runs the full regex search for hooks whose literal
+actually appears in the message.
+"""
+
+import re
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:  # pragma: no cover
+    import sre_parse
+
+__all__ = (
+    'RegexDispatcher',
+    'required_literal',
+)
+
+# Literals shorter than this filter too little to be worth checking
+MIN_LITERAL_LENGTH = 2
+
+# Characters which `re.IGNORECASE` treats as equal to an ASCII letter, but `str.lower()` doesn't convert
+_FOLD_FIXES = str.maketrans({
+    'ı': 'i',  # LATIN SMALL LETTER DOTLESS I
+    'ſ': 's',  # LATIN SMALL LETTER LONG S
+})
+
+# Characters whose `str.lower()` is more than one character, which would split them from the text around them
+_PRE_FOLD_FIXES = str.maketrans({
+    'İ': 'i',  # LATIN CAPITAL LETTER I WITH DOT ABOVE, lowers to 'i' + COMBINING DOT ABOVE
+})
+
+
+def fold(text):
+    """
+    Fold text for comparison with a case-insensitive literal
+
+    >>> fold("HeLLo \\u017fir")
+    'hello sir'
+    >>> fold("\\u0130x")
+    'ix'
+    """
+    return text.translate(_PRE_FOLD_FIXES).lower().translate(_FOLD_FIXES)
+
+
+def _literal_runs(parsed, ignore_case):
+    run = []
+    for op, av in parsed:
+        if op is sre_parse.LITERAL:
+            char = chr(av)
+            if ignore_case:
+                if char >= '\x80':
+                    # Case-insensitive matching of non-ASCII text has too many special cases
+                    yield ''.join(run)
+                    run = []
+                    continue
+
+                char = char.lower()
+
+            run.append(char)
+        elif op is sre_parse.SUBPATTERN and not any(av[1:-1]):
+            # A plain group with no scoped flags, its contents are matched in sequence with ours
+            sub_runs = list(_literal_runs(av[-1], ignore_case))
+            if len(sub_runs) == 1:
+                run.extend(sub_runs[0])
+            else:
+                run.extend(sub_runs[0])
+                yield ''.join(run)
+                yield from sub_runs[1:-1]
+                run = list(sub_runs[-1])
+        else:
+            yield ''.join(run)
+            run = []
+
+    yield ''.join(run)
+
+
+def required_literal(regex):
+    """
+    Find a string which must appear in any text `regex` can match
+
+    Returns a tuple of (literal, ignore_case), or None if no useful literal could be found.
+    If `ignore_case` is True, the literal must be compared against `fold(text)`.
+
+    >>> required_literal(re.compile(r"youtube\\.com/watch\\?v=(\\w+)"))
+    ('youtube.com/watch?v=', False)
+    >>> required_literal(re.compile(r"(?:https?://)?(www\\.)?Reddit\\.com/r/", re.I))
+    ('reddit.com/r/', True)
+    >>> required_literal(re.compile(r"^(hi|hello)\\b")) is None
+    True
+
+    :type regex: re.__Regex
+    :rtype: (str, bool) | None
+    """
+    if not isinstance(regex.pattern, str) or regex.flags & (re.LOCALE | re.ASCII):
+        return None
+
+    ignore_case = bool(regex.flags & re.IGNORECASE)
+    try:
+        parsed = sre_parse.parse(regex.pattern, regex.flags)
+    except Exception:  # pragma: no cover
+        return None
+
+    literal = max(_literal_runs(parsed, ignore_case), key=len)
+    if len(literal) < MIN_LITERAL_LENGTH:
+        return None
+
+    return literal, ignore_case
+
+
+class RegexDispatcher:
+    """
+    Selects the (regex, hook) pairs which could match a message, in their original order
+
+    Skipped pairs are exactly those whose `regex.search()` would return None,
+    so running the full search on only the returned candidates gives the same
+    matches as searching every pair.
+
+    >>> dispatcher = RegexDispatcher([(re.compile("foo+"), 'a'), (re.compile("bar", re.I), 'b'), (re.compile("."), 'c')])
+    >>> [hook for _, hook in dispatcher.candidates("BAR")]
+    ['b', 'c']
+    >>> [hook for _, hook in dispatcher.candidates("nothing")]
+    ['c']
+
+    :type regex_hooks: list[(re.__Regex, cloudbot.plugin_hooks.RegexHook)]
+    """
+
+    def __init__(self, regex_hooks, enabled=True):
+        """
+        :param regex_hooks: The (regex, hook) pairs to dispatch to, in priority order
+        :param enabled: If False, every pair is always a candidate
+        """
+        self.regex_hooks = list(regex_hooks)
+        self.enabled = enabled
+
+        # Each entry is (regex_hook_pair, literal, ignore_case), with literal None for pairs we can't filter
+        self._entries = []
+        for pair in self.regex_hooks:
+            found = required_literal(pair[0]) if enabled else None
+            if found is None:
+                self._entries.append((pair, None, False))
+            else:
+                self._entries.append((pair, found[0], found[1]))
+
+        self._unfiltered = [pair for pair, literal, _ in self._entries if literal is None]
+        self._literals = {literal for _, literal, ignore_case in self._entries if literal and not ignore_case}
+        self._folded_literals = {literal for _, literal, ignore_case in self._entries if literal and ignore_case}
+
+    @property
+    def filtered_count(self):
+        """
+        The number of (regex, hook) pairs which can be skipped based on their literal
+        """
+        return len(self.regex_hooks) - len(self._unfiltered)
+
+    def candidates(self, content):
+        """
+        Get the (regex, hook) pairs which may match `content`
+
+        :type content: str
+        :rtype: list[(re.__Regex, cloudbot.plugin_hooks.RegexHook)]
+        """
+        if not self._literals and not self._folded_literals:
+            return self._unfiltered
+
+        found = {literal for literal in self._literals if literal in content}
+        if self._folded_literals:
+            folded = fold(content)
+            found.update(literal for literal in self._folded_literals if literal in folded)
+
+        if not found:
+            return self._unfiltered
+
+        return [pair for pair, literal, _ in self._entries if literal is None or literal in found]
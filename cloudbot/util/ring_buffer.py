@@ -0,0 +1,67 @@
+"""
+A fixed size buffer which discards its oldest items when full
+"""
+
+from collections import deque
+
+__all__ = (
+    'RingBuffer',
+)
+
+
+class RingBuffer:
+    """
+    A bounded FIFO buffer, for cheaply collecting items which are consumed later in batches
+
+    Appending and draining are both safe to do from different threads.
+
+    >>> buffer = RingBuffer(2)
+    >>> buffer.append(1)
+    >>> buffer.append(2)
+    >>> buffer.append(3)
+    >>> buffer.drain()
+    [2, 3]
+    >>> buffer.dropped
+    1
+
+    :type maxlen: int
+    :type dropped: int
+    """
+
+    __slots__ = ('_items', 'maxlen', 'dropped')
+
+    def __init__(self, maxlen):
+        if maxlen <= 0:
+            raise ValueError("maxlen must be greater than 0")
+
+        self._items = deque(maxlen=maxlen)
+        self.maxlen = maxlen
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def append(self, item):
+        items = self._items
+        if len(items) == self.maxlen:
+            self.dropped += 1
+
+        items.append(item)
+
+    def drain(self, limit=None):
+        """
+        Remove and return the oldest items in the buffer
+
+        :param limit: The maximum number of items to return, if None the whole buffer is drained
+        :rtype: list
+        """
+        items = self._items
+        out = []
+        pop = items.popleft
+        while limit is None or len(out) < limit:
+            try:
+                out.append(pop())
+            except IndexError:
+                break
+
+        return out
@@ -0,0 +1,206 @@
+"""
+Scheduling of outgoing IRC lines
+
+Lines are queued by priority class, and within each class are taken from each
+target in turn, so one long reply can't hold up replies to other channels.
+"""
+
+from collections import OrderedDict, deque
+
+__all__ = (
+    'URGENT',
+    'ADMIN',
+    'NORMAL',
+    'PRIORITY_NAMES',
+    'URGENT_COMMANDS',
+    'COALESCE_COMMANDS',
+    'get_line_info',
+    'OutboundQueue',
+)
+
+URGENT = 0
+ADMIN = 1
+NORMAL = 2
+
+PRIORITY_NAMES = ('urgent', 'admin', 'normal')
+
+# Commands which keep the connection alive or registered, these are never held back
+URGENT_COMMANDS = frozenset({
+    "PONG", "PING", "CAP", "AUTHENTICATE", "PASS", "NICK", "USER", "QUIT",
+})
+
+# Commands where sending a line twice has the same effect as sending it once, only these are coalesced.
+# A repeated PRIVMSG, for example, may be a legitimate reply to a second user.
+COALESCE_COMMANDS = frozenset({
+    "JOIN", "MODE", "WHO", "NAMES",
+})
+
+
+def get_line_info(line):
+    """
+    Get the (command, target) of a raw outgoing line, the target is casefolded for comparison
+
+    >>> get_line_info("PRIVMSG #Chan :hello")
+    ('PRIVMSG', '#chan')
+    >>> get_line_info(":me PONG :server")
+    ('PONG', ':server')
+    >>> get_line_info("QUIT")
+    ('QUIT', None)
+
+    :type line: str
+    :rtype: (str, str | None)
+    """
+    while line[:1] in ('@', ':'):
+        line = line.partition(' ')[2]
+
+    parts = line.split(' ', 2)
+    if not parts[0]:
+        return '', None
+
+    command = parts[0].upper()
+    target = parts[1].casefold() if len(parts) > 1 else None
+    return command, target
+
+
+class OutboundQueue:
+    """
+    A queue of outgoing lines, with priority classes, per-target round robin and duplicate coalescing
+
+    >>> queue = OutboundQueue(admin_targets=['#admin'])
+    >>> for line in ("PRIVMSG #a :1", "PRIVMSG #a :2", "PRIVMSG #b :3", "PRIVMSG #admin :4", "PONG :x"):
+    ...     _ = queue.push(line)
+    >>> [queue.pop()[0] for _ in range(len(queue))]
+    ['PONG :x', 'PRIVMSG #admin :4', 'PRIVMSG #a :1', 'PRIVMSG #b :3', 'PRIVMSG #a :2']
+
+    :type coalesce: bool
+    :type pushed: int
+    :type coalesced: int
+    :type max_depth: int
+    """
+
+    def __init__(self, admin_targets=(), coalesce=True):
+        """
+        :param admin_targets: Targets whose lines are sent before normal lines, e.g. the admin log channel
+        :param coalesce: If True, a line in `COALESCE_COMMANDS` identical to the last line still waiting for its target
+            is dropped. Only the last line is checked, so e.g. JOIN, PART, JOIN still sends all three.
+        """
+        self.admin_targets = {target.casefold() for target in admin_targets if target}
+        self.coalesce = coalesce
+
+        # One OrderedDict of target -> deque of (line, data) per priority class
+        self._classes = tuple(OrderedDict() for _ in PRIORITY_NAMES)
+        self._depths = [0] * len(PRIORITY_NAMES)
+
+        self.pushed = 0
+        self.coalesced = 0
+        self.max_depth = 0
+
+    def __len__(self):
+        return sum(self._depths)
+
+    @property
+    def depths(self):
+        """
+        The number of queued lines in each priority class
+
+        :rtype: dict[str, int]
+        """
+        return dict(zip(PRIORITY_NAMES, self._depths))
+
+    def classify(self, line):
+        """
+        Get the priority class and target of a line
+
+        :type line: str
+        :rtype: (int, str | None)
+        """
+        command, target = get_line_info(line)
+        return self._get_class(command, target), target
+
+    def _get_class(self, command, target):
+        if command in URGENT_COMMANDS:
+            return URGENT
+
+        if target in self.admin_targets:
+            return ADMIN
+
+        return NORMAL
+
+    def push(self, line, data=None, priority=None):
+        """
+        Add a line to the queue
+
+        :param data: Extra data to return with the line from `pop()`
+        :param priority: The priority class for the line, if None it is determined from the line
+        :return: False if the line was coalesced with an already queued line, True otherwise
+        :rtype: bool
+        """
+        command, target = get_line_info(line)
+        klass = self._get_class(command, target) if priority is None else priority
+
+        targets = self._classes[klass]
+        lines = targets.get(target)
+        if lines is None:
+            targets[target] = deque([(line, data)])
+        elif self.coalesce and command in COALESCE_COMMANDS and lines[-1][0] == line:
+            self.coalesced += 1
+            return False
+        else:
+            lines.append((line, data))
+
+        self._depths[klass] += 1
+        self.pushed += 1
+
+        depth = len(self)
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+        return True
+
+    def peek_priority(self):
+        """
+        Get the priority class of the next line `pop()` would return
+
+        :rtype: int | None
+        """
+        for klass, depth in enumerate(self._depths):
+            if depth:
+                return klass
+
+        return None
+
+    def pop(self):
+        """
+        Remove and return the next (line, data) to send
+
+        :raises IndexError: If the queue is empty
+        """
+        klass = self.peek_priority()
+        if klass is None:
+            raise IndexError("pop from an empty queue")
+
+        targets = self._classes[klass]
+        target, lines = next(iter(targets.items()))
+        line, data = lines.popleft()
+        if lines:
+            # Let every other target in this class go before this one again
+            targets.move_to_end(target)
+        else:
+            del targets[target]
+
+        self._depths[klass] -= 1
+        return line, data
+
+    def clear(self):
+        """
+        Discard all queued lines
+
+        :return: The number of lines discarded
+        :rtype: int
+        """
+        count = len(self)
+        for targets in self._classes:
+            targets.clear()
+
+        self._depths = [0] * len(PRIORITY_NAMES)
+        return count
@@ -0,0 +1,82 @@
+"""
+Tracking of the asyncio tasks started on behalf of a plugin
+"""
+
+__all__ = (
+    'TaskRegistry',
+)
+
+
+class TaskRegistry:
+    """
+    A set of in-flight tasks, which removes each task when it finishes
+
+    >>> import asyncio
+    >>> loop = asyncio.new_event_loop()
+    >>> registry = TaskRegistry()
+    >>> task = registry.add(loop.create_task(asyncio.sleep(0)))
+    >>> len(registry)
+    1
+    >>> loop.run_until_complete(task)
+    >>> len(registry), registry.started, registry.completed
+    (0, 1, 1)
+    >>> loop.close()
+
+    :type started: int
+    :type completed: int
+    :type cancelled: int
+    """
+
+    __slots__ = ('_tasks', 'started', 'completed', 'cancelled')
+
+    def __init__(self):
+        self._tasks = set()
+        self.started = 0
+        self.completed = 0
+        self.cancelled = 0
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def __iter__(self):
+        # Iterate over a copy, as tasks may finish while the caller is iterating
+        return iter(list(self._tasks))
+
+    def __contains__(self, task):
+        return task in self._tasks
+
+    @property
+    def in_flight(self):
+        return len(self._tasks)
+
+    def add(self, task):
+        """
+        Track a task until it is done
+
+        :type task: asyncio.Future
+        :return: The task, to allow chaining
+        """
+        self._tasks.add(task)
+        self.started += 1
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task):
+        self._tasks.discard(task)
+        if task.cancelled():
+            self.cancelled += 1
+        else:
+            self.completed += 1
+
+    def cancel_all(self):
+        """
+        Cancel all in-flight tasks
+
+        :return: The number of tasks cancelled
+        :rtype: int
+        """
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+
+        return len(tasks)
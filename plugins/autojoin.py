@@ -5,6 +5,7 @@ from sqlalchemy.exc import IntegrityError
 
 from cloudbot import hook
 from cloudbot.util import database
+from plugins.core.server_info import join_channels
 
 table = Table(
     'autojoin',
@@ -23,10 +24,7 @@ def get_channels(db, conn):
 @hook.irc_raw('376')
 def do_joins(db, conn, async_call):
     chans = yield from async_call(get_channels, db, conn)
-    join_throttle = conn.config.get("join_throttle", 0.4)
-    for chan in chans:
-        conn.join(chan[1])
-        yield from asyncio.sleep(join_throttle)
+    yield from join_channels(conn, [chan[1] for chan in chans])
 
 
 @hook.irc_raw('JOIN', singlethread=True)
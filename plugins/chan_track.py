@@ -7,11 +7,14 @@ server_info.py
 import gc
 import json
 import logging
+import sys
+import time
 import weakref
-from collections import Mapping, Iterable, namedtuple
+from collections import Mapping, Iterable, deque, namedtuple
 from contextlib import suppress
 from numbers import Number
 from operator import attrgetter
+from threading import RLock
 
 from irclib.parser import Prefix
 
@@ -19,7 +22,8 @@ import cloudbot.bot
 from cloudbot import hook
 from cloudbot.clients.irc import IrcClient
 from cloudbot.util import web
-from cloudbot.util.mapping import KeyFoldDict, KeyFoldMixin
+from cloudbot.util.casemap import get_casemap
+from cloudbot.util.mapping import CaseMapDict, KeyFoldMixin
 
 logger = logging.getLogger("cloudbot")
 
@@ -48,28 +52,95 @@ class MemberNotFoundException(KeyError):
         ]
 
 
-class ChannelMembersDict(KeyFoldDict):
+def status_mask(statuses):
+    """
+    Get the bitmask for a list of statuses, each status is stored as the bit `1 << status.level`
+
+    :type statuses: collections.abc.Iterable[plugins.core.server_info.Status]
+    :rtype: int
+    """
+    mask = 0
+    for status in statuses:
+        mask |= 1 << status.level
+
+    return mask
+
+
+def get_statuses(conn, mask):
+    """
+    Get the statuses set in a bitmask, highest level first
+
+    :type conn: cloudbot.client.Client
+    :type mask: int
+    :rtype: list[plugins.core.server_info.Status]
+    """
+    if not mask:
+        return []
+
+    levels = {status.level: status for status in conn.memory["server_info"]["statuses"].values()}
+    return [levels[level] for level in sorted(levels, reverse=True) if mask & (1 << level)]
+
+
+class ChannelMembersDict(Mapping):
+    """
+    A view of a channel's members, keyed by folded nick
+    """
+
+    __slots__ = ('chan',)
+
     def __init__(self, chan):
-        super().__init__()
         self.chan = weakref.ref(chan)
 
+    def _get_user(self, nick):
+        chan = self.chan()
+        user = get_users(chan.conn).get(nick)
+        if user is None or user.uid not in chan.members:
+            raise MemberNotFoundException(nick, chan)
+
+        return chan, user
+
     def __getitem__(self, item):
-        try:
-            return super().__getitem__(item)
-        except KeyError as e:
-            raise MemberNotFoundException(item, self.chan()) from e
+        chan, user = self._get_user(item)
+        return Channel.Member(user, chan)
 
     def __delitem__(self, item):
-        try:
-            super().__delitem__(item)
-        except KeyError as e:
-            raise MemberNotFoundException(item, self.chan()) from e
+        chan, user = self._get_user(item)
+        chan.remove_member(user)
+
+    def __contains__(self, item):
+        chan = self.chan()
+        user = get_users(chan.conn).get(item)
+        return user is not None and user.uid in chan.members
+
+    def __iter__(self):
+        chan = self.chan()
+        users = get_users(chan.conn)
+        by_id = users.by_id
+        for uid in list(chan.members):
+            yield users.fold(by_id[uid].nick)
 
-    def pop(self, key, *args, **kwargs):
+    def __len__(self):
+        return len(self.chan().members)
+
+    def get(self, key, default=None):
+        chan = self.chan()
+        user = get_users(chan.conn).get(key)
+        if user is None or user.uid not in chan.members:
+            return default
+
+        return Channel.Member(user, chan)
+
+    def pop(self, key, *args):
         try:
-            return super().pop(key, *args, **kwargs)
-        except KeyError as e:
-            raise MemberNotFoundException(key, self.chan()) from e
+            memb = self[key]
+        except KeyError:
+            if args:
+                return args[0]
+
+            raise
+
+        memb.channel.remove_member(memb.user)
+        return memb
 
 
 class KeyFoldWeakValueDict(KeyFoldMixin, weakref.WeakValueDictionary):
@@ -78,7 +149,7 @@ class KeyFoldWeakValueDict(KeyFoldMixin, weakref.WeakValueDictionary):
     """
 
 
-class ChanDict(KeyFoldDict):
+class ChanDict(CaseMapDict):
     """
     Mapping for channels on a network
     """
@@ -87,43 +158,83 @@ class ChanDict(KeyFoldDict):
         """
         :type conn: cloudbot.client.Client
         """
-        super().__init__()
+        super().__init__(casemap=get_conn_casemap(conn))
 
         self.conn = weakref.ref(conn)
 
-    def getchan(self, name):
+    def getchan(self, name, key=None):
         """
         :type name: str
+        :param key: `name` as returned by `key_for()`, if it is already known
+        :type key: str | None
         """
-        try:
-            return self[name]
-        except KeyError:
-            self[name] = value = Channel(name, self.conn())
-            return value
+        if key is None:
+            key = self.fold(name)
+
+        value = self.get_folded(key)
+        if value is None:
+            value = Channel(name, self.conn())
+            self.set_folded(key, value)
 
+        return value
 
-class UsersDict(KeyFoldWeakValueDict):
+    def __delitem__(self, key):
+        self[key].clear_members()
+        super().__delitem__(key)
+
+
+class UsersDict(CaseMapDict):
     """
     Mapping for users on a network
+
+    Users are also indexed by their id, which channels use to refer to their members.
+    A user is removed once they are no longer in any channel we track.
+
+    :type by_id: dict[int, User]
     """
 
     def __init__(self, conn):
         """
         :type conn: cloudbot.client.Client
         """
-        super().__init__()
+        super().__init__(casemap=get_conn_casemap(conn))
 
         self.conn = weakref.ref(conn)
+        self.by_id = {}
+        self._next_id = 0
 
-    def getuser(self, nick):
+    def getuser(self, nick, key=None):
         """
         :type nick: str
+        :param key: `nick` as returned by `key_for()`, if it is already known
+        :type key: str | None
         """
-        try:
-            return self[nick]
-        except KeyError:
-            self[nick] = value = User(nick, self.conn())
-            return value
+        if key is None:
+            key = self.fold(nick)
+
+        value = self.get_folded(key)
+        if value is None:
+            self._next_id += 1
+            value = User(nick, self._next_id)
+            self.set_folded(key, value)
+            self.by_id[value.uid] = value
+
+        return value
+
+    def remove(self, user):
+        """
+        Stop tracking a user
+
+        :type user: User
+        """
+        if self.get(user.nick) is user:
+            del self[user.nick]
+
+        self.by_id.pop(user.uid, None)
+
+    def clear(self):
+        super().clear()
+        self.by_id.clear()
 
 
 class MappingAttributeAdapter:
@@ -131,6 +242,8 @@ class MappingAttributeAdapter:
     Map item lookups to attribute lookups
     """
 
+    __slots__ = ('data',)
+
     def __init__(self):
         self.data = {}
 
@@ -150,19 +263,62 @@ class MappingAttributeAdapter:
 class Channel(MappingAttributeAdapter):
     """
     Represents a channel and relevant data
+
+    Members are stored as a bitmask of their statuses, keyed by user id
+
+    :type members: dict[int, int]
     """
 
-    class Member(MappingAttributeAdapter):
+    __slots__ = ('name', 'conn', 'members', 'users', 'receiving_names', '__weakref__')
+
+    class Member:
         """
-        Store a user's membership with the channel
+        A user's membership with the channel, created on access
         """
 
+        __slots__ = ('user', 'channel')
+
         def __init__(self, user, channel):
+            """
+            :type user: User
+            :type channel: Channel
+            """
             self.user = user
             self.channel = channel
-            self.conn = user.conn
-            self.status = []
-            super().__init__()
+
+        def __repr__(self):
+            return "Member({!r}, {!r})".format(self.user.nick, self.channel.name)
+
+        @property
+        def conn(self):
+            return self.channel.conn
+
+        @property
+        def mask(self):
+            """
+            The bitmask of the member's statuses
+            """
+            return self.channel.members.get(self.user.uid, 0)
+
+        @property
+        def level(self):
+            """
+            The level of the member's highest status, 0 if they have none
+            """
+            return max(self.mask.bit_length() - 1, 0)
+
+        @property
+        def status(self):
+            """
+            The member's statuses, highest level first
+
+            :rtype: list[plugins.core.server_info.Status]
+            """
+            return get_statuses(self.conn, self.mask)
+
+        @status.setter
+        def status(self, value):
+            self.channel.members[self.user.uid] = status_mask(value)
 
         def add_status(self, status, sort=True):
             """
@@ -170,37 +326,34 @@ class Channel(MappingAttributeAdapter):
             :type status: plugins.core.server_info.Status
             :type sort: bool
             """
-            if status in self.status:
+            bit = 1 << status.level
+            if self.mask & bit:
                 logger.warning(
                     "[%s|chantrack] Attempted to add existing status "
                     "to channel member: %s %s",
                     self.conn.name, self, status
                 )
             else:
-                self.status.append(status)
-                if sort:
-                    self.sort_status()
+                self.channel.members[self.user.uid] = self.mask | bit
 
         def remove_status(self, status):
             """
             :type status: plugins.core.server_info.Status
             """
-            if status not in self.status:
+            bit = 1 << status.level
+            if not self.mask & bit:
                 logger.warning(
                     "[%s|chantrack] Attempted to remove status not set "
                     "on member: %s %s",
                     self.conn.name, self, status
                 )
             else:
-                self.status.remove(status)
+                self.channel.members[self.user.uid] = self.mask & ~bit
 
         def sort_status(self):
             """
-            Ensure the status list is properly sorted
+            Statuses are always returned in order, so this does nothing
             """
-            status = list(set(self.status))
-            status.sort(key=attrgetter("level"), reverse=True)
-            self.status = status
 
     def __init__(self, name, conn):
         """
@@ -210,38 +363,83 @@ class Channel(MappingAttributeAdapter):
         super().__init__()
         self.name = name
         self.conn = weakref.proxy(conn)
+        self.members = {}
         self.users = ChannelMembersDict(self)
         self.receiving_names = False
 
+    def add_member(self, user):
+        """
+        :type user: User
+        :rtype: Channel.Member
+        """
+        if user.uid not in self.members:
+            self.members[user.uid] = 0
+            user.channels.append(self)
+
+        return self.Member(user, self)
+
+    def remove_member(self, user):
+        """
+        :type user: User
+        """
+        self.members.pop(user.uid, None)
+        with suppress(ValueError):
+            user.channels.remove(self)
+
+        if not user.channels:
+            get_users(self.conn).remove(user)
+
+    def clear_members(self):
+        """
+        Remove all members, e.g. when we leave the channel
+        """
+        by_id = get_users(self.conn).by_id
+        for uid in list(self.members):
+            user = by_id.get(uid)
+            if user is not None:
+                self.remove_member(user)
+
+        self.members.clear()
+
     def get_member(self, user, create=False):
         """
         :type user: User
         :type create: bool
         :rtype: Channel.Member
         """
-        try:
-            data = self.users[user.nick]
-        except KeyError:
-            if not create:
-                raise
+        if user.uid in self.members:
+            return self.Member(user, self)
 
-            self.users[user.nick] = data = self.Member(user, self)
+        if not create:
+            raise MemberNotFoundException(user.nick, self)
 
-        return data
+        return self.add_member(user)
 
 
-class User(MappingAttributeAdapter):
+class User:
     """
     Represent a user on a network
+
+    Nick, ident and host strings are interned, as many users share the same ident or host
+
+    :type uid: int
+    :type channels: list[Channel]
     """
 
-    def __init__(self, name, conn):
+    __slots__ = (
+        'uid', '_nick', '_ident', '_host', '_account', 'realname', 'server', 'is_away', 'away_message', 'is_oper',
+        'channels', '__weakref__',
+    )
+
+    def __init__(self, name, uid=0):
         """
         :type name: str
-        :type conn: cloudbot.client.Client
+        :type uid: int
         """
-        self.mask = Prefix(name)
-        self.conn = weakref.proxy(conn)
+        self.uid = uid
+        self._nick = _intern(name)
+        self._ident = None
+        self._host = None
         self.realname = None
         self._account = None
         self.server = None
@@ -251,17 +449,20 @@ class User(MappingAttributeAdapter):
 
         self.is_oper = False
 
-        self.channels = KeyFoldWeakValueDict()
-        super().__init__()
+        self.channels = []
+
+    def __getitem__(self, item):
+        # Users used to be mappings of their attributes, e.g. for `str.format_map()`
+        try:
+            return getattr(self, item)
+        except AttributeError:
+            raise KeyError(item) from None
 
     def join_channel(self, channel):
         """
         :type channel: Channel
         """
-        self.channels[channel.name] = memb = channel.get_member(
-            self, create=True
-        )
-        return memb
+        return channel.add_member(self)
 
     @property
     def account(self):
@@ -275,51 +476,86 @@ class User(MappingAttributeAdapter):
         if value == '*':
             value = None
 
-        self._account = value
+        self._account = _intern(value)
+
+    @property
+    def mask(self):
+        """
+        The user's full nick!ident@host mask
+        """
+        return Prefix(self._nick, self._ident, self._host)
+
+    @mask.setter
+    def mask(self, value):
+        self.nick, self.ident, self.host = value.nick, value.user, value.host
 
     @property
     def nick(self):
         """
         The user's nickname
         """
-        return self.mask.nick
+        return self._nick
 
     @nick.setter
     def nick(self, value):
-        self.mask = Prefix(value, self.ident, self.host)
+        self._nick = _intern(value)
 
     @property
     def ident(self):
         """
         The user's ident/username
         """
-        return self.mask.user
+        return self._ident
 
     @ident.setter
     def ident(self, value):
-        self.mask = Prefix(self.nick, value, self.host)
+        self._ident = _intern(value)
 
     @property
     def host(self):
         """
         The user's host/address
         """
-        return self.mask.host
+        return self._host
 
     @host.setter
     def host(self, value):
-        self.mask = Prefix(self.nick, self.ident, value)
+        self._host = _intern(value)
+
+
+def _intern(value):
+    if value is None:
+        return None
+
+    return sys.intern(value)
 
 
 # region util functions
 
 
+def get_conn_casemap(conn):
+    """
+    Get the case mapping announced by the server, or the default if it hasn't sent one
+
+    :type conn: cloudbot.client.Client
+    :rtype: cloudbot.util.casemap.CaseMap
+    """
+    casemap = getattr(conn, 'casemap', None)
+    if casemap is not None:
+        return casemap
+
+    return get_casemap(conn.memory.get("server_info", {}).get("isupport_tokens", {}).get("CASEMAPPING"))
+
+
 def get_users(conn):
     """
     :type conn: cloudbot.client.Client
     :rtype: UsersDict
     """
-    return conn.memory.setdefault("users", UsersDict(conn))
+    try:
+        return conn.memory["users"]
+    except KeyError:
+        return conn.memory.setdefault("users", UsersDict(conn))
 
 
 def get_chans(conn):
@@ -327,22 +563,172 @@ def get_chans(conn):
     :type conn: cloudbot.client.Client
     :rtype: ChanDict
     """
-    return conn.memory.setdefault("chan_data", ChanDict(conn))
+    try:
+        return conn.memory["chan_data"]
+    except KeyError:
+        return conn.memory.setdefault("chan_data", ChanDict(conn))
 
 
 # endregion util functions
 
 
+def has_whox(conn):
+    """
+    :type conn: cloudbot.client.Client
+    """
+    return "WHOX" in conn.memory.get("server_info", {}).get("isupport_tokens", {})
+
+
+class ChannelSync:
+    """
+    Requests member data for channels, with a limited number of requests in flight at once
+
+    Channels are synced with WHOX when the server supports it, which also gives each
+    member's account, realname and away state, and with NAMES otherwise.
+    """
+
+    # The WHOX fields requested, replies always list fields in the order 'tcuihsnfdlaor'
+    WHOX_FIELDS = "tcnuhraf"
+    # Identifies replies to our requests
+    WHOX_TOKEN = "774"
+
+    # Requests without a reply after this many seconds no longer count as in flight
+    TIMEOUT = 60
+
+    def __init__(self, conn):
+        """
+        :type conn: cloudbot.clients.irc.IrcClient
+        """
+        self._conn = weakref.ref(conn)
+        self.max_in_flight = conn.config.get("chan_sync_limit", 5)
+        self.queue = deque()
+        self._queued = set()
+        casemap = get_conn_casemap(conn)
+        self.in_flight = CaseMapDict(casemap=casemap)
+        # The last sync duration for each channel, in seconds
+        self.times = CaseMapDict(casemap=casemap)
+        self._timeout_scheduled = False
+        # Syncs are requested and completed from threaded hooks, and timed out from the event loop
+        self._lock = RLock()
+
+    @property
+    def conn(self):
+        return self._conn()
+
+    @property
+    def use_whox(self):
+        return has_whox(self.conn)
+
+    def set_casemap(self, casemap):
+        """
+        :type casemap: cloudbot.util.casemap.CaseMap
+        """
+        with self._lock:
+            self.in_flight.set_casemap(casemap)
+            self.times.set_casemap(casemap)
+            self._queued = {casemap.fold(chan) for chan in self.queue}
+
+    def request(self, chan):
+        """
+        Queue a sync of a channel's members
+
+        :type chan: str
+        """
+        with self._lock:
+            folded = self.in_flight.fold(chan)
+            if chan not in self.in_flight and folded not in self._queued:
+                self.queue.append(chan)
+                self._queued.add(folded)
+
+            self.pump()
+
+    def pump(self):
+        """
+        Send queued requests while there are free slots
+        """
+        with self._lock:
+            now = time.time()
+            for chan, (started, _) in list(self.in_flight.items()):
+                if now - started >= self.TIMEOUT:
+                    logger.warning("[%s|chantrack] Timed out syncing %s", self.conn.name, chan)
+                    del self.in_flight[chan]
+
+            while self.queue and len(self.in_flight) < self.max_in_flight:
+                chan = self.queue.popleft()
+                self._queued.discard(self.in_flight.fold(chan))
+                chan_data = get_chans(self.conn).getchan(chan)
+                chan_data.receiving_names = False
+                if self.use_whox:
+                    # Nicks seen in this sync, anyone else is no longer in the channel
+                    chan_data.data["who_seen"] = set()
+                    self.in_flight[chan] = (now, "WHO")
+                    self.conn.send("WHO {} %{},{}".format(chan, self.WHOX_FIELDS, self.WHOX_TOKEN))
+                else:
+                    self.in_flight[chan] = (now, "NAMES")
+                    self.conn.cmd("NAMES", chan)
+
+            self._schedule_timeout(now)
+
+    def _schedule_timeout(self, now):
+        # Without this, queued channels would wait on unrelated syncs to notice that every slot timed out
+        if self._timeout_scheduled or not self.in_flight:
+            return
+
+        first = min(started for started, _ in self.in_flight.values())
+        loop = self.conn.loop
+        self._timeout_scheduled = True
+        # Sync requests are made from threaded hooks
+        loop.call_soon_threadsafe(loop.call_later, max(first + self.TIMEOUT - now, 0), self._on_timeout)
+
+    def _on_timeout(self):
+        with self._lock:
+            self._timeout_scheduled = False
+            if self.conn is not None:
+                self.pump()
+
+    def complete(self, chan, method):
+        """
+        Mark a sync as complete, and start the next one
+
+        :type chan: str
+        :type method: str
+        """
+        with self._lock:
+            try:
+                started, sent_method = self.in_flight[chan]
+            except KeyError:
+                return
+
+            if sent_method != method:
+                return
+
+            del self.in_flight[chan]
+            duration = time.time() - started
+            self.times[chan] = duration
+            logger.debug("[%s|chantrack] Synced %s with %s in %.3f seconds", self.conn.name, chan, method, duration)
+            self.pump()
+
+
+def get_sync(conn):
+    """
+    :type conn: cloudbot.client.Client
+    :rtype: ChannelSync
+    """
+    try:
+        return conn.memory["chan_sync"]
+    except KeyError:
+        # Another thread may have created it first
+        return conn.memory.setdefault("chan_sync", ChannelSync(conn))
+
+
 def update_chan_data(conn, chan):
     # type: (IrcClient, str) -> None
     """
-    Start the process of updating channel data from /NAMES
+    Start the process of updating channel data from /WHO or /NAMES
     :param conn: The current connection
     :param chan: The channel to update
     """
-    chan_data = get_chans(conn).getchan(chan)
-    chan_data.receiving_names = False
-    conn.cmd("NAMES", chan)
+    get_sync(conn).request(chan)
 
 
 def update_conn_data(conn):
@@ -398,8 +784,7 @@ def clean_user_data(user):
     """
     :type user: User
     """
-    for memb in user.channels.values():
-        memb.sort_status()
+    user.channels = [chan for chan in user.channels if user.uid in chan.members]
 
 
 def clean_chan_data(chan):
@@ -414,8 +799,11 @@ def clean_conn_data(conn):
     """
     :type conn: cloudbot.client.Client
     """
-    for user in get_users(conn).values():
+    users = get_users(conn)
+    for user in list(users.values()):
         clean_user_data(user)
+        if not user.channels:
+            users.remove(user)
 
     for chan in get_chans(conn).values():
         clean_chan_data(chan)
@@ -447,6 +835,7 @@ def init_chan_data(conn, _clear=True):
     if _clear:
         chan_data.clear()
         users.clear()
+        conn.memory.pop("chan_sync", None)
 
     return None
 
@@ -493,28 +882,61 @@ def replace_user_data(conn, chan_data):
     has_multi_pfx = is_cap_available(conn, "multi-prefix")
     old_data = chan_data.data.pop('old_users', {})
     new_names = set()
+    fold = get_users(conn).fold
 
     for name in new_data:
         nick, ident, host, status = parse_names_item(
             name, statuses, has_multi_pfx, has_uh_i_n
         )
 
-        new_names.update(nick.casefold())
+        new_names.add(fold(nick))
+        update_member(conn, chan_data, nick, status, ident=ident, host=host)
+
+    remove_stale_members(chan_data, old_data, new_names)
 
-        user_data = get_users(conn).getuser(nick)
+
+def update_member(conn, chan_data, nick, status, ident=None, host=None):
+    """
+    Add or update a channel member, only changing the data which differs
+
+    :type conn: cloudbot.client.Client
+    :type chan_data: Channel
+    :type nick: str
+    :type status: list[plugins.core.server_info.Status]
+    :type ident: str | None
+    :type host: str | None
+    :rtype: User
+    """
+    user_data = get_users(conn).getuser(nick)
+    if user_data.nick != nick:
         user_data.nick = nick
-        if ident:
-            user_data.ident = ident
 
-        if host:
-            user_data.host = host
+    if ident and user_data.ident != ident:
+        user_data.ident = ident
 
-        memb_data = user_data.join_channel(chan_data)
-        memb_data.status = status
+    if host and user_data.host != host:
+        user_data.host = host
 
-    for old_nick in old_data:
-        if old_nick not in new_names:
-            del chan_data.users[old_nick]
+    mask = status_mask(status)
+    if chan_data.members.get(user_data.uid) != mask:
+        chan_data.add_member(user_data)
+        chan_data.members[user_data.uid] = mask
+
+    return user_data
+
+
+def remove_stale_members(chan_data, old_names, new_names):
+    """
+    Remove members which were in the channel before a sync, but not seen during it
+
+    :type chan_data: Channel
+    :type old_names: collections.abc.Iterable[str]
+    :type new_names: set[str]
+    """
+    fold = get_users(chan_data.conn).fold
+    for old_nick in old_names:
+        if fold(old_nick) not in new_names:
+            chan_data.users.pop(old_nick, None)
 
 
 @hook.irc_raw(['353', '366'], singlethread=True)
@@ -529,12 +951,15 @@ def on_names(conn, irc_paramlist, irc_command):
     if irc_command == '366':
         chan_data.receiving_names = False
         replace_user_data(conn, chan_data)
+        sync = conn.memory.get("chan_sync")
+        if sync is not None:
+            sync.complete(chan, "NAMES")
+
         return
 
     users = chan_data.data.setdefault("new_users", [])
     if not chan_data.receiving_names:
-        chan_data.data['old_users'] = old = ChannelMembersDict(chan_data)
-        old.update(chan_data.users)
+        chan_data.data['old_users'] = set(chan_data.users)
 
         chan_data.receiving_names = True
         users.clear()
@@ -544,6 +969,59 @@ def on_names(conn, irc_paramlist, irc_command):
     users.extend(names.split())
 
 
+@hook.irc_raw('354', singlethread=True)
+def on_whox(conn, irc_paramlist):
+    """
+    Handle a WHOX reply to a channel sync
+
+    :type conn: cloudbot.client.Client
+    :type irc_paramlist: cloudbot.util.parsers.irc.ParamList
+    """
+    if len(irc_paramlist) != 9 or irc_paramlist[1] != ChannelSync.WHOX_TOKEN:
+        return
+
+    _, _, chan, ident, host, nick, flags, account, realname = irc_paramlist
+    chan_data = get_chans(conn).getchan(chan)
+    seen = chan_data.data.get("who_seen")
+    if seen is None:
+        return
+
+    statuses = conn.memory["server_info"]["statuses"]
+    status = [statuses[c] for c in flags[1:] if c in statuses and statuses[c].prefix == c]
+    status.sort(key=attrgetter('level'), reverse=True)
+
+    user = update_member(conn, chan_data, nick, status, ident=ident, host=host)
+    seen.add(get_users(conn).fold(nick))
+
+    is_away = flags[:1] == "G"
+    if user.is_away != is_away:
+        user.is_away = is_away
+        if not is_away:
+            user.away_message = None
+
+    user.is_oper = "*" in flags
+    user.account = None if account == "0" else account
+    user.realname = realname
+
+
+@hook.irc_raw('315', singlethread=True)
+def on_who_end(conn, irc_paramlist):
+    """
+    :type conn: cloudbot.client.Client
+    :type irc_paramlist: cloudbot.util.parsers.irc.ParamList
+    """
+    chan = irc_paramlist[1]
+    chans = get_chans(conn)
+    if chan not in chans:
+        return
+
+    chan_data = chans[chan]
+    seen = chan_data.data.pop("who_seen", None)
+    if seen is not None:
+        remove_stale_members(chan_data, list(chan_data.users), seen)
+        get_sync(conn).complete(chan, "WHO")
+
+
 class MappingSerializer:
     """
     Serialize generic mappings to json
@@ -608,11 +1086,7 @@ def perm_check(chan, conn, nick):
     except KeyError:
         return False
 
-    status = memb.status
-    if status and status[0].level > 1:
-        return True
-
-    return False
+    return memb.level > 1
 
 
 @hook.command(permissions=["botcontrol"], autohelp=False)
@@ -645,6 +1119,20 @@ def updateusers(bot):
     return "Updating all channel data"
 
 
+@hook.command(permissions=["botcontrol"], autohelp=False)
+def chansync(conn):
+    """- Shows the state of channel data syncing, and the slowest channels to sync
+
+    :type conn: cloudbot.client.Client
+    """
+    sync = get_sync(conn)
+    slowest = sorted(sync.times.items(), key=lambda item: item[1], reverse=True)[:5]
+    return "Syncing with {}: {} in flight, {} queued, {} synced. Slowest: {}".format(
+        "WHOX" if sync.use_whox else "NAMES", len(sync.in_flight), len(sync.queue), len(sync.times),
+        ", ".join("{} ({:.2f}s)".format(chan, duration) for chan, duration in slowest) or "none"
+    )
+
+
 @hook.command(permissions=["botcontrol"], autohelp=False)
 def cleanusers(bot):
     """- Clean user data
@@ -672,26 +1160,53 @@ def clearusers(bot):
 @hook.command("getdata", permissions=["botcontrol"], autohelp=False)
 def getdata_cmd(conn, chan, nick):
     """- Get data for current user"""
-    chan_data = get_chans(conn).getchan(chan)
-    user_data = get_users(conn).getuser(nick)
-    memb = chan_data.get_member(user_data)
-    return web.paste(MappingSerializer().serialize(memb, indent=2))
+    memb = get_chans(conn).getchan(chan).users[nick]
+    return web.paste(MappingSerializer().serialize({
+        'nick': memb.user.nick,
+        'mask': memb.user.mask.mask,
+        'account': memb.user.account,
+        'channel': memb.channel.name,
+        'status': [status.prefix for status in memb.status],
+    }, indent=2))
+
+
+@hook.irc_raw('005', singlethread=True)
+def on_isupport(conn, irc_paramlist):
+    """
+    Refold tracked names if the server uses a different case mapping
+
+    :type conn: cloudbot.client.Client
+    :type irc_paramlist: cloudbot.util.parsers.irc.ParamList
+    """
+    for token in irc_paramlist[1:-1]:
+        name, _, value = token.partition('=')
+        if name.upper() == "CASEMAPPING":
+            casemap = get_casemap(value)
+            get_users(conn).set_casemap(casemap)
+            get_chans(conn).set_casemap(casemap)
+            sync = conn.memory.get("chan_sync")
+            if sync is not None:
+                sync.set_casemap(casemap)
 
 
 @hook.irc_raw('JOIN')
-def on_join(nick, user, host, conn, irc_paramlist):
+def on_join(nick, user, host, conn, irc_paramlist, folded_nick=None, folded_chan=None, casemap=None):
     """
     :type nick: str
     :type user: str
     :type host: str
     :type conn: cloudbot.client.Client
     :type irc_paramlist: cloudbot.util.parsers.irc.ParamList
+    :type folded_nick: str | None
+    :type folded_chan: str | None
+    :type casemap: cloudbot.util.casemap.CaseMap | None
     """
     chan, *other_data = irc_paramlist
 
     users = get_users(conn)
 
-    user_data = users.getuser(nick)
+    nick_key = users.key_for(nick, folded_nick, casemap)
+    user_data = users.getuser(nick, nick_key)
 
     user_data.ident = user
     user_data.host = host
@@ -701,9 +1216,14 @@ def on_join(nick, user, host, conn, irc_paramlist):
         user_data.account = acct
         user_data.realname = realname
 
-    chan_data = get_chans(conn).getchan(chan)
+    chans = get_chans(conn)
+    chan_data = chans.getchan(chan, chans.key_for(chan, folded_chan, casemap))
     user_data.join_channel(chan_data)
 
+    # The server sends NAMES on join, WHOX is needed for everything else
+    if nick_key == users.fold(conn.nick) and has_whox(conn):
+        get_sync(conn).request(chan)
+
 
 ModeChange = namedtuple('ModeChange', 'mode adding param is_status')
 
@@ -741,7 +1261,7 @@ def on_mode(chan, irc_paramlist, conn):
     :type conn: cloudbot.client.Client
     :type irc_paramlist: cloudbot.util.parsers.irc.ParamList
     """
-    if irc_paramlist[0].casefold() == conn.nick.casefold():
+    if get_conn_casemap(conn).equals(irc_paramlist[0], conn.nick):
         # this is a user mode line
         return
 
@@ -756,7 +1276,6 @@ def on_mode(chan, irc_paramlist, conn):
     mode_params = list(irc_paramlist[2:]).copy()
     new_modes = _parse_mode_string(modes, mode_params, status_modes, mode_types)
     new_statuses = [change for change in new_modes if change.is_status]
-    to_sort = {}
     for change in new_statuses:
         status_char = change.mode
         nick = change.param
@@ -764,52 +1283,60 @@ def on_mode(chan, irc_paramlist, conn):
         memb = chan_data.get_member(user, create=True)
         status = statuses[status_char]
         if change.adding:
-            memb.add_status(status, sort=False)
-            to_sort[user.nick] = memb
+            memb.add_status(status)
         else:
             memb.remove_status(status)
 
-    for member in to_sort.values():
-        member.sort_status()
-
 
 @hook.irc_raw('PART')
-def on_part(chan, nick, conn):
+def on_part(chan, nick, conn, folded_chan=None, folded_nick=None, casemap=None):
     """
     :type chan: str
     :type nick: str
     :type conn: cloudbot.client.Client
+    :type folded_chan: str | None
+    :type folded_nick: str | None
+    :type casemap: cloudbot.util.casemap.CaseMap | None
     """
     channels = get_chans(conn)
-    if nick.casefold() == conn.nick.casefold():
+    if channels.key_for(nick, folded_nick, casemap) == channels.fold(conn.nick):
         del channels[chan]
     else:
-        chan_data = channels[chan]
+        chan_data = channels.get_folded(channels.key_for(chan, folded_chan, casemap))
+        if chan_data is None:
+            raise KeyError(chan)
+
         del chan_data.users[nick]
 
 
 @hook.irc_raw('KICK')
-def on_kick(chan, target, conn):
+def on_kick(chan, target, conn, folded_chan=None, casemap=None):
     """
     :type chan: str
     :type target: str
     :type conn: cloudbot.client.Client
+    :type folded_chan: str | None
+    :type casemap: cloudbot.util.casemap.CaseMap | None
     """
-    on_part(chan, target, conn)
+    on_part(chan, target, conn, folded_chan, None, casemap)
 
 
 @hook.irc_raw('QUIT')
-def on_quit(nick, conn):
+def on_quit(nick, conn, folded_nick=None, casemap=None):
     """
     :type nick: str
     :type conn: cloudbot.client.Client
+    :type folded_nick: str | None
+    :type casemap: cloudbot.util.casemap.CaseMap | None
     """
     users = get_users(conn)
-    if nick in users:
-        user = users.pop(nick)
-        for memb in user.channels.values():
-            chan = memb.channel
-            del chan.users[nick]
+    user = users.get_folded(users.key_for(nick, folded_nick, casemap))
+    if user is not None:
+        for chan in user.channels:
+            chan.members.pop(user.uid, None)
+
+        user.channels.clear()
+        users.remove(user)
 
 
 @hook.irc_raw('NICK')
@@ -822,52 +1349,70 @@ def on_nick(nick, irc_paramlist, conn):
     users = get_users(conn)
     new_nick = irc_paramlist[0]
 
+    # Channels refer to members by id, so only the nick index needs updating
     user = users.pop(nick)
+    stale = users.get(new_nick)
+    if stale is not None:
+        for chan in list(stale.channels):
+            chan.remove_member(stale)
+
+        users.remove(stale)
+
     users[new_nick] = user
     user.nick = new_nick
-    for memb in user.channels.values():
-        chan_users = memb.channel.users
-        chan_users[new_nick] = chan_users.pop(nick)
 
 
 @hook.irc_raw('ACCOUNT')
-def on_account(conn, nick, irc_paramlist):
+def on_account(conn, nick, irc_paramlist, folded_nick=None, casemap=None):
     """
     :type nick: str
     :type irc_paramlist: cloudbot.util.parsers.irc.ParamList
     :type conn: cloudbot.client.Client
+    :type folded_nick: str | None
+    :type casemap: cloudbot.util.casemap.CaseMap | None
     """
-    get_users(conn).getuser(nick).account = irc_paramlist[0]
+    users = get_users(conn)
+    user = users.get_folded(users.key_for(nick, folded_nick, casemap))
+    if user is not None:
+        user.account = irc_paramlist[0]
 
 
 @hook.irc_raw('CHGHOST')
-def on_chghost(conn, nick, irc_paramlist):
+def on_chghost(conn, nick, irc_paramlist, folded_nick=None, casemap=None):
     """
     :type nick: str
     :type irc_paramlist: cloudbot.util.parsers.irc.ParamList
     :type conn: cloudbot.client.Client
+    :type folded_nick: str | None
+    :type casemap: cloudbot.util.casemap.CaseMap | None
     """
     ident, host = irc_paramlist
-    user = get_users(conn).getuser(nick)
-    user.ident = ident
-    user.host = host
+    users = get_users(conn)
+    user = users.get_folded(users.key_for(nick, folded_nick, casemap))
+    if user is not None:
+        user.ident = ident
+        user.host = host
 
 
 @hook.irc_raw('AWAY')
-def on_away(conn, nick, irc_paramlist):
+def on_away(conn, nick, irc_paramlist, folded_nick=None, casemap=None):
     """
     :type nick: str
     :type irc_paramlist: cloudbot.util.parsers.irc.ParamList
     :type conn: cloudbot.client.Client
+    :type folded_nick: str | None
+    :type casemap: cloudbot.util.casemap.CaseMap | None
     """
     if irc_paramlist:
         reason = irc_paramlist[0]
     else:
         reason = None
 
-    user = get_users(conn).getuser(nick)
-    user.is_away = (reason is not None)
-    user.away_message = reason
+    users = get_users(conn)
+    user = users.get_folded(users.key_for(nick, folded_nick, casemap))
+    if user is not None:
+        user.is_away = (reason is not None)
+        user.away_message = reason
 
 
 @hook.irc_raw('352')
@@ -878,7 +1423,10 @@ def on_who(conn, irc_paramlist):
     """
     _, _, ident, host, server, nick, status, realname = irc_paramlist
     realname = realname.split(None, 1)[1]
-    user = get_users(conn).getuser(nick)
+    user = get_users(conn).get(nick)
+    if user is None:
+        return
+
     status = list(status)
     is_away = status.pop(0) == "G"
     is_oper = status[:1] == "*"
@@ -897,10 +1445,11 @@ def on_whois_name(conn, irc_paramlist):
     :type conn: cloudbot.client.Client
     """
     _, nick, ident, host, _, realname = irc_paramlist
-    user = get_users(conn).getuser(nick)
-    user.ident = ident
-    user.host = host
-    user.realname = realname
+    user = get_users(conn).get(nick)
+    if user is not None:
+        user.ident = ident
+        user.host = host
+        user.realname = realname
 
 
 @hook.irc_raw('330')
@@ -909,8 +1458,10 @@ def on_whois_acct(conn, irc_paramlist):
     :type irc_paramlist: cloudbot.util.parsers.irc.ParamList
     :type conn: cloudbot.client.Client
     """
-    _, nick, acct = irc_paramlist[:2]
-    get_users(conn).getuser(nick).account = acct
+    _, nick, acct = irc_paramlist[:3]
+    user = get_users(conn).get(nick)
+    if user is not None:
+        user.account = acct
 
 
 @hook.irc_raw('301')
@@ -920,9 +1471,10 @@ def on_whois_away(conn, irc_paramlist):
     :type conn: cloudbot.client.Client
     """
     _, nick, msg = irc_paramlist
-    user = get_users(conn).getuser(nick)
-    user.is_away = True
-    user.away_message = msg
+    user = get_users(conn).get(nick)
+    if user is not None:
+        user.is_away = True
+        user.away_message = msg
 
 
 # @hook.irc_raw('312')
@@ -932,7 +1484,9 @@ def on_whois_server(conn, irc_paramlist):
     :type conn: cloudbot.client.Client
     """
     _, nick, server, _ = irc_paramlist
-    get_users(conn).getuser(nick).server = server
+    user = get_users(conn).get(nick)
+    if user is not None:
+        user.server = server
 
 
 @hook.irc_raw('313')
@@ -942,4 +1496,6 @@ def on_whois_oper(conn, irc_paramlist):
     :type conn: cloudbot.client.Client
     """
     nick = irc_paramlist[1]
-    get_users(conn).getuser(nick).is_oper = True
+    user = get_users(conn).get(nick)
+    if user is not None:
+        user.is_oper = True
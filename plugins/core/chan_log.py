@@ -172,11 +172,8 @@ def format_attrs(obj: object, ignore_dunder: bool = False) -> Iterable[str]:
         yield '{} = {!r}'.format(k, v)
 
 
-@hook.post_hook
+@hook.post_hook(errors_only=True)
 def on_hook_end(error, launched_hook, launched_event, admin_log):
-    if error is None:
-        return
-
     should_broadcast = True
     messages = [
         "Error occurred in {}.{}".format(
@@ -4,6 +4,7 @@ import socket
 from copy import copy
 
 from cloudbot import hook
+from plugins.core.server_info import join_channels
 
 socket.setdefaulttimeout(10)
 logger = logging.getLogger("cloudbot")
@@ -119,11 +120,8 @@ async def do_joins(conn):
     chans = copy(conn.channels)
 
     # Join config-defined channels
-    join_throttle = conn.config.get('join_throttle', 0.4)
     logger.info("[%s|misc] Bot is joining channels for network.", conn.name)
-    for channel in chans:
-        conn.join(channel)
-        await asyncio.sleep(join_throttle)
+    await join_channels(conn, chans)
 
 
 @hook.irc_raw('004')
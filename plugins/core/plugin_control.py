@@ -50,3 +50,31 @@ async def pluginunload(bot, text):
         return "Plugin unloaded successfully."
 
     return "Plugin failed to unload."
+
+
+@hook.command(permissions=["botcontrol"], autohelp=False)
+def plugintasks(bot, text):
+    """[plugin] - List task counts for all loaded plugins, or the in-flight tasks of [plugin]"""
+    manager = bot.plugin_manager
+    text = text.strip()
+    if text:
+        plugin = manager.find_plugin(text)
+        if plugin is None:
+            return "Plugin not loaded."
+
+        if not plugin.tasks:
+            return "No tasks running in {}.".format(plugin.title)
+
+        table = gen_markdown_table(["Task"], [(repr(task),) for task in plugin.tasks])
+        return web.paste(table, service="hastebin")
+
+    plugins = [
+        (
+            plugin.title, str(plugin.tasks.in_flight), str(plugin.tasks.started),
+            str(plugin.tasks.completed), str(plugin.tasks.cancelled),
+        )
+        for plugin in manager.plugins.values()
+    ]
+    plugins.sort(key=lambda row: (-int(row[1]), row[0]))
+    table = gen_markdown_table(["Plugin", "In-flight", "Started", "Completed", "Cancelled"], plugins)
+    return web.paste(table, service="hastebin")
@@ -1,9 +1,17 @@
 """
 Tracks verious server info like ISUPPORT tokens
+
+Also plans channel joins within the server's ISUPPORT limits, see `join_channels()`
 """
+import asyncio
+import logging
+import time
 from collections import namedtuple
 
 from cloudbot import hook
+from cloudbot.util.casemap import get_casemap
+
+logger = logging.getLogger("cloudbot")
 
 Status = namedtuple('Status', 'prefix mode level')
 ChanMode = namedtuple('ChanMode', 'char type')
@@ -13,6 +21,12 @@ DEFAULT_STATUS = (
     Status('+', 'v', 1),
 )
 
+# 512 bytes including the trailing CRLF
+DEFAULT_LINE_LENGTH = 510
+
+# Numerics which mean a JOIN failed
+JOIN_ERRORS = ('403', '405', '437', '471', '473', '474', '475', '476', '477', '479', '480', '489')
+
 
 @hook.on_start
 def do_isupport(bot):
@@ -33,6 +47,8 @@ def clear_isupport(conn):
     isupport_data = serv_info.setdefault("isupport_tokens", {})
     isupport_data.clear()
 
+    conn.memory.pop("pending_joins", None)
+
 
 def handle_prefixes(data, serv_info):
     modes, prefixes = data.split(')', 1)
@@ -81,3 +97,242 @@ def on_isupport(conn, irc_paramlist, nick):
             handle_chan_modes(value, serv_info)
         elif name == "EXTBAN":
             handle_extbans(value, serv_info)
+
+
+def parse_targmax(value):
+    """
+    Parse a TARGMAX token in to a dict of command -> limit, where None means unlimited
+
+    >>> parse_targmax("PRIVMSG:4,JOIN:,KICK:1")
+    {'PRIVMSG': 4, 'JOIN': None, 'KICK': 1}
+    """
+    limits = {}
+    for item in (value or '').split(','):
+        cmd, _, limit = item.partition(':')
+        if cmd:
+            limits[cmd.upper()] = int(limit) if limit else None
+
+    return limits
+
+
+def parse_chanlimit(value):
+    """
+    Parse a CHANLIMIT token in to a list of (prefixes, limit), where None means unlimited
+
+    >>> parse_chanlimit("#&:50,+:")
+    [('#&', 50), ('+', None)]
+    """
+    limits = []
+    for item in (value or '').split(','):
+        prefixes, _, limit = item.partition(':')
+        if prefixes:
+            limits.append((prefixes, int(limit) if limit else None))
+
+    return limits
+
+
+def get_join_limits(conn):
+    """
+    Get the (max channels per JOIN, max line length, channel limits) for a connection
+
+    :rtype: (int | None, int, list[(str, int | None)])
+    """
+    tokens = conn.memory.get("server_info", {}).get("isupport_tokens", {})
+    try:
+        max_targets = parse_targmax(tokens.get("TARGMAX"))["JOIN"]
+    except (LookupError, ValueError):
+        try:
+            max_targets = int(tokens["MAXTARGETS"])
+        except (LookupError, TypeError, ValueError):
+            max_targets = None
+
+    try:
+        line_length = int(tokens["LINELEN"]) - 2
+    except (LookupError, TypeError, ValueError):
+        line_length = DEFAULT_LINE_LENGTH
+
+    line_length = min(line_length, conn.config.get("max_line_length", DEFAULT_LINE_LENGTH))
+
+    try:
+        chan_limits = parse_chanlimit(tokens.get("CHANLIMIT"))
+    except ValueError:
+        chan_limits = []
+
+    return max_targets, line_length, chan_limits
+
+
+def plan_joins(channels, max_targets=None, line_length=DEFAULT_LINE_LENGTH, chan_limits=()):
+    """
+    Pack channels in to as few JOIN lines as the limits allow
+
+    Each channel may be followed by its key, separated by a space. Keyed channels
+    are put first in each line, as keys are matched to channels by position.
+
+    >>> plan_joins(["#a", "#b key", "#c", "#d"], max_targets=3)
+    ['JOIN #b,#a,#c key', 'JOIN #d']
+    >>> plan_joins(["#a", "#b", "&c"], chan_limits=[('#', 1)])
+    ['JOIN #a,&c']
+
+    :type channels: collections.abc.Iterable[str]
+    :param max_targets: The most channels in a single JOIN, None for no limit
+    :param line_length: The longest a line may be, excluding the CRLF
+    :param chan_limits: The (prefixes, limit) pairs from CHANLIMIT, channels past a limit are skipped
+    :rtype: list[str]
+    """
+    counts = {}
+    batches = []
+    keyed, unkeyed = [], []
+    # Each channel is counted with a separating comma, which the first one doesn't need
+    empty_size = len("JOIN ") - 1
+    size = empty_size
+
+    def _flush():
+        if keyed or unkeyed:
+            line = "JOIN " + ",".join([name for name, _ in keyed] + unkeyed)
+            if keyed:
+                line += " " + ",".join(key for _, key in keyed)
+
+            batches.append(line)
+            keyed.clear()
+            unkeyed.clear()
+
+    for channel in channels:
+        name, _, key = channel.partition(' ')
+        key = key.strip()
+        if not name:
+            continue
+
+        for prefixes, limit in chan_limits:
+            if name[0] in prefixes:
+                count = counts.get(prefixes, 0)
+                if limit is not None and count >= limit:
+                    logger.warning("Not joining %s, the server's limit of %d %s channels was reached",
+                                   name, limit, prefixes)
+                    name = None
+                else:
+                    counts[prefixes] = count + 1
+
+                break
+
+        if name is None:
+            continue
+
+        # The separating comma, plus the key and its separating comma or space
+        added = len(name) + 1 + (len(key) + 1 if key else 0)
+        targets = len(keyed) + len(unkeyed)
+        if targets and (size + added > line_length or (max_targets is not None and targets >= max_targets)):
+            _flush()
+            size = empty_size
+
+        if key:
+            keyed.append((name, key))
+        else:
+            unkeyed.append(name)
+
+        size += added
+
+    _flush()
+    return batches
+
+
+async def join_channels(conn, channels):
+    """
+    Join channels in as few JOIN lines as the server allows, and log how long it takes for the server to confirm them
+
+    The lines are paced by the connection's send queue, or by the "join_throttle" config option if it has none.
+
+    :type conn: cloudbot.clients.irc.IrcClient
+    :type channels: list[str]
+    """
+    channels = list(channels)
+    max_targets, line_length, chan_limits = get_join_limits(conn)
+    lines = plan_joins(channels, max_targets, line_length, chan_limits)
+    if not lines:
+        return
+
+    # Several plugins may join channels at once, so they are timed together
+    pending = conn.memory.setdefault("pending_joins", {})
+    if not pending:
+        conn.memory["join_start"] = time.time()
+        conn.memory["join_count"] = 0
+
+    casemap = _get_casemap(conn)
+    sent = set()
+    for line in lines:
+        for name in line.split(' ')[1].split(','):
+            sent.add(name)
+            folded = casemap.fold(name)
+            if folded not in pending:
+                pending[folded] = None
+                conn.memory["join_count"] += 1
+
+    # Channels skipped for the server's CHANLIMIT aren't tracked as joined
+    for channel in channels:
+        if channel.partition(' ')[0] in sent and channel not in conn.channels:
+            conn.channels.append(channel)
+
+    count = len(sent)
+
+    logger.info("[%s|misc] Joining %d channels in %d lines", conn.name, count, len(lines))
+    join_throttle = conn.config.get('join_throttle', 0.4)
+    for i, line in enumerate(lines):
+        if i and conn.send_queue is None:
+            await asyncio.sleep(join_throttle)
+
+        conn.send(line)
+
+
+def _get_casemap(conn):
+    casemap = getattr(conn, 'casemap', None)
+    if casemap is None:
+        return get_casemap()
+
+    return casemap
+
+
+def _join_done(conn, chan):
+    pending = conn.memory.get("pending_joins")
+    if not pending:
+        return
+
+    pending.pop(_get_casemap(conn).fold(chan), None)
+    if not pending:
+        duration = time.time() - conn.memory["join_start"]
+        logger.info(
+            "[%s|misc] Finished joining %d channels in %.2f seconds", conn.name, conn.memory["join_count"], duration
+        )
+
+
+@hook.irc_raw('JOIN', singlethread=True)
+def on_join(conn, chan, nick, casemap):
+    if casemap.equals(nick, conn.nick):
+        _join_done(conn, chan)
+
+
+@hook.irc_raw(JOIN_ERRORS, singlethread=True)
+def on_join_error(conn, irc_paramlist):
+    if len(irc_paramlist) > 1:
+        _join_done(conn, irc_paramlist[1])
+
+
+@hook.irc_raw(('PART', 'KICK'), singlethread=True)
+def on_leave(conn, chan, nick, irc_command, irc_paramlist, casemap):
+    """
+    Stop waiting for a channel the bot left before the server confirmed the join
+    """
+    if irc_command == 'KICK':
+        nick = irc_paramlist[1] if len(irc_paramlist) > 1 else None
+
+    if nick and casemap.equals(nick, conn.nick):
+        _join_done(conn, chan)
+
+
+@hook.irc_raw('ERROR', singlethread=True)
+def on_disconnect(conn):
+    """
+    Drop the joins the server never confirmed, as it is closing the connection
+    """
+    pending = conn.memory.pop("pending_joins", None)
+    if pending:
+        logger.info("[%s|misc] Disconnected before %d of %d joins were confirmed",
+                    conn.name, len(pending), conn.memory.get("join_count", 0))
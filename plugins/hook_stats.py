@@ -5,82 +5,222 @@ Author:
     - linuxdaemon <https://github.com/linuxdaemon>
 """
 
-from collections import defaultdict
+import json
+import time
+from datetime import datetime
+from threading import Lock
+
+from sqlalchemy import Column, Integer, PrimaryKeyConstraint, String, Table, and_, desc, func, select
+from sqlalchemy.sql import bindparam
 
 from cloudbot import hook
 from cloudbot.hook import Priority
-from cloudbot.util import web
+from cloudbot.util import database, web
+from cloudbot.util.counter_store import CounterStore
 from cloudbot.util.formatting import gen_markdown_table
+from cloudbot.util.latency import PHASES
+
+# Counts are stored in time buckets of each of these sizes, so they can be queried at any of these resolutions.
+# The day buckets are kept forever, and are used for all-time totals.
+PERIODS = {
+    'minute': ('m', 60),
+    'hour': ('h', 60 * 60),
+    'day': ('d', 24 * 60 * 60),
+}
 
+# How long to keep each type of bucket, in seconds
+DEFAULT_RETENTION = {
+    'minute': 2 * 24 * 60 * 60,
+    'hour': 60 * 24 * 60 * 60,
+}
 
-def default_hook_counter():
-    return {'success': 0, 'failure': 0}
-
+stats_table = Table(
+    'hook_stats',
+    database.metadata,
+    Column('period', String(1)),
+    Column('bucket', Integer),
+    Column('hook', String),
+    Column('network', String),
+    Column('channel', String),
+    Column('success', Integer, default=0),
+    Column('failure', Integer, default=0),
+    PrimaryKeyConstraint('period', 'bucket', 'hook', 'network', 'channel'),
+)
 
-def hook_sorter(n):
-    def _sorter(data):
-        return sum(data[n].values())
+# Counts not yet written to the database, keyed by (hook, network, channel)
+pending = CounterStore(('success', 'failure'))
 
-    return _sorter
+# Flushes run from several hooks, and must not both insert the same new bucket rows
+flush_lock = Lock()
 
 
-def get_stats(bot):
-    try:
-        stats = bot.memory["hook_stats"]
-    except LookupError:
-        bot.memory["hook_stats"] = stats = {
-            'global': defaultdict(default_hook_counter),
-            'network': defaultdict(lambda: defaultdict(default_hook_counter)),
-            'channel': defaultdict(lambda: defaultdict(lambda: defaultdict(default_hook_counter))),
+def record_launch(launched_hook, conn_name, chan, status):
+    name = launched_hook.plugin.title + '.' + launched_hook.function_name
+    network = conn_name.casefold() if conn_name else ''
+    channel = chan.casefold() if network and chan else ''
+    pending.add((name, network, channel), status)
+
+
+def _key_clause(period, bucket):
+    return and_(
+        stats_table.c.period == period,
+        stats_table.c.bucket == bucket,
+        stats_table.c.hook == bindparam('b_hook'),
+        stats_table.c.network == bindparam('b_network'),
+        stats_table.c.channel == bindparam('b_channel'),
+    )
+
+
+def write_counts(db, counts, now):
+    """
+    Add counts to the current bucket of each period, updating existing rows in one batch and inserting the rest in
+    another
+
+    :type counts: list[(tuple[str], tuple[int])]
+    :type now: int
+    """
+    for period, size in PERIODS.values():
+        bucket = now - now % size
+        existing = {
+            tuple(row) for row in db.execute(
+                select([stats_table.c.hook, stats_table.c.network, stats_table.c.channel]).where(
+                    and_(stats_table.c.period == period, stats_table.c.bucket == bucket)
+                )
+            )
         }
 
-    return stats
+        updates = []
+        inserts = []
+        for (name, network, channel), (success, failure) in counts:
+            if (name, network, channel) in existing:
+                updates.append({
+                    'b_hook': name, 'b_network': network, 'b_channel': channel,
+                    'b_success': success, 'b_failure': failure,
+                })
+            else:
+                inserts.append({
+                    'period': period, 'bucket': bucket, 'hook': name, 'network': network, 'channel': channel,
+                    'success': success, 'failure': failure,
+                })
+
+        if updates:
+            db.execute(
+                stats_table.update().where(_key_clause(period, bucket)).values(
+                    success=stats_table.c.success + bindparam('b_success'),
+                    failure=stats_table.c.failure + bindparam('b_failure'),
+                ),
+                updates
+            )
+
+        if inserts:
+            db.execute(stats_table.insert(), inserts)
+
+
+def prune_buckets(db, retention, now):
+    for name, max_age in retention.items():
+        period, _ = PERIODS[name]
+        db.execute(stats_table.delete().where(and_(stats_table.c.period == period, stats_table.c.bucket < now - max_age)))
+
+
+def flush_to_db(bot, db, now=None):
+    """
+    Write all pending counts to the database
+
+    :return: The number of (hook, network, channel) keys written
+    :rtype: int
+    """
+    with flush_lock:
+        counts = pending.drain()
+        if not counts:
+            return 0
+
+        if now is None:
+            now = int(time.time())
+
+        retention = dict(DEFAULT_RETENTION)
+        retention.update(bot.config.get("hook_stats", {}).get("retention", {}))
+
+        try:
+            write_counts(db, counts, now)
+            prune_buckets(db, retention, now)
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Keep the counts for the next attempt
+            pending.merge(counts)
+            raise
+
+        return len(counts)
 
 
 @hook.post_hook(priority=Priority.HIGHEST)
-def stats_sieve(launched_event, error, bot, launched_hook):
-    chan = launched_event.chan
+def stats_sieve(launched_event, error, launched_hook):
     conn = launched_event.conn
     status = 'success' if error is None else 'failure'
-    stats = get_stats(bot)
-    name = launched_hook.plugin.title + '.' + launched_hook.function_name
-    stats['global'][name][status] += 1
-    if conn:
-        stats['network'][conn.name.casefold()][name][status] += 1
+    record_launch(launched_hook, conn.name if conn else None, launched_event.chan, status)
 
-        if chan:
-            stats['channel'][conn.name.casefold()][chan.casefold()][name][status] += 1
 
+@hook.periodic(60)
+def save_stats(bot, db):
+    flush_to_db(bot, db)
 
-def do_basic_stats(data):
-    table = [
-        (hook_name, str(count['success']), str(count['failure']))
-        for hook_name, count in sorted(data.items(), key=hook_sorter(1), reverse=True)
-    ]
-    return ("Hook", "Uses - Success", "Uses - Errored"), table
 
+@hook.on_stop
+def save_stats_on_unload(bot, db):
+    flush_to_db(bot, db)
 
-def do_global_stats(data):
-    return do_basic_stats(data['global'])
 
+def query_totals(db, group_by, *where):
+    """
+    Sum the all-time counts matching `where`, grouped by the `group_by` columns, busiest first
+    """
+    total = func.sum(stats_table.c.success) + func.sum(stats_table.c.failure)
+    query = select(
+        list(group_by) + [func.sum(stats_table.c.success), func.sum(stats_table.c.failure)]
+    ).where(
+        and_(stats_table.c.period == PERIODS['day'][0], *where)
+    ).group_by(*group_by).order_by(desc(total))
 
-def do_network_stats(data, network):
-    return do_basic_stats(data['network'][network.casefold()])
+    return [tuple(str(value) for value in row) for row in db.execute(query)]
 
 
-def do_channel_stats(data, network, channel):
-    return do_basic_stats(data['channel'][network.casefold()][channel.casefold()])
+def do_global_stats(db):
+    return ("Hook", "Uses - Success", "Uses - Errored"), query_totals(db, [stats_table.c.hook])
 
 
-def do_hook_stats(data, hook_name):
-    table = [
-        (net, chan, hooks[hook_name]) for net, chans in data['channel'].items() for chan, hooks in chans.items()
+def do_network_stats(db, network):
+    return ("Hook", "Uses - Success", "Uses - Errored"), query_totals(
+        db, [stats_table.c.hook], stats_table.c.network == network.casefold()
+    )
+
+
+def do_channel_stats(db, network, channel):
+    return ("Hook", "Uses - Success", "Uses - Errored"), query_totals(
+        db, [stats_table.c.hook], stats_table.c.network == network.casefold(), stats_table.c.channel == channel.casefold()
+    )
+
+
+def do_hook_stats(db, hook_name):
+    return ("Network", "Channel", "Uses - Success", "Uses - Errored"), query_totals(
+        db, [stats_table.c.network, stats_table.c.channel], stats_table.c.hook == hook_name, stats_table.c.channel != ''
+    )
+
+
+def do_history_stats(db, period_name, hook_name, count=24):
+    try:
+        period, _ = PERIODS[period_name.lower()]
+    except LookupError:
+        return (), []
+
+    query = select([stats_table.c.bucket, func.sum(stats_table.c.success), func.sum(stats_table.c.failure)]).where(
+        and_(stats_table.c.period == period, stats_table.c.hook == hook_name)
+    ).group_by(stats_table.c.bucket).order_by(desc(stats_table.c.bucket)).limit(count)
+
+    rows = [
+        (datetime.utcfromtimestamp(bucket).strftime('%Y-%m-%d %H:%M'), str(success), str(failure))
+        for bucket, success, failure in db.execute(query)
     ]
-    return ("Network", "Channel", "Uses - Success", "Uses - Errored"), \
-           [
-               (net, chan, str(count['success']), str(count['failure']))
-               for net, chan, count in sorted(table, key=hook_sorter(2), reverse=True)
-           ]
+    return ("Time (UTC)", "Uses - Success", "Uses - Errored"), rows
 
 
 stats_funcs = {
@@ -88,28 +228,94 @@ stats_funcs = {
     'network': (do_network_stats, 1),
     'channel': (do_channel_stats, 2),
     'hook': (do_hook_stats, 1),
+    'history': (do_history_stats, 2),
 }
 
 
+def format_ms(seconds):
+    return "{:.1f}".format(seconds * 1000)
+
+
+def latency_row(hist):
+    return (
+        str(hist.count), format_ms(hist.percentile(50)), format_ms(hist.percentile(99)), format_ms(hist.max)
+    )
+
+
+LATENCY_HEADERS = ("Count", "p50 (ms)", "p99 (ms)", "Max (ms)")
+
+
+def do_latency_stats(latency, hook_name):
+    if ':' not in hook_name:
+        # Accept the plugin.function names used by the other stats
+        hook_name = ':'.join(hook_name.rsplit('.', 1))
+
+    try:
+        hook_latency = latency.hooks[hook_name]
+    except LookupError:
+        return (), []
+
+    table = [
+        (phase,) + latency_row(getattr(hook_latency, phase))
+        for phase in PHASES if getattr(hook_latency, phase).count
+    ]
+    return ("Phase",) + LATENCY_HEADERS, table
+
+
+def do_slowest_stats(latency, phase='run'):
+    if phase not in PHASES:
+        return (), []
+
+    table = [(name,) + latency_row(hist) for name, hist in latency.slowest(phase, count=25)]
+    return ("Hook",) + LATENCY_HEADERS, table
+
+
+# name: (handler, minimum argument count, maximum argument count)
+latency_funcs = {
+    'latency': (do_latency_stats, 1, 1),
+    'slowest': (do_slowest_stats, 0, 1),
+}
+
+
+def get_latency_table(bot, stats_type, args):
+    handler, min_args, max_args = latency_funcs[stats_type]
+    if not min_args <= len(args) <= max_args:
+        return None
+
+    return handler(bot.plugin_manager.latency, *args)
+
+
 @hook.command(permissions=["snoonetstaff", "botcontrol"])
-def hookstats(text, bot, notice_doc):
-    """{global|network <name>|channel <network> <channel>|hook <hook>} - Get hook usage statistics"""
+def hookstats(text, bot, db, notice_doc):
+    """{global|network <name>|channel <network> <channel>|hook <hook>|history <minute|hour|day> <hook>|latency <hook>|\
+slowest [phase]|export} - Get hook usage and latency statistics, phase is one of wait, sieve, run or post"""
     args = text.split()
     stats_type = args.pop(0).lower()
 
-    data = get_stats(bot)
+    if stats_type == 'export':
+        return web.paste(json.dumps(bot.plugin_manager.latency.snapshot(), indent=2), 'json', 'hastebin')
 
-    try:
-        handler, arg_count = stats_funcs[stats_type]
-    except LookupError:
-        notice_doc()
-        return
+    if stats_type in latency_funcs:
+        result = get_latency_table(bot, stats_type, args)
+        if result is None:
+            notice_doc()
+            return
+
+        headers, data = result
+    else:
+        flush_to_db(bot, db)
 
-    if len(args) < arg_count:
-        notice_doc()
-        return
+        try:
+            handler, arg_count = stats_funcs[stats_type]
+        except LookupError:
+            notice_doc()
+            return
 
-    headers, data = handler(data, *args[:arg_count])
+        if len(args) < arg_count:
+            notice_doc()
+            return
+
+        headers, data = handler(db, *args[:arg_count])
 
     if not data:
         return "No stats available."
@@ -117,3 +323,35 @@ def hookstats(text, bot, notice_doc):
     table = gen_markdown_table(headers, data)
 
     return web.paste(table, 'md', 'hastebin')
+
+
+def do_pool_stats(executors):
+    pools = [
+        (name, str(pool.max_workers), str(pool.limit), str(pool.pending), str(pool.rejected))
+        for name, pool in sorted(executors.pools.items())
+    ]
+    hooks = [
+        (
+            name, str(metrics.count), str(metrics.rejected),
+            "{:.3f}".format(metrics.wait_avg), "{:.3f}".format(metrics.wait_max),
+            "{:.3f}".format(metrics.run_avg), "{:.3f}".format(metrics.run_max),
+        )
+        for name, metrics in sorted(executors.metrics.items(), key=lambda item: item[1].run_total, reverse=True)
+    ]
+    return pools, hooks
+
+
+@hook.command(permissions=["snoonetstaff", "botcontrol"])
+def hookpools(bot):
+    """- Get thread pool usage and per-hook queue wait and run times"""
+    pools, hooks = do_pool_stats(bot.plugin_manager.executors)
+    if not pools:
+        return "No stats available."
+
+    table = gen_markdown_table(("Pool", "Workers", "Limit", "Pending", "Rejected"), pools)
+    if hooks:
+        table += "\n\n" + gen_markdown_table(
+            ("Hook", "Runs", "Rejected", "Wait - Avg", "Wait - Max", "Run - Avg", "Run - Max"), hooks
+        )
+
+    return web.paste(table, 'md', 'hastebin')
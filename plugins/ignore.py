@@ -1,8 +1,12 @@
-from irclib.util.compare import match_mask
+from functools import lru_cache
+from threading import RLock
+
 from sqlalchemy import Table, Column, UniqueConstraint, PrimaryKeyConstraint, String, Boolean
 
 from cloudbot import hook
 from cloudbot.util import database
+from cloudbot.util.casemap import get_casemap
+from cloudbot.util.mask_index import MaskIndex
 
 table = Table(
     "ignored",
@@ -15,7 +19,127 @@ table = Table(
     PrimaryKeyConstraint("connection", "channel", "mask")
 )
 
-ignore_cache = []
+# The number of (connection, channel, mask) results to remember, cleared whenever the ignores change
+CACHE_SIZE = 4096
+
+
+class IgnoreIndex:
+    """
+    Ignored masks, indexed by connection and channel
+
+    Global ignores (channel "*") apply on every connection, and are kept in their own index.
+
+    Channels and masks are matched with the connection's case mapping, but stored with their original case,
+    as they are in the database. The folded indexes are built from `entries` for each case mapping in use,
+    and rebuilt after the ignores change, so a folded entry stays as long as any stored mask folds to it.
+
+    :type entries: set[tuple[str, str, str]]
+    """
+
+    def __init__(self):
+        self.entries = set()
+        # CaseMap -> (global MaskIndex, {(conn, folded channel): MaskIndex})
+        self._indexes = {}
+        self._lock = RLock()
+        self._check = lru_cache(maxsize=CACHE_SIZE)(self._is_ignored)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _changed(self):
+        self._indexes.clear()
+        self._check.cache_clear()
+
+    def add(self, conn, chan, mask):
+        """
+        :type conn: str
+        :type chan: str
+        :type mask: str
+        """
+        with self._lock:
+            self.entries.add((conn, chan, mask))
+            self._changed()
+
+    def remove(self, conn, chan, mask):
+        """
+        :type conn: str
+        :type chan: str
+        :type mask: str
+        """
+        with self._lock:
+            self.entries.discard((conn, chan, mask))
+            self._changed()
+
+    def load(self, entries):
+        """
+        Replace all ignores
+
+        :type entries: collections.abc.Iterable[tuple[str, str, str]]
+        """
+        entries = set(entries)
+        with self._lock:
+            self.entries = entries
+            self._changed()
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self._changed()
+
+    def get_indexes(self, casemap):
+        """
+        Get the global and per-channel indexes, folded with `casemap`
+
+        :type casemap: cloudbot.util.casemap.CaseMap
+        :rtype: (MaskIndex, dict[tuple[str, str], MaskIndex])
+        """
+        with self._lock:
+            try:
+                return self._indexes[casemap]
+            except KeyError:
+                pass
+
+            fold = casemap.fold
+            global_masks = MaskIndex()
+            channels = {}
+            for conn, chan, mask in self.entries:
+                if chan == "*":
+                    index = global_masks
+                else:
+                    index = channels.setdefault((conn, fold(chan)), MaskIndex())
+
+                index.add(fold(mask))
+
+            self._indexes[casemap] = indexes = (global_masks, channels)
+            return indexes
+
+    def is_ignored(self, conn, chan, mask, casemap=None):
+        """
+        :type conn: str
+        :param chan: The channel, which may already be folded with `casemap`, e.g. an event's `folded_chan`
+        :type chan: str
+        :type mask: str
+        :param casemap: The connection's case mapping, the default mapping if None
+        :type casemap: cloudbot.util.casemap.CaseMap | None
+        :rtype: bool
+        """
+        if casemap is None:
+            casemap = get_casemap()
+
+        with self._lock:
+            return self._check(conn, chan, mask, casemap)
+
+    def _is_ignored(self, conn, chan, mask, casemap):
+        global_masks, channels = self.get_indexes(casemap)
+        mask_cf = casemap.fold(mask)
+        if global_masks.match(mask_cf):
+            return True
+
+        index = channels.get((conn, casemap.fold(chan))) if chan else None
+        return index is not None and index.match(mask_cf)
+
+
+ignore_cache = IgnoreIndex()
 
 
 @hook.on_start
@@ -23,62 +147,37 @@ def load_cache(db):
     """
     :type db: sqlalchemy.orm.Session
     """
-    new_cache = []
-    for row in db.execute(table.select()):
-        conn = row["connection"]
-        chan = row["channel"]
-        mask = row["mask"]
-        new_cache.append((conn, chan, mask))
-
-    ignore_cache.clear()
-    ignore_cache.extend(new_cache)
+    ignore_cache.load(
+        (row["connection"], row["channel"], row["mask"]) for row in db.execute(table.select())
+    )
 
 
 def add_ignore(db, conn, chan, mask):
-    if (conn, chan) in ignore_cache:
-        pass
-    else:
-        db.execute(table.insert().values(connection=conn, channel=chan, mask=mask))
-
+    db.execute(table.insert().values(connection=conn, channel=chan, mask=mask))
     db.commit()
-    load_cache(db)
+    ignore_cache.add(conn, chan, mask)
 
 
 def remove_ignore(db, conn, chan, mask):
     db.execute(table.delete().where(table.c.connection == conn).where(table.c.channel == chan)
                .where(table.c.mask == mask))
     db.commit()
-    load_cache(db)
+    ignore_cache.remove(conn, chan, mask)
 
 
-def is_ignored(conn, chan, mask):
-    mask_cf = mask.casefold()
-    for _conn, _chan, _mask in ignore_cache:
-        _mask_cf = _mask.casefold()
-        if _chan == "*":
-            # this is a global ignore
-            if match_mask(mask_cf, _mask_cf):
-                return True
-        else:
-            # this is a channel-specific ignore
-            if (conn, chan) != (_conn, _chan):
-                continue
-            if match_mask(mask_cf, _mask_cf):
-                return True
+def is_ignored(conn, chan, mask, casemap=None):
+    return ignore_cache.is_ignored(conn, chan, mask, casemap)
 
 
 # noinspection PyUnusedLocal
-@hook.sieve(priority=50)
+# don't block event hooks, or anything else not triggered by a user's message
+@hook.sieve(priority=50, hook_types=["command", "regex"])
 async def ignore_sieve(bot, event, _hook):
     """
     :type bot: cloudbot.bot.CloudBot
     :type event: cloudbot.event.Event
     :type _hook: cloudbot.plugin_hooks.Hook
     """
-    # don't block event hooks
-    if _hook.type in ("irc_raw", "event"):
-        return event
-
     # don't block an event that could be unignoring
     if _hook.type == "command" and event.triggered_command in ("unignore", "global_unignore"):
         return event
@@ -87,7 +186,7 @@ async def ignore_sieve(bot, event, _hook):
         # this is a server message, we don't need to check it
         return event
 
-    if is_ignored(event.conn.name, event.chan, event.mask):
+    if is_ignored(event.conn.name, event.folded_chan, event.mask, event.casemap):
         return None
 
     return event
@@ -109,11 +208,11 @@ def get_user(conn, text):
 
 
 @hook.command(permissions=["ignore", "chanop"])
-def ignore(text, db, chan, conn, notice, admin_log, nick):
+def ignore(text, db, chan, conn, notice, admin_log, nick, casemap):
     """<nick|mask> - ignores all input from <nick|mask> in this channel."""
     target = get_user(conn, text)
 
-    if is_ignored(conn.name, chan, target):
+    if is_ignored(conn.name, chan, target, casemap):
         notice("{} is already ignored in {}.".format(target, chan))
     else:
         admin_log("{} used IGNORE to make me ignore {} in {}".format(nick, target, chan))
@@ -122,11 +221,11 @@ def ignore(text, db, chan, conn, notice, admin_log, nick):
 
 
 @hook.command(permissions=["ignore", "chanop"])
-def unignore(text, db, chan, conn, notice, nick, admin_log):
+def unignore(text, db, chan, conn, notice, nick, admin_log, casemap):
     """<nick|mask> - un-ignores all input from <nick|mask> in this channel."""
     target = get_user(conn, text)
 
-    if not is_ignored(conn.name, chan, target):
+    if not is_ignored(conn.name, chan, target, casemap):
         notice("{} is not ignored in {}.".format(target, chan))
     else:
         admin_log("{} used UNIGNORE to make me stop ignoring {} in {}".format(nick, target, chan))
@@ -135,11 +234,11 @@ def unignore(text, db, chan, conn, notice, nick, admin_log):
 
 
 @hook.command(permissions=["botcontrol"])
-def global_ignore(text, db, conn, notice, nick, admin_log):
+def global_ignore(text, db, conn, notice, nick, admin_log, casemap):
     """<nick|mask> - ignores all input from <nick|mask> in ALL channels."""
     target = get_user(conn, text)
 
-    if is_ignored(conn.name, "*", target):
+    if is_ignored(conn.name, "*", target, casemap):
         notice("{} is already globally ignored.".format(target))
     else:
         notice("{} has been globally ignored.".format(target))
@@ -148,11 +247,11 @@ def global_ignore(text, db, conn, notice, nick, admin_log):
 
 
 @hook.command(permissions=["botcontrol"])
-def global_unignore(text, db, conn, notice, nick, admin_log):
+def global_unignore(text, db, conn, notice, nick, admin_log, casemap):
     """<nick|mask> - un-ignores all input from <nick|mask> in ALL channels."""
     target = get_user(conn, text)
 
-    if not is_ignored(conn.name, "*", target):
+    if not is_ignored(conn.name, "*", target, casemap):
         notice("{} is not globally ignored.".format(target))
     else:
         notice("{} has been globally un-ignored.".format(target))
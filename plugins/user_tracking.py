@@ -8,7 +8,6 @@ Author:
 import asyncio
 import datetime
 import re
-import string
 from collections import defaultdict
 from contextlib import suppress
 
@@ -20,6 +19,7 @@ from cloudbot.event import EventType
 from cloudbot.util import database
 from cloudbot.util.async_util import wrap_future, create_future
 from cloudbot.util.backoff import Delayer
+from cloudbot.util.casemap import STRICT_RFC1459, get_casemap
 
 address_table = Table(
     'addrs',
@@ -57,10 +57,9 @@ masks_table = Table(
     PrimaryKeyConstraint('nick', 'mask')
 )
 
-RFC_CASEMAP = str.maketrans(dict(zip(
-    string.ascii_uppercase + "[]\\",
-    string.ascii_lowercase + "{}|"
-)))
+# Stored nicks are always folded with the same mapping, so the keys don't depend on the server's CASEMAPPING
+DB_CASEMAP = get_casemap(STRICT_RFC1459)
+RFC_CASEMAP = DB_CASEMAP.table
 
 
 def update_user_data(db, table, column_name, now, nick, value):
@@ -131,7 +130,7 @@ def get_regex(conn, name):
 
 
 def rfc_casefold(text):
-    return text.translate(RFC_CASEMAP)
+    return DB_CASEMAP.fold(text)
 
 
 def _handle_who_response(irc_paramlist):
@@ -248,17 +247,17 @@ def init_futures(bot):
 
 @hook.event(EventType.notice)
 @asyncio.coroutine
-def on_notice(db, nick, chan, conn, event):
+def on_notice(db, folded_nick, folded_chan, casemap, conn, event):
     try:
         server_info = conn.memory["server_info"]
     except LookupError:
         return
 
-    if chan.casefold() != nick.casefold():
+    if folded_chan != folded_nick:
         # This isn't a PM / Private notice, ignore it
         return
 
-    if nick.casefold() != server_info["server_name"]:
+    if folded_nick != casemap.fold(server_info["server_name"]):
         # This message isn't from the server, ignore it
         return
 
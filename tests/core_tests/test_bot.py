@@ -64,3 +64,66 @@ def test_load_clients():
         bot = CloudBot()
         assert bot.connections['foobar'].nick == 'TestBot'
         assert bot.connections['foobar'].type == 'irc'
+
+
+@pytest.mark.parametrize('prefix,nick', [
+    ('.', 'Bot'),
+    ('.!', 'TestBot'),
+    ('a', 'Bot'),
+    ('[', '[Bot]'),
+])
+@pytest.mark.parametrize('content', [
+    '.foo',
+    '.Foo bar  baz ',
+    '.foo\tbar',
+    '!foo bar',
+    '. foo',
+    '.',
+    '',
+    '.foo_bar baz',
+    '.foo-bar',
+    '.föö bar',
+    '.foo\nbar',
+    'foo bar',
+    'Afoo bar',
+    'bot: foo bar',
+    'BOT,; foo',
+    'testbot: foo',
+    'bot:foo',
+    '[bot] foo',
+    '[bot]: foo',
+    '[foo',
+])
+@pytest.mark.parametrize('is_pm', [False, True])
+def test_cmd_matcher(prefix, nick, content, is_pm):
+    from cloudbot.bot import CommandMatcher, _build_cmd_regex
+    cmd_match = _build_cmd_regex(prefix, nick, is_pm).match(content)
+    if cmd_match:
+        expected = (
+            cmd_match.group('prefix') or prefix[0],
+            cmd_match.group('command').lower(),
+            cmd_match.group('text').strip(),
+        )
+    else:
+        expected = None
+
+    assert CommandMatcher(prefix, nick).match(content, is_pm) == expected
+
+
+def test_get_cmd_matcher():
+    from cloudbot.bot import get_cmd_matcher
+    conn = MockConn('Bot')
+    conn.cmd_matcher = None
+    matcher = get_cmd_matcher(conn)
+    assert get_cmd_matcher(conn) is matcher
+    assert matcher.match('bot: foo').command == 'foo'
+
+    conn.nick = 'OtherBot'
+    matcher = get_cmd_matcher(conn)
+    assert matcher.match('bot: foo') is None
+    assert matcher.match('otherbot: foo').command == 'foo'
+
+    conn.config['command_prefix'] = '!'
+    matcher = get_cmd_matcher(conn)
+    assert matcher.match('.foo') is None
+    assert matcher.match('!foo').prefix == '!'
@@ -13,3 +13,86 @@ def test_event_copy():
     assert event.conn is new_event.conn
     assert event.hook is new_event.hook
     assert event.nick is new_event.nick
+
+
+def test_event_copy_on_write():
+    from cloudbot.event import Event, CommandEvent
+
+    event = Event(bot=object(), channel='#foo', nick='bar', content='.baz')
+    hook = object()
+    hook_event = Event(hook=hook, base_event=event)
+    cmd_event = CommandEvent(
+        hook=type('Hook', (), {'doc': None})(), text='', triggered_command='baz', cmd_prefix='.', base_event=event
+    )
+
+    assert hook_event.chan == cmd_event.chan == '#foo'
+
+    hook_event.chan = '#other'
+    assert hook_event.chan == '#other'
+    assert event.chan == cmd_event.chan == '#foo'
+
+    event.content = 'changed'
+    assert event.content == 'changed'
+    assert hook_event.content == cmd_event.content == '.baz'
+
+    assert hook_event['hook'] is hook
+    assert cmd_event['chan'] == '#foo'
+
+
+def test_event_slots():
+    import pytest
+    from cloudbot.event import CapEvent, CommandEvent, Event, IrcOutEvent, PostHookEvent, RegexEvent
+
+    hook = type('Hook', (), {'doc': None})()
+    events = [
+        Event(),
+        CommandEvent(hook=hook, text='', triggered_command='foo', cmd_prefix='.'),
+        RegexEvent(hook=hook, match=None),
+        CapEvent(cap='foo'),
+        IrcOutEvent(),
+        PostHookEvent(),
+    ]
+    for event in events:
+        assert not hasattr(event, '__dict__')
+
+    event = Event()
+    with pytest.raises(AttributeError):
+        event.foo = 1
+
+    with pytest.raises(AttributeError):
+        _ = event.foo
+
+    with pytest.raises(KeyError):
+        _ = event['foo']
+
+
+def test_event_ext():
+    from cloudbot.event import Event
+
+    event = Event()
+    event.ext.foo = 'bar'
+    assert event.foo == 'bar'
+    assert event['foo'] == 'bar'
+
+    # Ad-hoc data isn't inherited by copies of the event
+    assert not hasattr(Event(base_event=event), 'foo')
+
+
+def test_event_folded():
+    from cloudbot.event import Event
+    from cloudbot.util.casemap import get_casemap
+
+    event = Event(nick='Nick[a]', channel='#Foo')
+    assert event.folded_nick == 'nick{a}'
+    assert event.folded_chan == '#foo'
+
+    conn = type('Conn', (), {'casemap': get_casemap('ascii')})()
+    copy = Event(conn=conn, base_event=event)
+    assert copy.folded_nick == 'nick{a}'
+
+    # Changing the nick refolds it, without affecting other events sharing the data
+    copy.nick = 'Other[b]'
+    assert copy.folded_nick == 'other[b]'
+    assert event.folded_nick == 'nick{a}'
+
+    assert Event().folded_nick is None
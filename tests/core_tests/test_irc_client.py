@@ -0,0 +1,203 @@
+import asyncio
+
+from mock import MagicMock
+
+from cloudbot.event import EventType
+from cloudbot.util.decoding import get_decoder
+
+
+class MockBot:
+    def __init__(self):
+        self.loop = asyncio.get_event_loop()
+        self.events = []
+
+    async def process(self, event):
+        self.events.append(event)
+
+
+def make_client(bot, **conn_config):
+    from cloudbot.clients.irc import IrcClient
+    conn_config.setdefault('server', 'irc.example.com')
+    client = IrcClient(bot, 'irc', 'foo', 'FooBot', config={'connection': conn_config})
+    client.send = MagicMock()
+    return client
+
+
+def make_proto(**conn_config):
+    from cloudbot.clients.irc import _IrcProtocol
+    bot = MockBot()
+    conn = make_client(bot, **conn_config)
+    proto = _IrcProtocol(conn)
+    return bot, conn, proto
+
+
+def run_pending(loop):
+    loop.run_until_complete(asyncio.sleep(0))
+
+
+def test_data_received():
+    bot, _, proto = make_proto()
+    proto.data_received(b":Foo!bar@baz PRIVMSG #chan :hello\r\n:Foo!bar@baz PRIV")
+    proto.data_received(b"MSG #chan :\x01ACTION waves\x01\n")
+    run_pending(bot.loop)
+
+    assert [event.type for event in bot.events] == [EventType.message, EventType.action]
+    assert bot.events[0].content == "hello"
+    assert bot.events[1].content == "waves"
+    assert bot.events[1].nick == "Foo"
+
+
+def test_data_received_casemap():
+    bot, conn, proto = make_proto()
+    proto.data_received(b":Nick[a]!bar@baz PRIVMSG #Chan^ :hello\r\n")
+    proto.data_received(b":irc.example.com 005 FooBot CASEMAPPING=ascii :are supported by this server\r\n")
+    proto.data_received(b":Nick[a]!bar@baz PRIVMSG #Chan^ :hello\r\n")
+    run_pending(bot.loop)
+
+    assert conn.casemap.name == 'ascii'
+    rfc, _, ascii_event = bot.events
+    assert (rfc.folded_nick, rfc.folded_chan) == ('nick{a}', '#chan~')
+    assert (ascii_event.folded_nick, ascii_event.folded_chan) == ('nick[a]', '#chan^')
+    assert ascii_event.nick == 'Nick[a]'
+
+
+def test_data_received_ping():
+    bot, conn, proto = make_proto()
+    proto.data_received(b"PING :irc.example.com\r\n")
+    conn.send.assert_called_once_with("PONG irc.example.com", log=False)
+
+
+def test_data_received_long_line():
+    bot, _, proto = make_proto(max_input_line_length=32)
+    proto.data_received(b":Foo!bar@baz PRIVMSG #chan :" + (b"a" * 64) + b"\r\n")
+    proto.data_received(b":Foo!bar@baz PRIVMSG #c :hi\r\n")
+    run_pending(bot.loop)
+
+    assert [event.content for event in bot.events] == ["hi"]
+
+
+def test_data_received_decoding():
+    bot, conn, proto = make_proto()
+    conn.decoder = get_decoder({'strategy': 'remember', 'fallbacks': ['cp1252']})
+    proto.data_received(b":Foo!bar@baz PRIVMSG #chan :\x80\r\n")
+    run_pending(bot.loop)
+
+    assert [event.content for event in bot.events] == ["€"]
+    assert conn.decoder.stats['fallback:cp1252'] == 1
+
+
+def test_send_queue():
+    from cloudbot.clients.irc import IrcClient
+    bot = MockBot()
+    conn = IrcClient(bot, 'irc', 'foo', 'FooBot', config={
+        'connection': {'server': 'irc.example.com'},
+        'log_channel': '#admin',
+        'send_queue': {'enabled': True, 'max_tokens': 1, 'restore_rate': 1000},
+    })
+
+    sent = []
+
+    async def send(line, log=True):
+        sent.append(line)
+
+    conn._protocol = MagicMock()
+    conn._protocol.send = send
+
+    conn._send("PRIVMSG #chan :1")
+    conn._send("PRIVMSG #chan :2")
+    conn._send("PRIVMSG #chan :2")
+    conn._send("NAMES #chan")
+    conn._send("NAMES #chan")
+    conn._send("PRIVMSG #admin :log")
+    conn._send("PONG irc.example.com", False)
+    bot.loop.run_until_complete(conn._drain_task)
+
+    assert sent == [
+        "PONG irc.example.com", "PRIVMSG #admin :log", "PRIVMSG #chan :1", "PRIVMSG #chan :2", "PRIVMSG #chan :2",
+        "NAMES #chan",
+    ]
+    assert conn.send_queue.coalesced == 1
+    assert conn._drain_task is None
+
+
+def test_send_queue_no_limit():
+    from cloudbot.clients.irc import IrcClient
+    bot = MockBot()
+    conn = IrcClient(bot, 'irc', 'foo', 'FooBot', config={
+        'connection': {'server': 'irc.example.com'},
+        'send_queue': {'enabled': True, 'restore_rate': 0},
+    })
+    assert conn._send_bucket is None
+
+    sent = []
+
+    async def send(line, log=True):
+        sent.append(line)
+
+    conn._protocol = MagicMock()
+    conn._protocol.send = send
+
+    for i in range(10):
+        conn._send("PRIVMSG #chan :{}".format(i))
+
+    conn._send("PONG irc.example.com", False)
+    bot.loop.run_until_complete(conn._drain_task)
+
+    assert sent == ["PONG irc.example.com"] + ["PRIVMSG #chan :{}".format(i) for i in range(10)]
+
+
+def test_send_inline_out_hooks():
+    import importlib
+    from operator import attrgetter
+    from unittest.mock import patch
+
+    from cloudbot.clients import irc
+    from cloudbot.plugin import Plugin, PluginManager
+    from plugins.core import core_out
+
+    bot = MockBot()
+    bot.config = {}
+    bot.plugin_manager = PluginManager(bot)
+    # Loading a plugin consumes its hook attributes, so make sure they are there
+    importlib.reload(core_out)
+    plugin = Plugin(core_out.__file__, 'core_out.py', 'core.core_out', core_out)
+    bot.plugin_manager.out_sieves.extend(sorted(plugin.hooks['irc_out'], key=attrgetter('priority')))
+    assert len(bot.plugin_manager.out_sieves) == 4
+    assert all(hook.inline for hook in bot.plugin_manager.out_sieves)
+
+    conn = make_client(bot)
+    proto = irc._IrcProtocol(conn)
+    transport = MagicMock()
+    proto.connection_made(transport)
+
+    with patch.object(irc.Message, 'parse', wraps=irc.Message.parse) as parse:
+        bot.loop.run_until_complete(proto.send("PRIVMSG #chan :.hi\n", log=False))
+
+    assert parse.call_count == 1
+    run_pending(bot.loop)
+    transport.write.assert_called_once_with(b"PRIVMSG #chan :\x0304[!!]\x0f .hi\r\n")
+    assert conn.lines_out == 1
+
+
+def test_send_coalesced():
+    from cloudbot.clients.irc import _IrcProtocol
+    bot = MockBot()
+    bot.plugin_manager = MagicMock(out_sieves=[])
+    conn = make_client(bot)
+    proto = _IrcProtocol(conn)
+    transport = MagicMock()
+    proto.connection_made(transport)
+
+    async def burst():
+        await asyncio.gather(*(proto.send("JOIN #chan{}".format(i), log=False) for i in range(3)))
+
+    bot.loop.run_until_complete(burst())
+    run_pending(bot.loop)
+
+    transport.write.assert_called_once_with(b"JOIN #chan0\r\nJOIN #chan1\r\nJOIN #chan2\r\n")
+    assert conn.lines_out == 3
+
+    bot.loop.run_until_complete(proto.send("QUIT", log=False))
+    proto.close()
+    assert transport.write.call_args[0][0] == b"QUIT\r\n"
+    transport.close.assert_called_once_with()
@@ -0,0 +1,74 @@
+import asyncio
+from unittest.mock import MagicMock
+
+from cloudbot.metrics import MetricsServer, collect_metrics, format_metrics
+from cloudbot.util.executor_pool import ExecutorPool
+from cloudbot.util.hook_executor import HookExecutors
+from cloudbot.util.send_queue import OutboundQueue
+from cloudbot.util.task_registry import TaskRegistry
+
+
+def make_bot():
+    bot = MagicMock()
+
+    conn = MagicMock()
+    conn.name = 'testconn'
+    conn.connected = True
+    conn.lines_in = 10
+    conn.lines_out = 5
+    conn.memory = {'lag': 0.25}
+    conn.send_queue = OutboundQueue()
+    conn.send_queue.push("PRIVMSG #chan :hello")
+    bot.connections = {'testconn': conn}
+
+    plugin = MagicMock()
+    plugin.title = 'test'
+    plugin.tasks = TaskRegistry()
+    bot.plugin_manager.plugins = {'plugins/test.py': plugin}
+    bot.plugin_manager.launch_counts = {'command': 3}
+    bot.plugin_manager.executors = HookExecutors()
+    bot.db_executor_pool = ExecutorPool(2)
+    return bot
+
+
+def test_collect():
+    text = format_metrics(collect_metrics(make_bot()))
+
+    assert 'cloudbot_connection_lag_seconds{connection="testconn"} 0.25\n' in text
+    assert 'cloudbot_lines_received_total{connection="testconn"} 10\n' in text
+    assert 'cloudbot_lines_sent_total{connection="testconn"} 5\n' in text
+    assert 'cloudbot_send_queue_depth{connection="testconn",priority="normal"} 1\n' in text
+    assert 'cloudbot_hook_launches_total{type="command"} 3\n' in text
+    assert 'cloudbot_plugin_tasks{plugin="test"} 0\n' in text
+    assert 'cloudbot_db_executors{state="free"} 0\n' in text
+    assert '# TYPE cloudbot_gc_allocations gauge\n' in text
+
+
+def test_from_config():
+    assert MetricsServer.from_config(MagicMock(), {}) is None
+    server = MetricsServer.from_config(MagicMock(), {'enabled': True, 'port': 1234})
+    assert server.port == 1234
+
+
+def test_server():
+    loop = asyncio.get_event_loop()
+    server = MetricsServer(make_bot(), port=0)
+
+    async def _get(path):
+        host, port = server.sockets[0].getsockname()[:2]
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write('GET {} HTTP/1.1\r\nHost: localhost\r\n\r\n'.format(path).encode())
+        data = await reader.read()
+        writer.close()
+        return data.decode()
+
+    loop.run_until_complete(server.start())
+    try:
+        response = loop.run_until_complete(_get('/metrics'))
+        assert response.startswith('HTTP/1.0 200 OK\r\n')
+        assert 'cloudbot_lines_sent_total{connection="testconn"} 5' in response
+
+        response = loop.run_until_complete(_get('/'))
+        assert response.startswith('HTTP/1.0 404 Not Found\r\n')
+    finally:
+        server.stop()
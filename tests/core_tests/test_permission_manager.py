@@ -97,3 +97,30 @@ def test_add_user_to_group():
     manager.add_user_to_group('*!*@mask', 'admins')
     manager.reload()
     assert len(manager.get_group_users('admins')) == 2
+
+
+def test_perm_cache():
+    from cloudbot.permissions import PermissionManager
+    config = {
+        'permissions': {
+            'admins': {'users': ['admin!*@host', 'other!user@host'], 'perms': ['botcontrol', 'chanop']},
+            'ops': {'users': ['*!*@ops.host'], 'perms': ['chanop']},
+        }
+    }
+    manager = PermissionManager(MockConn('testconn', config))
+
+    assert manager.has_perm_mask('Admin!x@HOST', 'BotControl', False)
+    assert manager.has_perm_mask('other!user@host', 'botcontrol', False)
+    assert not manager.has_perm_mask('other!user2@host', 'botcontrol', False)
+    assert manager.has_perm_mask('op!x@ops.host', 'chanop', False)
+    assert not manager.has_perm_mask('op!x@ops.host', 'botcontrol', False)
+    assert manager.get_user_permissions('op!x@ops.host') == {'chanop'}
+    assert manager.get_user_groups('admin!x@host') == ['admins']
+
+    assert manager.has_perm_mask('admin!x@host', 'botcontrol', False)
+    assert manager._check_mask.cache_info().hits == 1
+
+    config['permissions']['admins']['users'] = ['other!user@host']
+    manager.reload()
+    assert not manager.has_perm_mask('admin!x@host', 'botcontrol', False)
+    assert manager._check_mask.cache_info().hits == 0
@@ -381,6 +381,37 @@ def test_irc_out_hook_str():
     assert str(_hook) == 'irc_out hook_func from test.py'
 
 
+def test_irc_out_hook_inline():
+    from cloudbot.hook import irc_out
+
+    @irc_out()
+    def transform(line, parsed_line):
+        pass  # pragma: no cover
+
+    @irc_out(inline=False)
+    def not_inline(line):
+        pass  # pragma: no cover
+
+    @irc_out()
+    async def coro(line):
+        pass  # pragma: no cover
+
+    @irc_out()
+    def uses_db(line, db):
+        pass  # pragma: no cover
+
+    @irc_out(singlethread=True)
+    def locked(line):
+        pass  # pragma: no cover
+
+    _hook = get_and_wrap_hook(transform, 'irc_out')
+    assert _hook.inline
+    assert _hook.wants_parsed_line
+
+    for func in (not_inline, coro, uses_db, locked):
+        assert not get_and_wrap_hook(func, 'irc_out').inline
+
+
 def test_post_hook_hook_str():
     from cloudbot.hook import post_hook
 
@@ -403,3 +434,69 @@ def test_perm_hook_str():
     _hook = get_and_wrap_hook(hook_func, 'perm_check')
 
     assert str(_hook) == 'perm hook hook_func from test.py'
+
+
+def test_hook_invalid_param():
+    from cloudbot.hook import command
+    from cloudbot.util.func_utils import ParameterError
+
+    @command('test')
+    def hook_func(text, not_an_arg):
+        pass  # pragma: no cover
+
+    with pytest.raises(ParameterError) as exc:
+        get_and_wrap_hook(hook_func, 'command')
+
+    assert exc.value.name == 'not_an_arg'
+
+
+def test_hook_ext_param():
+    from cloudbot.event import CommandEvent
+    from cloudbot.hook import command
+
+    @command('test', ext_args=['ext_arg'])
+    def hook_func(text, ext_arg):
+        pass  # pragma: no cover
+
+    _hook = get_and_wrap_hook(hook_func, 'command')
+    assert _hook.ext_args == ['ext_arg']
+
+    event = CommandEvent(hook=_hook, text='foo', triggered_command='test', cmd_prefix='.')
+    event.ext.ext_arg = 'bar'
+    assert _hook.binder.bind_attrs(event) == ('foo', 'bar')
+
+
+def test_post_hook_filters():
+    from cloudbot.hook import post_hook
+
+    @post_hook(errors_only=True, hook_types='command')
+    def hook_func(error):
+        pass  # pragma: no cover
+
+    _hook = get_and_wrap_hook(hook_func, 'post_hook')
+
+    assert _hook.applies_to('command')
+    assert not _hook.applies_to('regex')
+    assert _hook.should_run(object())
+    assert not _hook.should_run(None)
+
+
+def test_post_hook_sampling():
+    from cloudbot.hook import post_hook
+
+    @post_hook(sample_rate=0)
+    def hook_func(error):
+        pass  # pragma: no cover
+
+    _hook = get_and_wrap_hook(hook_func, 'post_hook')
+
+    assert _hook.applies_to('regex')
+    assert not _hook.should_run(None)
+    assert _hook.should_run(object())
+
+    @post_hook(sample_rate=2)
+    def hook_func(error):
+        pass  # pragma: no cover
+
+    with pytest.raises(ValueError):
+        get_and_wrap_hook(hook_func, 'post_hook')
@@ -2,9 +2,11 @@ import asyncio
 from pathlib import Path
 
 import pytest
-from mock import patch
+from mock import MagicMock, patch
 
 from cloudbot.plugin import PluginManager
+from cloudbot.util.hook_executor import HookExecutors
+from cloudbot.util.task_registry import TaskRegistry
 
 
 @pytest.fixture()
@@ -160,8 +162,146 @@ def test_plugin_load_disabled(mock_manager, patch_import_module, patch_import_re
     assert mock_manager.get_plugin('plugins/test.py') is None
 
 
+def test_plugin_unload_executors(mock_manager, patch_import_module):
+    patch_import_module.return_value = MockModule()
+    mock_manager.executors = HookExecutors({
+        'pools': {'slow': {'max_workers': 1, 'per_plugin': True}},
+        'plugins': {'test': 'slow'},
+    })
+    loop = mock_manager.bot.loop
+    loop.run_until_complete(mock_manager.load_plugin('plugins/test.py'))
+
+    hook = MagicMock()
+    hook.plugin = mock_manager.get_plugin('plugins/test.py')
+    pool = mock_manager.executors.get_executor(hook)
+    assert pool.name == 'slow:test'
+
+    assert loop.run_until_complete(mock_manager.unload_plugin('plugins/test.py'))
+    assert 'slow:test' not in mock_manager.executors.pools
+    assert pool._executor._shutdown
+
+
 def test_safe_resolve(mock_manager):
     path = mock_manager.safe_resolve(Path("/some/path/that/doesn't/exist"))
     assert str(path) == "/some/path/that/doesn't/exist"
     assert path.is_absolute()
     assert not path.exists()
+
+
+def test_find_hooks_invalid_param():
+    from cloudbot import hook
+    from cloudbot.plugin import find_hooks
+
+    @hook.command('bad')
+    def bad_hook(not_an_arg):
+        pass  # pragma: no cover
+
+    @hook.command('good')
+    def good_hook(text):
+        pass  # pragma: no cover
+
+    module = MockModule()
+    module.bad_hook = bad_hook
+    module.good_hook = good_hook
+
+    parent = MockModule()
+    parent.title = 'test'
+
+    with patch('cloudbot.plugin.logger') as mocked_logger:
+        hooks = find_hooks(parent, module)
+
+    assert [_hook.name for _hook in hooks['command']] == ['good']
+    mocked_logger.error.assert_called_once()
+
+
+def test_sieve_chains(mock_manager):
+    from cloudbot import hook
+    from cloudbot.plugin import find_hooks
+
+    @hook.sieve(priority=2)
+    def all_sieve(bot, event, _hook):
+        return event  # pragma: no cover
+
+    @hook.sieve(priority=1, hook_types=['command', 'regex'])
+    def cmd_sieve(bot, event, _hook):
+        return event  # pragma: no cover
+
+    @hook.sieve(priority=3, hook_types='irc_raw')
+    def raw_sieve(bot, event, _hook):
+        return event  # pragma: no cover
+
+    module = MockModule()
+    module.all_sieve = all_sieve
+    module.cmd_sieve = cmd_sieve
+    module.raw_sieve = raw_sieve
+
+    parent = MockModule()
+    parent.title = 'test'
+
+    sieves = {_hook.function_name: _hook for _hook in find_hooks(parent, module)['sieve']}
+    mock_manager.sieves.extend(sorted(sieves.values(), key=lambda _hook: _hook.priority))
+    mock_manager._update_sieve_chains()
+
+    def names(hook_type):
+        return [sieve.function_name for sieve in mock_manager.get_sieves(hook_type)]
+
+    assert names('command') == ['cmd_sieve', 'all_sieve']
+    assert names('irc_raw') == ['all_sieve', 'raw_sieve']
+    assert names('event') == ['all_sieve']
+    assert names('on_start') == []
+    assert mock_manager.get_sieves('command') is mock_manager.get_sieves('command')
+
+    mock_manager.sieves.remove(sieves['all_sieve'])
+    mock_manager._update_sieve_chains()
+
+    assert names('command') == ['cmd_sieve']
+
+
+def test_post_hook_dispatch(mock_manager):
+    from cloudbot import hook
+    from cloudbot.event import Event
+    from cloudbot.plugin import find_hooks
+
+    called = []
+
+    @hook.post_hook(batch_successes=True)
+    async def batched(launched_hook, error):
+        called.append(('batched', launched_hook.function_name, error is None))
+
+    @hook.post_hook(hook_types=['regex'])
+    async def regex_only(launched_hook):
+        called.append(('regex_only', launched_hook.function_name))
+
+    @hook.command('foo')
+    async def foo():
+        pass  # pragma: no cover
+
+    @hook.regex('bar')
+    async def bar():
+        pass  # pragma: no cover
+
+    module = MockModule()
+    module.batched = batched
+    module.regex_only = regex_only
+    module.foo = foo
+    module.bar = bar
+
+    parent = MockModule()
+    parent.title = 'test'
+    parent.tasks = TaskRegistry()
+
+    hooks = find_hooks(parent, module)
+    mock_manager.hook_hooks['post'].extend(hooks['post_hook'])
+    mock_manager._update_post_hook_chains()
+
+    cmd_hook = hooks['command'][0]
+    regex_hook = hooks['regex'][0]
+    event = Event(bot=mock_manager.bot)
+
+    loop = mock_manager.bot.loop
+    loop.run_until_complete(mock_manager._run_post_hooks(cmd_hook, event, 'result', None))
+    loop.run_until_complete(mock_manager._run_post_hooks(regex_hook, event, 'result', None))
+    loop.run_until_complete(mock_manager._run_post_hooks(cmd_hook, event, None, object()))
+
+    assert called == [('regex_only', 'bar'), ('batched', 'foo', False)]
+    assert mock_manager.hook_results.drain() == [(cmd_hook, None, None), (regex_hook, None, None)]
@@ -0,0 +1,25 @@
+import pytest
+
+from cloudbot.util.casemap import CaseMap, get_casemap
+
+
+@pytest.mark.parametrize('name,text,folded', [
+    ('ascii', 'NiCK[]\\^', 'nick[]\\^'),
+    ('rfc1459', 'NiCK[]\\^', 'nick{}|~'),
+    ('strict-rfc1459', 'NiCK[]\\^', 'nick{}|^'),
+    ('RFC1459', 'ÀB', 'Àb'),
+])
+def test_fold(name, text, folded):
+    assert get_casemap(name).fold(text) == folded
+
+
+def test_unknown_casemap():
+    casemap = CaseMap('rfc7613')
+    assert casemap.name == 'rfc1459'
+    assert casemap.fold('[A]') == '{a}'
+
+
+def test_shared():
+    assert get_casemap() is get_casemap('rfc1459')
+    assert get_casemap('ASCII') is get_casemap('ascii')
+    assert get_casemap('ascii').equals('Foo', 'fOO')
@@ -0,0 +1,35 @@
+import pytest
+
+from cloudbot.util.counter_store import CounterStore
+
+
+def test_counter_store():
+    store = CounterStore(('a', 'b'))
+    store.add(('x', 'y'), 'a')
+    store.add(('x', 'y'), 'a', 4)
+    store.add(('x', 'z'), 'b')
+
+    assert len(store) == 2
+    assert store.get(('x', 'y')) == (5, 0)
+    assert store.get(('missing',)) == (0, 0)
+
+    with pytest.raises(KeyError):
+        store.add(('x', 'y'), 'c')
+
+    items = store.drain()
+    assert items == [(('x', 'y'), (5, 0)), (('x', 'z'), (0, 1))]
+    assert not store
+
+    store.add(('x', 'z'), 'b')
+    store.merge(items)
+    assert store.get(('x', 'z')) == (0, 2)
+    assert store.get(('x', 'y')) == (5, 0)
+
+
+def test_interned_keys():
+    store = CounterStore(('a',))
+    store.add((''.join(['ho', 'ok']), 'net'), 'a')
+    store.add((''.join(['ho', 'ok']), 'other'), 'a')
+
+    (first, _), (second, _) = store.drain()
+    assert first[0] is second[0]
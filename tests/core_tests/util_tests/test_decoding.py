@@ -0,0 +1,136 @@
+import pytest
+
+from cloudbot.util.decoding import (
+    DECODERS, Decoder, FastPathDecoder, MultiCodecDecoder, RememberingDecoder, get_decoder, get_line_keys,
+)
+
+LINES = [
+    b"PING :irc.example.com",
+    ":Foo!a@b PRIVMSG #chan :caf\xe9 ☃".encode('utf-8'),
+    ":Foo!a@b PRIVMSG #chan :caf\xe9".encode('iso-8859-1'),
+    b":Foo!a@b PRIVMSG #chan :\x81\x82\xff",
+]
+
+
+def legacy_decode(bytestring):
+    """
+    The previous `cloudbot.clients.irc.decode`
+    """
+    for codec in ('utf-8', 'iso-8859-1', 'shift_jis', 'cp1252'):
+        try:
+            return bytestring.decode(codec)
+        except UnicodeDecodeError:
+            continue
+    return bytestring.decode('utf-8', errors='ignore')
+
+
+@pytest.mark.parametrize('strategy', sorted(DECODERS))
+def test_matches_legacy_decode(strategy):
+    decoder = get_decoder({'strategy': strategy})
+    for line in LINES:
+        assert decoder.decode(line) == legacy_decode(line)
+
+
+def test_irc_decode():
+    from cloudbot.clients.irc import decode
+    for line in LINES:
+        assert decode(line) == legacy_decode(line)
+
+
+def test_fast_path_stats():
+    decoder = FastPathDecoder()
+    for line in LINES:
+        decoder.decode(line)
+
+    assert dict(decoder.stats) == {
+        'ascii': 1,
+        'utf-8': 1,
+        'fallback:iso-8859-1': 2,
+    }
+
+
+def test_multi_codec_stats():
+    decoder = MultiCodecDecoder(('ascii',))
+    assert decoder.decode(b"caf\xe9") == "caf"
+    assert dict(decoder.stats) == {
+        'utf-8-failed': 1,
+        'ascii-failed': 1,
+        'lossy': 1,
+    }
+
+
+def test_invalid_utf8_sequence():
+    decoder = FastPathDecoder(('cp1252',))
+    # Looks like UTF-8 at first, but isn't
+    assert decoder.decode(b"\xc3\xa9\xe9") == "\xc3\xa9\xe9".encode('latin-1').decode('cp1252')
+    assert decoder.stats['utf-8-failed'] == 1
+    assert decoder.stats['fallback:cp1252'] == 1
+
+
+def test_remembering_decoder():
+    decoder = RememberingDecoder(('shift_jis', 'cp1252'))
+    assert decoder.decode(b":Foo!a@b PRIVMSG #chan :\x80") == ":Foo!a@b PRIVMSG #chan :€"
+    assert decoder.get_codec(b'foo') == 'cp1252'
+    assert decoder.get_codec(b'#chan') == 'cp1252'
+
+    # A different user in the same channel tries the channel's codec first
+    decoder.stats.clear()
+    decoder.decode(b":Bar!a@b PRIVMSG #chan :caf\xe9")
+    assert decoder.stats['remembered:cp1252'] == 1
+    assert 'shift_jis-failed' not in decoder.stats
+
+    decoder.clear()
+    assert decoder.get_codec(b'foo') is None
+
+
+def test_remembering_decoder_lru():
+    decoder = RememberingDecoder(cache_size=2)
+    decoder.set_codec(b'a', 'cp1252')
+    decoder.set_codec(b'b', 'cp1252')
+    assert decoder.get_codec(b'a') == 'cp1252'
+    decoder.set_codec(b'c', 'cp1252')
+
+    assert decoder.get_codec(b'b') is None
+    assert decoder.get_codec(b'a') == 'cp1252'
+    assert decoder.get_codec(b'c') == 'cp1252'
+
+
+@pytest.mark.parametrize('line,keys', [
+    (b":Foo!a@b PRIVMSG #Chan :hi", (b'foo', b'#chan')),
+    (b":irc.example.com 001 Bot :Welcome", (b'irc.example.com', b'bot')),
+    (b":Foo!a@b QUIT :bye", (b'foo', None)),
+    (b"@a=b;c :Foo JOIN #chan", (b'foo', b'#chan')),
+    (b"PING :foo", (None, None)),
+])
+def test_get_line_keys(line, keys):
+    assert get_line_keys(line) == keys
+
+
+def test_get_decoder():
+    decoder = get_decoder({'strategy': 'remember', 'fallbacks': ['cp1252'], 'cache_size': 5})
+    assert isinstance(decoder, RememberingDecoder)
+    assert decoder.fallbacks == ('cp1252',)
+    assert decoder.cache_size == 5
+
+
+def test_get_decoder_unknown_option(caplog):
+    decoder = get_decoder({'strategy': 'fast', 'cache_size': 5, 'foo': 'bar'})
+    assert isinstance(decoder, FastPathDecoder)
+    assert [record.getMessage() for record in caplog.records] == [
+        "Ignoring unknown option 'cache_size' for the 'fast' decoding strategy",
+        "Ignoring unknown option 'foo' for the 'fast' decoding strategy",
+    ]
+
+
+def test_decoder_abstract():
+    with pytest.raises(TypeError):
+        Decoder()
+
+
+def test_get_decoder_unknown(caplog):
+    decoder = get_decoder({'strategy': 'foo', 'cache_size': 5})
+    assert isinstance(decoder, FastPathDecoder)
+    assert [record.getMessage() for record in caplog.records] == [
+        "Unknown decoding strategy 'foo', using 'fast'",
+        "Ignoring unknown option 'cache_size' for the 'fast' decoding strategy",
+    ]
@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from cloudbot.util.framing import LineFramer, WriteCoalescer
+
+
+def test_crlf():
+    framer = LineFramer()
+    assert framer.feed(b"PING :a\r\nPING :b\r\n") == [b"PING :a", b"PING :b"]
+    assert framer.pending == 0
+
+
+def test_bare_lf():
+    framer = LineFramer()
+    assert framer.feed(b"PING :a\nPING :b\r\nPING :c\n") == [b"PING :a", b"PING :b", b"PING :c"]
+
+
+def test_partial_lines():
+    framer = LineFramer()
+    assert framer.feed(b"PRIVMSG #foo :hel") == []
+    assert framer.pending == 17
+    assert framer.feed(b"lo\r") == []
+    assert framer.feed(b"\nPRIVMSG") == [b"PRIVMSG #foo :hello"]
+    assert framer.pending == 7
+
+
+def test_byte_at_a_time():
+    data = b"PING :a\r\nPING :b\nPING :c\r\n"
+    framer = LineFramer()
+    lines = []
+    for i in range(len(data)):
+        lines.extend(framer.feed(data[i:i + 1]))
+
+    assert lines == [b"PING :a", b"PING :b", b"PING :c"]
+
+
+def test_empty_lines():
+    framer = LineFramer()
+    assert framer.feed(b"\r\n\nfoo\r\n") == [b"", b"", b"foo"]
+
+
+@pytest.mark.parametrize('term', [b"\r\n", b"\n"])
+def test_max_length(term):
+    framer = LineFramer(max_line_length=5)
+    assert framer.feed(b"12345" + term + b"123456" + term + b"abc" + term) == [b"12345", b"abc"]
+    assert framer.dropped == 1
+
+
+def test_max_length_partial():
+    framer = LineFramer(max_line_length=5)
+    assert framer.feed(b"1234567") == []
+    assert framer.pending == 0
+    assert framer.dropped == 1
+    assert framer.feed(b"89") == []
+    assert framer.feed(b"0\r\nabc\r\n") == [b"abc"]
+    assert framer.dropped == 1
+
+
+def test_max_length_split_crlf():
+    framer = LineFramer(max_line_length=5)
+    assert framer.feed(b"12345\r") == []
+    assert framer.feed(b"\n") == [b"12345"]
+    assert framer.dropped == 0
+
+
+def test_clear():
+    framer = LineFramer()
+    framer.feed(b"abc")
+    framer.clear()
+    assert framer.pending == 0
+    assert framer.feed(b"def\r\n") == [b"def"]
+
+
+def test_write_coalescer_delay():
+    loop = asyncio.new_event_loop()
+    writes = []
+    coalescer = WriteCoalescer(writes.append, loop, max_delay=0.05)
+    try:
+        # A burst is flushed in the next iteration of the loop
+        coalescer.write(b"a\r\n")
+        loop.run_until_complete(asyncio.sleep(0))
+        assert writes == [b"a\r\n"]
+
+        # Data that keeps coming is held until max_delay after the last flush
+        coalescer.write(b"b\r\n")
+        loop.run_until_complete(asyncio.sleep(0))
+        coalescer.write(b"c\r\n")
+        loop.run_until_complete(asyncio.sleep(0))
+        assert writes == [b"a\r\n"]
+        assert coalescer.pending == 6
+
+        loop.run_until_complete(asyncio.sleep(0.1))
+        assert writes == [b"a\r\n", b"b\r\nc\r\n"]
+        assert coalescer.pending == 0
+
+        # Once the stream stops, the next burst is flushed right away again
+        loop.run_until_complete(asyncio.sleep(0.1))
+        coalescer.write(b"d\r\n")
+        loop.run_until_complete(asyncio.sleep(0))
+        assert writes[-1] == b"d\r\n"
+    finally:
+        loop.close()
+
+
+def test_write_coalescer_large():
+    loop = asyncio.new_event_loop()
+    writes = []
+    coalescer = WriteCoalescer(writes.append, loop, max_size=4)
+    try:
+        coalescer.write(b"ab")
+        coalescer.write(b"abcdef")
+        assert writes == [b"ab", b"abcdef"]
+
+        coalescer.write(b"a")
+        coalescer.clear()
+        loop.run_until_complete(asyncio.sleep(0))
+        assert writes == [b"ab", b"abcdef"]
+        assert (coalescer.writes, coalescer.lines) == (2, 3)
+    finally:
+        loop.close()
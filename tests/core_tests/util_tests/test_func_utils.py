@@ -14,3 +14,44 @@ def test_call_with_args():
 
     with pytest.raises(ParameterError):
         call_with_args(func, {})
+
+
+def test_arg_binder():
+    from types import SimpleNamespace
+    from cloudbot.util.func_utils import ArgBinder, ParameterError
+
+    def func(a, b, _c=None):
+        pass  # pragma: no cover
+
+    binder = ArgBinder(func)
+    assert binder.arg_names == ('a', 'b')
+    assert binder.bind({'a': 1, 'b': 2, 'c': 3}) == (1, 2)
+    assert binder.bind_attrs(SimpleNamespace(a=1, b=2)) == (1, 2)
+
+    with pytest.raises(ParameterError) as exc:
+        binder.bind_attrs(SimpleNamespace(a=1))
+
+    assert exc.value.name == 'b'
+
+    binder.validate({'a', 'b', 'c'})
+    with pytest.raises(ParameterError):
+        binder.validate({'a'})
+
+
+@pytest.mark.parametrize('func,args', [
+    (lambda: None, ()),
+    (lambda a: None, (1,)),
+    (lambda a, b: None, (1, 2)),
+])
+def test_arg_binder_arg_count(func, args):
+    from cloudbot.util.func_utils import ArgBinder
+    assert ArgBinder(func).bind({'a': 1, 'b': 2}) == args
+
+
+def test_get_binder_cached():
+    from cloudbot.util.func_utils import get_binder
+
+    def func(a):
+        pass  # pragma: no cover
+
+    assert get_binder(func) is get_binder(func)
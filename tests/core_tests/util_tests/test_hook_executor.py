@@ -0,0 +1,153 @@
+import asyncio
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from cloudbot.util.hook_executor import BoundedExecutor, ExecutorFullError, HookExecutors, HookMetrics
+
+
+def make_hook(plugin='test', hook_type='command', name='func'):
+    hook = MagicMock()
+    hook.plugin.title = plugin
+    hook.type = hook_type
+    hook.description = '{}:{}'.format(plugin, name)
+    return hook
+
+
+def test_invalid_policy():
+    with pytest.raises(ValueError):
+        BoundedExecutor('test', policy='foo')
+
+    with pytest.raises(ValueError):
+        HookExecutors({'pools': {'test': {'policy': 'foo'}}})
+
+
+def test_run():
+    loop = asyncio.get_event_loop()
+    executor = BoundedExecutor('test', max_workers=1)
+    metrics = HookMetrics()
+
+    assert loop.run_until_complete(executor.run(threading.current_thread)) is not threading.current_thread()
+    assert loop.run_until_complete(executor.run(lambda a, b: a + b, 1, 2, metrics=metrics)) == 3
+    assert metrics.count == 1
+    assert executor.pending == 0
+
+    executor.shutdown()
+
+
+def test_run_error():
+    loop = asyncio.get_event_loop()
+    executor = BoundedExecutor('test', max_workers=1, max_queue=0)
+    metrics = HookMetrics()
+
+    def func():
+        raise ValueError()
+
+    with pytest.raises(ValueError):
+        loop.run_until_complete(executor.run(func, metrics=metrics))
+
+    assert metrics.count == 1
+    assert executor.pending == 0
+    # The slot was released
+    assert loop.run_until_complete(executor.run(int)) == 0
+
+    executor.shutdown()
+
+
+def _run_blocked(executor, count, metrics=None):
+    loop = asyncio.get_event_loop()
+    event = threading.Event()
+
+    async def _run():
+        tasks = [asyncio.ensure_future(executor.run(event.wait, 5, metrics=metrics)) for _ in range(count)]
+        await asyncio.sleep(0.05)
+        event.set()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    return loop.run_until_complete(_run())
+
+
+def test_reject():
+    executor = BoundedExecutor('test', max_workers=1, max_queue=1, policy='reject')
+    metrics = HookMetrics()
+    results = _run_blocked(executor, 4, metrics)
+
+    assert results[:2] == [True, True]
+    assert all(isinstance(result, ExecutorFullError) for result in results[2:])
+    assert executor.rejected == 2
+    assert metrics.rejected == 2
+    assert metrics.count == 2
+
+    executor.shutdown()
+
+
+def test_wait():
+    executor = BoundedExecutor('test', max_workers=1, max_queue=1, policy='wait')
+    metrics = HookMetrics()
+
+    assert _run_blocked(executor, 4, metrics) == [True] * 4
+    assert executor.rejected == 0
+    assert metrics.count == 4
+    assert metrics.wait_max > 0
+
+    executor.shutdown()
+
+
+def test_pool_assignment():
+    executors = HookExecutors({
+        'pools': {
+            'slow': {'max_workers': 1, 'per_plugin': True},
+            'sieves': {'max_workers': 2},
+        },
+        'plugins': {'slow_plugin': 'slow', 'other_slow': 'slow', 'broken': 'missing'},
+        'hook_types': {'sieve': 'sieves'},
+    })
+
+    assert executors.get_pool_name(make_hook()) == 'default'
+    assert executors.get_pool_name(make_hook(hook_type='sieve')) == 'sieves'
+    assert executors.get_pool_name(make_hook('slow_plugin', 'sieve')) == 'slow:slow_plugin'
+    assert executors.get_pool_name(make_hook('broken')) == 'default'
+
+    slow = executors.get_executor(make_hook('slow_plugin'))
+    assert slow.max_workers == 1
+    assert executors.get_executor(make_hook('slow_plugin', name='other')) is slow
+    assert executors.get_executor(make_hook('other_slow')) is not slow
+
+    executors.shutdown()
+    assert not executors.pools
+
+
+def test_shutdown_plugin():
+    executors = HookExecutors({
+        'pools': {'slow': {'max_workers': 1, 'per_plugin': True}},
+        'plugins': {'slow_plugin': 'slow', 'other_slow': 'slow'},
+    })
+
+    default = executors.get_executor(make_hook())
+    slow = executors.get_executor(make_hook('slow_plugin'))
+    other = executors.get_executor(make_hook('other_slow'))
+    assert default.name == 'default'
+
+    executors.shutdown_plugin('slow_plugin')
+    assert sorted(executors.pools) == ['default', 'slow:other_slow']
+    assert executors.pools['default'] is default
+    assert slow._executor._shutdown
+    assert not other._executor._shutdown
+
+    # The pool is created again if the plugin is reloaded
+    assert executors.get_executor(make_hook('slow_plugin')) is not slow
+
+    executors.shutdown()
+
+
+def test_hook_metrics():
+    loop = asyncio.get_event_loop()
+    executors = HookExecutors()
+    hook = make_hook()
+
+    assert loop.run_until_complete(executors.run(hook, int, '5')) == 5
+    assert executors.metrics[hook.description].count == 1
+    assert executors.get_metrics(hook) is executors.metrics[hook.description]
+
+    executors.shutdown()
@@ -0,0 +1,62 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from cloudbot.util.latency import BUCKET_COUNT, Histogram, LatencyTracker, _bucket_bounds, _bucket_index
+
+
+def make_hook(name):
+    hook = MagicMock()
+    hook.description = name
+    return hook
+
+
+def test_buckets_contiguous():
+    prev_high = -1
+    for index in range(BUCKET_COUNT):
+        low, high = _bucket_bounds(index)
+        assert low == prev_high + 1
+        assert _bucket_index(low) == index
+        assert _bucket_index(high) == index
+        prev_high = high
+
+
+@pytest.mark.parametrize('value', [0.000001, 0.0005, 0.02, 1.5, 30, 600])
+def test_relative_error(value):
+    hist = Histogram()
+    hist.record(value / 2)
+    hist.record(value)
+    hist.record(value * 2)
+
+    assert hist.percentile(50) == pytest.approx(value, rel=1 / 16)
+
+
+def test_empty_and_overflow():
+    hist = Histogram()
+    assert hist.percentile(99) == 0.0
+    assert hist.snapshot()['count'] == 0
+
+    hist.record(10 ** 6)
+    hist.record(-1)
+    assert hist.max == 10 ** 6
+    assert hist.min == 0.0
+    assert hist.percentile(100) == 10 ** 6
+
+
+def test_tracker():
+    tracker = LatencyTracker()
+    fast = make_hook('test:fast')
+    slow = make_hook('test:slow')
+
+    tracker.get(fast).run.record(0.001)
+    tracker.get(slow).record(0.5, 2.0)
+    tracker.get(slow).sieve.record(0.01)
+
+    assert tracker.get(fast) is tracker.hooks['test:fast']
+    assert [name for name, _ in tracker.slowest()] == ['test:slow', 'test:fast']
+    assert [name for name, _ in tracker.slowest('wait')] == ['test:slow']
+
+    snapshot = json.loads(json.dumps(tracker.snapshot()))
+    assert sorted(snapshot['test:slow']) == ['run', 'sieve', 'wait']
+    assert snapshot['test:fast']['run']['count'] == 1
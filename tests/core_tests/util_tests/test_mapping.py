@@ -77,3 +77,73 @@ class TestKeyFoldDict:
         assert data['SEA'] == 3
         assert data['SeA'] == 3
         assert data['Sea'] == 3
+
+
+class TestPrefixDict:
+    @staticmethod
+    def test_startswith():
+        from cloudbot.util.mapping import PrefixDict
+        data = PrefixDict()
+        for key in ('help', 'hello', 'he', 'h', 'hi', 'foo', 'hz', 'i'):
+            data[key] = key.upper()
+
+        assert data.startswith('he') == [('he', 'HE'), ('hello', 'HELLO'), ('help', 'HELP')]
+        assert data.startswith('hel') == [('hello', 'HELLO'), ('help', 'HELP')]
+        assert [k for k, _ in data.startswith('h')] == ['h', 'he', 'hello', 'help', 'hi', 'hz']
+        assert data.startswith('x') == []
+        assert len(data.startswith('')) == len(data)
+
+    @staticmethod
+    def test_index_updates():
+        from cloudbot.util.mapping import PrefixDict
+        data = PrefixDict([('foo', 1), ('foobar', 2)])
+        data['foo'] = 3
+        assert data.startswith('foo') == [('foo', 3), ('foobar', 2)]
+
+        del data['foo']
+        assert data.startswith('foo') == [('foobar', 2)]
+
+        assert data.pop('foobar') == 2
+        assert data.pop('foobar', None) is None
+        assert data.startswith('foo') == []
+
+        data.setdefault('fob', 4)
+        data.update({'fo': 5}, fa=6)
+        assert data.startswith('fo') == [('fo', 5), ('fob', 4)]
+
+        copy = data.copy()
+        data.clear()
+        assert data.startswith('') == []
+        assert copy.startswith('f') == [('fa', 6), ('fo', 5), ('fob', 4)]
+
+        key, _ = copy.popitem()
+        assert key not in dict(copy.startswith(''))
+
+
+class TestCaseMapDict:
+    @staticmethod
+    def test_casemapping():
+        from cloudbot.util.mapping import CaseMapDict
+        data = CaseMapDict({'Nick[a]': 1}, other=2)
+
+        assert data['nick{A}'] == 1
+        assert data.get('OTHER') == 2
+        assert 'nick[a]' in data
+        assert data.setdefault('Other', 3) == 2
+        assert data.pop('NICK{a}') == 1
+        assert data.pop('nick{a}', None) is None
+        assert list(data) == ['other']
+
+    @staticmethod
+    def test_set_casemap():
+        from cloudbot.util.mapping import CaseMapDict
+        data = CaseMapDict(casemap='ascii')
+        data['Nick[a]'] = 1
+        data['Nick^'] = 2
+
+        assert 'nick{a}' not in data
+
+        data.set_casemap('rfc1459')
+        assert data['nick{a}'] == 1
+        assert data['nick~'] == 2
+        assert sorted(data) == ['nick{a}', 'nick~']
@@ -0,0 +1,56 @@
+import random
+
+import pytest
+from irclib.util.compare import match_mask
+
+from cloudbot.util.mask_index import MaskIndex
+
+MASKS = [
+    'nick!user@host', 'nick!user@host.example.com', 'other!~ident@10.0.0.1', 'a!b@c', 'nick!user@hostxexample.com',
+    'weird[nick]!(user)@host+name', '',
+]
+
+
+@pytest.mark.parametrize('pattern', [
+    '*', 'nick!user@host', '*!*@host', '*!user@*', 'nick!*@host.example.com', '*!*@host?example.com',
+    '*!~ident@10.0.0.?', 'weird[nick]!(user)@host+name', 'a!b@?', '*!*@*.example.com', 'nope',
+])
+def test_match_parity(pattern):
+    index = MaskIndex([pattern])
+    for mask in MASKS:
+        assert index.match(mask) == match_mask(mask, pattern), mask
+
+
+def test_random_parity():
+    rand = random.Random(0)
+    chars = 'ab!@.*?'
+    patterns = [''.join(rand.choice(chars) for _ in range(rand.randint(1, 6))) for _ in range(50)]
+    masks = [''.join(rand.choice('ab!@.') for _ in range(rand.randint(0, 6))) for _ in range(200)]
+    index = MaskIndex(patterns)
+    for mask in masks:
+        expected = sorted(set(pattern for pattern in patterns if match_mask(mask, pattern)))
+        assert index.match(mask) == bool(expected)
+        assert sorted(index.matching(mask)) == expected
+
+
+def test_update():
+    index = MaskIndex()
+    assert not index.match('nick!user@host')
+    assert not index.matching('nick!user@host')
+
+    index.add('*!*@host')
+    index.add('nick!user@host')
+    assert len(index) == 2
+    assert '*!*@host' in index
+    assert index.matching('nick!user@host') == ['nick!user@host', '*!*@host']
+
+    index.discard('*!*@host')
+    assert not index.match('other!user@host')
+    assert index.match('nick!user@host')
+
+    index.discard('nick!user@host')
+    assert not index
+
+    index.add('a!b@c')
+    index.clear()
+    assert not index.match('a!b@c')
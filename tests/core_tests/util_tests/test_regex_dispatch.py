@@ -0,0 +1,99 @@
+import re
+import string
+
+import pytest
+
+from cloudbot.util.regex_dispatch import RegexDispatcher, fold, required_literal
+
+PATTERNS = [
+    (r"youtube\.com/watch\?v=([\w-]+)", 0),
+    (r"(?:https?://)?(?:www\.)?twitter\.com/(\w+)/status/(\d+)", re.I),
+    (r"\br/(\w+)", re.I),
+    (r"^\s*s/(.+?)/(.*?)/?$", 0),
+    (r"(?i)github\.com/([^/]+)/([^/\s]+)", 0),
+    (r"(?i:KITTEN)s?", 0),
+    (r"colou?r", 0),
+    (r"(foo|foobar)baz", 0),
+    (r"\bsik\b", re.I),
+    (r"straße", re.I),
+    (r"a{2,}b", 0),
+    (r".", 0),
+]
+
+CONTENTS = [
+    "check out https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+    "HTTPS://TWITTER.COM/foo/status/123",
+    "see R/python",
+    "s/foo/bar/",
+    "GitHub.com/snoonetIRC/CloudBot",
+    "kittens!",
+    "KITTENS!",
+    "color colour",
+    "foobarbaz",
+    "ſik",
+    "SIK",
+    "İK",
+    "STRASSE",
+    "STRAẞE",
+    "aaab",
+    "",
+    "nothing to see here",
+]
+
+
+@pytest.mark.parametrize('pattern,flags,expected', [
+    (r"youtube\.com/watch\?v=(\w+)", 0, ('youtube.com/watch?v=', False)),
+    (r"Foo(Bar)baz", 0, ('FooBarbaz', False)),
+    (r"Foo(Bar)+baz", 0, ('Foo', False)),
+    (r"Foo(Bar)baz", re.I, ('foobarbaz', True)),
+    (r"(?i)Foo", 0, ('foo', True)),
+    (r"(?i:Foo)bar", 0, ('bar', False)),
+    (r"foo|bar", 0, None),
+    (r"a", 0, None),
+    (r"straße", re.I, ('stra', True)),
+    (r"straße", 0, ('straße', False)),
+    (r"a(?:b(c|d)e)f", 0, ('ab', False)),
+    (r"ab(?:cd(e|f)ghi)", 0, ('abcd', False)),
+    (r"ab(?:c(e|f)ghij)", 0, ('ghij', False)),
+])
+def test_required_literal(pattern, flags, expected):
+    assert required_literal(re.compile(pattern, flags)) == expected
+
+
+def test_required_literal_bytes():
+    assert required_literal(re.compile(b"foobar")) is None
+
+
+def test_fold_matches_ignorecase():
+    # Every character re.IGNORECASE considers equal to an ASCII letter must fold to contain that letter
+    text = ''.join(chr(i) for i in range(0x10000) if not 0xD800 <= i < 0xE000)
+    for letter in string.ascii_lowercase:
+        for match in re.finditer(letter, text, re.I):
+            assert fold(match.group()) == letter
+
+    # Folding must keep matched characters next to each other
+    for pattern, content in (('ix', '\u0130x'), ('xi', 'x\u0130'), ('six', '\u017f\u0130X')):
+        regex = re.compile(pattern, re.I)
+        assert regex.search(content)
+        assert required_literal(regex) == (pattern, True)
+        assert [hook for _, hook in RegexDispatcher([(regex, 'a')]).candidates(content)] == ['a']
+
+
+def test_dispatch_matches_search():
+    regex_hooks = [(re.compile(pattern, flags), i) for i, (pattern, flags) in enumerate(PATTERNS)]
+    dispatcher = RegexDispatcher(regex_hooks)
+    assert dispatcher.filtered_count == len(PATTERNS) - 3
+
+    for content in CONTENTS:
+        candidates = dispatcher.candidates(content)
+        expected = [pair for pair in regex_hooks if pair[0].search(content)]
+        assert [pair for pair in candidates if pair[0].search(content)] == expected
+        # Order is preserved
+        assert candidates == [pair for pair in regex_hooks if pair in candidates]
+
+
+def test_dispatch_disabled():
+    regex_hooks = [(re.compile(pattern, flags), i) for i, (pattern, flags) in enumerate(PATTERNS)]
+    dispatcher = RegexDispatcher(regex_hooks, enabled=False)
+    assert dispatcher.filtered_count == 0
+    assert dispatcher.candidates("") == regex_hooks
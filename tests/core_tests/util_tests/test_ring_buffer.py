@@ -0,0 +1,21 @@
+import pytest
+
+from cloudbot.util.ring_buffer import RingBuffer
+
+
+def test_ring_buffer():
+    buffer = RingBuffer(3)
+    for i in range(5):
+        buffer.append(i)
+
+    assert len(buffer) == 3
+    assert buffer.dropped == 2
+    assert buffer.drain(2) == [2, 3]
+    assert buffer.drain() == [4]
+    assert buffer.drain() == []
+    assert not buffer
+
+
+def test_invalid_size():
+    with pytest.raises(ValueError):
+        RingBuffer(0)
@@ -0,0 +1,110 @@
+import pytest
+
+from cloudbot.util.send_queue import ADMIN, NORMAL, URGENT, OutboundQueue, get_line_info
+
+
+def drain(queue):
+    return [queue.pop()[0] for _ in range(len(queue))]
+
+
+def test_line_info():
+    assert get_line_info("@tag=1 :nick!user@host NOTICE Nick :hi") == ('NOTICE', 'nick')
+    assert get_line_info("") == ('', None)
+
+
+def test_classify():
+    queue = OutboundQueue(admin_targets=['#Admin', None])
+    assert queue.classify("PONG :irc.example.com") == (URGENT, ':irc.example.com')
+    assert queue.classify("CAP REQ :sasl") == (URGENT, 'req')
+    assert queue.classify("PRIVMSG #admin :log") == (ADMIN, '#admin')
+    assert queue.classify("JOIN #chan") == (NORMAL, '#chan')
+
+
+def test_priority_order():
+    queue = OutboundQueue(admin_targets=['#admin'])
+    queue.push("PRIVMSG #chan :normal")
+    queue.push("PRIVMSG #admin :admin")
+    queue.push("CAP END")
+    assert queue.depths == {'urgent': 1, 'admin': 1, 'normal': 1}
+    assert queue.peek_priority() == URGENT
+    assert drain(queue) == ["CAP END", "PRIVMSG #admin :admin", "PRIVMSG #chan :normal"]
+    assert queue.peek_priority() is None
+
+
+def test_target_fairness():
+    queue = OutboundQueue()
+    for i in range(3):
+        queue.push("PRIVMSG #flood :{}".format(i))
+
+    queue.push("PRIVMSG #quiet :hello")
+    queue.push("PRIVMSG #Quiet :again")
+    assert drain(queue) == [
+        "PRIVMSG #flood :0",
+        "PRIVMSG #quiet :hello",
+        "PRIVMSG #flood :1",
+        "PRIVMSG #Quiet :again",
+        "PRIVMSG #flood :2",
+    ]
+
+
+def test_coalesce():
+    queue = OutboundQueue()
+    assert queue.push("JOIN #chan", 'a')
+    assert not queue.push("JOIN #chan", 'b')
+    assert len(queue) == 1
+    assert queue.coalesced == 1
+    assert queue.pop() == ("JOIN #chan", 'a')
+
+    # Once sent, the same line may be queued again
+    assert queue.push("JOIN #chan")
+    assert queue.pushed == 2
+
+
+def test_coalesce_last_only():
+    # A line is only dropped if it repeats the last queued line for its target
+    queue = OutboundQueue()
+    for line in ("JOIN #a", "PART #a", "JOIN #a", "MODE #c +o x", "MODE #c -o x", "MODE #c +o x", "MODE #c +o x"):
+        queue.push(line)
+
+    assert drain(queue) == [
+        "JOIN #a", "MODE #c +o x", "PART #a", "MODE #c -o x", "JOIN #a", "MODE #c +o x",
+    ]
+    assert queue.coalesced == 1
+
+
+def test_coalesce_messages():
+    # Identical messages may be replies to different users, so they are all sent
+    queue = OutboundQueue()
+    assert queue.push("PRIVMSG #chan :spam")
+    assert queue.push("PRIVMSG #chan :spam")
+    assert len(queue) == 2
+    assert queue.coalesced == 0
+
+
+def test_no_coalesce():
+    queue = OutboundQueue(coalesce=False)
+    queue.push("MODE #chan")
+    queue.push("MODE #chan")
+    assert len(queue) == 2
+    assert queue.coalesced == 0
+
+
+def test_explicit_priority():
+    queue = OutboundQueue()
+    queue.push("PRIVMSG #chan :first")
+    queue.push("PRIVMSG #chan :second", priority=ADMIN)
+    assert drain(queue) == ["PRIVMSG #chan :second", "PRIVMSG #chan :first"]
+
+
+def test_clear():
+    queue = OutboundQueue()
+    for i in range(4):
+        queue.push("PRIVMSG #chan :{}".format(i))
+
+    assert queue.max_depth == 4
+    assert queue.clear() == 4
+    assert not queue
+    assert queue.push("PRIVMSG #chan :0")
+
+    with pytest.raises(IndexError):
+        OutboundQueue().pop()
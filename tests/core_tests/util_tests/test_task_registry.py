@@ -0,0 +1,35 @@
+import asyncio
+
+from cloudbot.util.task_registry import TaskRegistry
+
+
+def test_registry():
+    loop = asyncio.get_event_loop()
+    registry = TaskRegistry()
+
+    async def _run():
+        done = registry.add(asyncio.ensure_future(asyncio.sleep(0)))
+        pending = registry.add(asyncio.ensure_future(asyncio.sleep(10)))
+        failed = registry.add(asyncio.ensure_future(asyncio.sleep('a')))
+
+        assert len(registry) == 3
+        assert done in registry
+        assert set(registry) == {done, pending, failed}
+
+        await asyncio.wait([done, failed])
+        assert isinstance(failed.exception(), TypeError)
+        await asyncio.sleep(0)
+
+        assert list(registry) == [pending]
+        assert registry.in_flight == 1
+
+        assert registry.cancel_all() == 1
+        await asyncio.wait([pending])
+        await asyncio.sleep(0)
+
+    loop.run_until_complete(_run())
+
+    assert not registry
+    assert registry.started == 3
+    assert registry.completed == 2
+    assert registry.cancelled == 1
@@ -1,4 +1,6 @@
 import asyncio
+import sys
+from threading import Thread
 
 from irclib.parser import Message, Prefix
 from mock import MagicMock
@@ -20,6 +22,7 @@ class MockConn:
         }
         self.nick = 'BotFoo'
         self.bot = bot
+        self.loop = MagicMock()
 
     def get_statuses(self, chars):
         return [
@@ -174,6 +177,9 @@ def test_names_handling():
             'irc_command': line.command,
             'chan': None,
             'target': None,
+            'folded_nick': None,
+            'folded_chan': None,
+            'casemap': None,
         }
 
         if line.command in chan_pos:
@@ -183,3 +189,244 @@ def test_names_handling():
             data['target'] = line.parameters[1]
 
         call_with_args(handlers[line.command], data)
+
+
+def test_names_removes_stale_members():
+    from plugins.chan_track import get_chans, on_join, on_names
+    from plugins.core.server_info import handle_prefixes
+
+    conn = MockConn()
+    handle_prefixes('(ov)@+', conn.memory['server_info'])
+    chan = get_chans(conn).getchan('#foo')
+    on_join('Stays', 'user', 'host', conn, ['#foo'])
+    on_join('Leaves', 'user', 'host', conn, ['#foo'])
+
+    on_names(conn, ['BotFoo', '=', '#foo', '@Stays!user@host +New!user@host'], '353')
+    on_names(conn, ['BotFoo', '#foo', 'End of /NAMES list'], '366')
+
+    assert sorted(chan.users) == ['new', 'stays']
+    assert chan.users['stays'].status == conn.get_statuses('@')
+
+
+class MockWhoxConn(MockConn):
+    def __init__(self):
+        super().__init__()
+        self.config = {'chan_sync_limit': 2}
+        self.channels = ['#a', '#b', '#c']
+        self.memory['server_info']['isupport_tokens'] = {'WHOX': None}
+        self.send = MagicMock()
+        self.cmd = MagicMock()
+
+
+def test_whox_sync():
+    from plugins.chan_track import get_chans, get_sync, get_users, on_join, on_who_end, on_whox, update_conn_data
+    from plugins.core.server_info import handle_prefixes
+
+    conn = MockWhoxConn()
+    handle_prefixes('(ov)@+', conn.memory['server_info'])
+    for chan in conn.channels:
+        on_join('OldUser', 'user', 'host', conn, [chan])
+
+    sync = get_sync(conn)
+    update_conn_data(conn)
+
+    assert conn.send.call_count == 2
+    assert len(sync.in_flight) == 2
+    assert not conn.cmd.called
+
+    chan = sorted(sync.in_flight)[0]
+    on_whox(conn, ['BotFoo', '774', chan, 'ident', 'host', 'Nick1', 'G*@', 'acct', 'Real Name'])
+    on_whox(conn, ['BotFoo', '774', chan, 'ident2', 'host2', 'Nick2', 'H', '0', 'Other'])
+    # Replies to someone else's WHOX are ignored
+    on_whox(conn, ['BotFoo', '1', chan, 'ident3', 'host3', 'Nick3', 'H', '0', 'Other'])
+    on_who_end(conn, ['BotFoo', chan, 'End of /WHO list.'])
+
+    chan_data = get_chans(conn)[chan]
+    assert sorted(chan_data.users) == ['nick1', 'nick2']
+    assert chan_data.users['nick1'].status == conn.get_statuses('@')
+
+    users = get_users(conn)
+    assert users['nick1'].account == 'acct'
+    assert users['nick1'].realname == 'Real Name'
+    assert users['nick1'].is_away
+    assert users['nick1'].is_oper
+    assert users['nick2'].account is None
+    assert users['nick2'].mask == Prefix('Nick2', 'ident2', 'host2')
+
+    assert chan in sync.times
+    assert conn.send.call_count == 3
+    assert len(sync.in_flight) == 2
+    assert not sync.queue
+
+
+def test_sync_timeout():
+    from plugins.chan_track import get_sync, update_conn_data
+
+    conn = MockWhoxConn()
+    sync = get_sync(conn)
+    update_conn_data(conn)
+    assert len(sync.in_flight) == 2
+    assert len(sync.queue) == 1
+
+    # The timeout check is scheduled on the event loop when the requests are sent
+    conn.loop.call_soon_threadsafe.assert_called_once_with(conn.loop.call_later, sync.TIMEOUT, sync._on_timeout)
+
+    # Neither request gets a reply
+    for chan, (started, method) in list(sync.in_flight.items()):
+        sync.in_flight[chan] = (started - sync.TIMEOUT, method)
+
+    sync._on_timeout()
+    assert len(sync.in_flight) == 1
+    assert not sync.queue
+    assert conn.send.call_count == 3
+    assert conn.loop.call_soon_threadsafe.call_count == 2
+
+
+def test_sync_threads():
+    from plugins.chan_track import get_sync
+
+    conn = MockWhoxConn()
+    sync = get_sync(conn)
+    sent = []
+
+    def send(line):
+        assert len(sync.in_flight) <= sync.max_in_flight
+        sent.append(line.split()[1])
+
+    conn.send = send
+    errors = []
+
+    def worker(n):
+        try:
+            for i in range(200):
+                sync.request('#{}-{}'.format(n, i))
+                for chan, (_, method) in list(sync.in_flight.items()):
+                    sync.complete(chan, method)
+        except Exception as e:  # pragma: no cover
+            errors.append(e)
+
+    threads = [Thread(target=worker, args=(n,)) for n in range(8)]
+    # Switch threads as often as possible, to interleave the sync updates
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+
+    assert not errors
+    while sync.in_flight:
+        for chan, (_, method) in list(sync.in_flight.items()):
+            sync.complete(chan, method)
+
+    assert sorted(sent) == sorted('#{}-{}'.format(n, i) for n in range(8) for i in range(200))
+
+
+def test_member_status_mask():
+    from plugins.chan_track import get_chans, get_users, on_join, on_mode, perm_check
+    from plugins.core.server_info import handle_prefixes, handle_chan_modes
+
+    conn = MockConn()
+    serv_info = conn.memory['server_info']
+    handle_prefixes('(ohv)@%+', serv_info)
+    handle_chan_modes('b,k,l,imnpst', serv_info)
+    on_join('Nick', 'user', 'host', conn, ['#foo'])
+
+    memb = get_chans(conn)['#foo'].users['nick']
+    assert memb.level == 0
+    assert not perm_check('#foo', conn, 'nick')
+
+    on_mode('#foo', ['#foo', '+vo', 'Nick', 'Nick'], conn)
+    assert memb.status == conn.get_statuses('@+')
+    assert memb.mask == 0b1010
+    assert perm_check('#foo', conn, 'nick')
+
+    on_mode('#foo', ['#foo', '-o', 'Nick'], conn)
+    assert memb.status == conn.get_statuses('+')
+    assert not perm_check('#foo', conn, 'nick')
+
+    user = get_users(conn)['nick']
+    assert user.mask == Prefix('Nick', 'user', 'host')
+    assert "*!*@{host}".format_map(user) == '*!*@host'
+    assert [chan.name for chan in user.channels] == ['#foo']
+
+
+def test_users_pruned():
+    from plugins.chan_track import get_chans, get_users, on_join, on_nick, on_part, on_quit
+    from plugins.core.server_info import handle_prefixes
+
+    conn = MockConn()
+    handle_prefixes('(ov)@+', conn.memory['server_info'])
+    users = get_users(conn)
+    chans = get_chans(conn)
+    on_join('Nick', 'user', 'host', conn, ['#foo'])
+    on_join('Nick', 'user', 'host', conn, ['#bar'])
+    on_join('Other', 'user', 'host', conn, ['#bar'])
+
+    uid = users['nick'].uid
+    on_nick('Nick', ['NewNick'], conn)
+    assert 'nick' not in users
+    assert users['newnick'].uid == uid
+    assert sorted(chans['#bar'].users) == ['newnick', 'other']
+
+    on_part('#foo', 'NewNick', conn)
+    assert 'newnick' in users
+    on_part('#bar', 'NewNick', conn)
+    assert 'newnick' not in users
+    assert uid not in users.by_id
+
+    on_quit('Other', conn)
+    assert not users
+    assert not chans['#bar'].users
+
+
+def test_casemapping():
+    from plugins.chan_track import get_chans, get_users, on_isupport, on_join, on_nick
+    from plugins.core.server_info import handle_prefixes
+
+    conn = MockConn()
+    handle_prefixes('(ov)@+', conn.memory['server_info'])
+    on_join('Nick[a]', 'user', 'host', conn, ['#Chan[1]'])
+
+    users = get_users(conn)
+    chans = get_chans(conn)
+    assert 'nick{a}' in users
+    assert 'nick{a}' in chans['#chan{1}'].users
+
+    on_isupport(conn, ['BotFoo', 'CASEMAPPING=strict-rfc1459', 'are supported by this server'])
+    assert users.casemap.name == 'strict-rfc1459'
+
+    on_nick('nick{a}', ['Nick^'], conn)
+    assert 'nick^' in users
+    assert 'nick~' not in users
+    assert list(chans['#CHAN[1]'].users) == ['nick^']
+
+
+def test_folded_args():
+    from plugins.chan_track import get_chans, get_users, on_join, on_kick, on_quit
+    from plugins.core.server_info import handle_prefixes
+    from cloudbot.util.casemap import ASCII, get_casemap
+
+    conn = MockConn()
+    handle_prefixes('(ov)@+', conn.memory['server_info'])
+    users = get_users(conn)
+    chans = get_chans(conn)
+
+    # The event's folded identifiers are used as keys when they were folded with the same case mapping
+    on_join('Nick[a]', 'user', 'host', conn, ['#Chan[1]'], 'nick{a}', '#chan{1}', users.casemap)
+    assert list(chans['#chan{1}'].users) == ['nick{a}']
+
+    # and folded again when they weren't
+    on_join('Other[b]', 'user', 'host', conn, ['#Chan[1]'], 'other[b]', '#chan[1]', get_casemap(ASCII))
+    assert sorted(chans['#chan{1}'].users) == ['nick{a}', 'other{b}']
+
+    on_kick('#Chan[1]', 'Other[b]', conn, '#chan{1}', users.casemap)
+    assert list(chans['#chan{1}'].users) == ['nick{a}']
+
+    on_quit('Nick[a]', conn, 'nick{a}', users.casemap)
+    assert not users
+    assert not chans['#chan{1}'].users
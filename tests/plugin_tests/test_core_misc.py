@@ -0,0 +1,21 @@
+import asyncio
+
+from mock import MagicMock
+
+
+def test_do_joins():
+    from plugins.core import core_misc
+
+    conn = MagicMock()
+    conn.name = 'testconn'
+    conn.nick = 'TestBot'
+    conn.ready = True
+    conn.config = {'join_throttle': 0}
+    conn.channels = ["#foo", "#bar key"]
+    conn.send_queue = None
+    conn.memory = {'server_info': {'isupport_tokens': {}}}
+
+    asyncio.get_event_loop().run_until_complete(core_misc.do_joins(conn))
+
+    assert [call[0][0] for call in conn.send.call_args_list] == ["JOIN #bar,#foo key"]
+    assert conn.channels == ["#foo", "#bar key"]
@@ -0,0 +1,117 @@
+from threading import Thread
+from unittest.mock import MagicMock
+
+import pytest
+
+from plugins import hook_stats
+
+
+@pytest.fixture()
+def stats_db(mock_db):
+    hook_stats.stats_table.create(mock_db.engine)
+    hook_stats.pending.drain()
+    db = mock_db.session()
+    yield db
+    db.close()
+
+
+def make_hook(title, name):
+    _hook = MagicMock()
+    _hook.plugin.title = title
+    _hook.function_name = name
+    return _hook
+
+
+def make_bot():
+    bot = MagicMock()
+    bot.config = {}
+    return bot
+
+
+def test_flush(stats_db):
+    foo = make_hook('test', 'foo')
+    bar = make_hook('test', 'bar')
+    bot = make_bot()
+
+    hook_stats.record_launch(foo, 'TestNet', '#Chan', 'success')
+    hook_stats.record_launch(foo, 'TestNet', '#chan', 'success')
+    hook_stats.record_launch(bar, None, None, 'success')
+    hook_stats.record_launch(bar, 'testnet', None, 'failure')
+    assert hook_stats.flush_to_db(bot, stats_db, now=3600) == 3
+
+    hook_stats.record_launch(foo, 'testnet', '#chan', 'success')
+    assert hook_stats.flush_to_db(bot, stats_db, now=3630) == 1
+    assert hook_stats.flush_to_db(bot, stats_db, now=3630) == 0
+
+    assert hook_stats.do_global_stats(stats_db)[1] == [('test.foo', '3', '0'), ('test.bar', '1', '1')]
+    assert hook_stats.do_network_stats(stats_db, 'TESTNET')[1] == [('test.foo', '3', '0'), ('test.bar', '0', '1')]
+    assert hook_stats.do_channel_stats(stats_db, 'testnet', '#CHAN')[1] == [('test.foo', '3', '0')]
+    assert hook_stats.do_hook_stats(stats_db, 'test.foo')[1] == [('testnet', '#chan', '3', '0')]
+
+    _, history = hook_stats.do_history_stats(stats_db, 'minute', 'test.foo')
+    assert history == [('1970-01-01 01:00', '3', '0')]
+
+    _, history = hook_stats.do_history_stats(stats_db, 'hour', 'test.foo')
+    assert history == [('1970-01-01 01:00', '3', '0')]
+
+
+def test_prune(stats_db):
+    foo = make_hook('test', 'foo')
+    bot = make_bot()
+    bot.config = {'hook_stats': {'retention': {'minute': 60}}}
+
+    hook_stats.record_launch(foo, None, None, 'success')
+    hook_stats.flush_to_db(bot, stats_db, now=0)
+    hook_stats.record_launch(foo, None, None, 'success')
+    hook_stats.flush_to_db(bot, stats_db, now=120)
+
+    _, history = hook_stats.do_history_stats(stats_db, 'minute', 'test.foo')
+    assert [row[0] for row in history] == ['1970-01-01 00:02']
+    assert hook_stats.do_global_stats(stats_db)[1] == [('test.foo', '2', '0')]
+
+
+def test_flush_error_keeps_counts():
+    foo = make_hook('test', 'foo')
+    hook_stats.pending.drain()
+    hook_stats.record_launch(foo, None, None, 'success')
+
+    db = MagicMock()
+    db.execute.side_effect = ValueError()
+    with pytest.raises(ValueError):
+        hook_stats.flush_to_db(make_bot(), db)
+
+    db.rollback.assert_called_once()
+    assert hook_stats.pending.drain() == [(('test.foo', '', ''), (1, 0))]
+
+
+def test_stats_sieve():
+    foo = make_hook('test', 'foo')
+    hook_stats.pending.drain()
+    event = MagicMock(chan='#Chan')
+    event.conn.name = 'TestNet'
+
+    # Every launch is counted, however many there are between flushes
+    for _ in range(20000):
+        hook_stats.stats_sieve(event, None, foo)
+
+    hook_stats.stats_sieve(event, (ValueError, ValueError(), None), foo)
+    assert hook_stats.pending.drain() == [(('test.foo', 'testnet', '#chan'), (20000, 1))]
+
+
+def test_flush_serialized():
+    foo = make_hook('test', 'foo')
+    hook_stats.pending.drain()
+    hook_stats.record_launch(foo, None, None, 'success')
+
+    db = MagicMock()
+    with hook_stats.flush_lock:
+        thread = Thread(target=hook_stats.flush_to_db, args=(make_bot(), db))
+        thread.start()
+        thread.join(0.1)
+        # The counts aren't taken until the running flush finishes
+        assert thread.is_alive()
+        db.execute.assert_not_called()
+
+    thread.join()
+    db.commit.assert_called_once()
+    assert hook_stats.pending.drain() == []
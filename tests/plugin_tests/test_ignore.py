@@ -0,0 +1,104 @@
+import pytest
+
+from cloudbot.util.casemap import ASCII, get_casemap
+from plugins import ignore
+
+
+@pytest.fixture()
+def ignore_db(mock_db):
+    ignore.table.create(mock_db.engine)
+    db = mock_db.session()
+    ignore.load_cache(db)
+    yield db
+    db.close()
+    ignore.ignore_cache.clear()
+
+
+def test_ignore_index():
+    index = ignore.IgnoreIndex()
+    index.add('net', '#chan', '*!*@Host.example.com')
+    index.add('net', '#other', 'nick!user@host')
+    index.add('othernet', '*', 'spam!*@*')
+
+    assert index.is_ignored('net', '#chan', 'nick!user@host.example.com')
+    assert not index.is_ignored('net', '#other', 'nick!user@host.example.com')
+    assert not index.is_ignored('othernet', '#chan', 'nick!user@host.example.com')
+    assert index.is_ignored('net', '#other', 'Nick!User@Host')
+    # Global ignores apply to every connection
+    assert index.is_ignored('net', '#any', 'SPAM!x@y')
+    assert len(index) == 3
+
+    index.remove('net', '#chan', '*!*@Host.example.com')
+    assert not index.is_ignored('net', '#chan', 'nick!user@host.example.com')
+    assert ('net', '#chan') not in index.get_indexes(get_casemap())[1]
+
+    index.remove('othernet', '*', 'spam!*@*')
+    assert not index.is_ignored('net', '#any', 'spam!x@y')
+
+
+def test_ignore_index_case():
+    index = ignore.IgnoreIndex()
+    index.add('net', '#chan', 'Foo!*@*')
+    index.add('net', '#chan', 'foo!*@*')
+
+    # Both masks are stored, the entry stays until the last of them is removed
+    index.remove('net', '#chan', 'foo!*@*')
+    assert index.is_ignored('net', '#chan', 'foo!user@host')
+
+    index.remove('net', '#chan', 'FOO!*@*')
+    assert index.is_ignored('net', '#chan', 'foo!user@host')
+
+    index.remove('net', '#chan', 'Foo!*@*')
+    assert not index.is_ignored('net', '#chan', 'foo!user@host')
+    assert not index.entries
+
+
+def test_ignore_index_casemap():
+    index = ignore.IgnoreIndex()
+    index.add('net', '#Chan[1]', 'Nick[m]!*@*')
+
+    rfc1459 = get_casemap()
+    assert index.is_ignored('net', '#chan{1}', 'nick{m}!user@host', rfc1459)
+    # Already folded channels, as in an event's folded_chan, match the same
+    assert index.is_ignored('net', rfc1459.fold('#Chan[1]'), 'NICK[M]!user@host', rfc1459)
+
+    ascii_map = get_casemap(ASCII)
+    assert index.is_ignored('net', '#chan[1]', 'nick[m]!user@host', ascii_map)
+    assert not index.is_ignored('net', '#chan{1}', 'nick[m]!user@host', ascii_map)
+    assert not index.is_ignored('net', '#chan[1]', 'nick{m}!user@host', ascii_map)
+
+
+def test_ignore_cache():
+    index = ignore.IgnoreIndex()
+    assert not index.is_ignored('net', '#chan', 'nick!user@host')
+    assert not index.is_ignored('net', '#chan', 'nick!user@host')
+    assert index._check.cache_info().hits == 1
+
+    # Cached negative results are dropped when an ignore is added
+    index.add('net', '#chan', 'nick!*@*')
+    assert index.is_ignored('net', '#chan', 'nick!user@host')
+
+    index.load([('net', '*', '*!*@host')])
+    assert index.is_ignored('net', '#other', 'other!user@host')
+    assert not index.is_ignored('net', '#chan', 'nick!user@elsewhere')
+
+
+def test_add_remove(ignore_db):
+    ignore.add_ignore(ignore_db, 'net', '#chan', 'nick!*@*')
+    ignore.add_ignore(ignore_db, 'net', '*', '*!*@spam.host')
+    assert ignore.is_ignored('net', '#chan', 'nick!user@host')
+    assert ignore.is_ignored('net', '#other', 'bot!bot@spam.host')
+
+    ignore.add_ignore(ignore_db, 'net', '#chan', 'Other!*@*')
+    ignore.add_ignore(ignore_db, 'net', '#chan', 'other!*@*')
+    ignore.remove_ignore(ignore_db, 'net', '#chan', 'other!*@*')
+    assert ignore.is_ignored('net', '#chan', 'other!user@host')
+
+    ignore.remove_ignore(ignore_db, 'net', '#chan', 'nick!*@*')
+    assert not ignore.is_ignored('net', '#chan', 'nick!user@host')
+
+    # The index matches what a fresh load from the database gives
+    ignore.load_cache(ignore_db)
+    assert not ignore.is_ignored('net', '#chan', 'nick!user@host')
+    assert ignore.is_ignored('net', '#chan', 'other!user@host')
+    assert ignore.is_ignored('net', '#other', 'bot!bot@spam.host')
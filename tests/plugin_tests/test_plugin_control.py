@@ -0,0 +1,50 @@
+import asyncio
+
+from mock import MagicMock
+
+from cloudbot.util.task_registry import TaskRegistry
+
+
+def make_plugin(title):
+    plugin = MagicMock()
+    plugin.title = title
+    plugin.tasks = TaskRegistry()
+    return plugin
+
+
+def make_bot(*plugins):
+    bot = MagicMock()
+    bot.plugin_manager.plugins = {plugin.title + '.py': plugin for plugin in plugins}
+    bot.plugin_manager.find_plugin = {plugin.title: plugin for plugin in plugins}.get
+    return bot
+
+
+def test_plugintasks(patch_paste):
+    from plugins.core.plugin_control import plugintasks
+
+    loop = asyncio.get_event_loop()
+    idle = make_plugin('idle')
+    busy = make_plugin('busy')
+    bot = make_bot(idle, busy)
+
+    task = busy.tasks.add(asyncio.ensure_future(asyncio.sleep(10)))
+    loop.run_until_complete(asyncio.sleep(0))
+    try:
+        assert plugintasks(bot, 'idle') == "No tasks running in idle."
+        assert plugintasks(bot, 'missing') == "Plugin not loaded."
+        patch_paste.assert_not_called()
+
+        assert plugintasks(bot, ' busy ') is patch_paste.return_value
+        table = patch_paste.call_args[0][0]
+        assert repr(task) in table
+
+        plugintasks(bot, '')
+        table = patch_paste.call_args[0][0]
+        rows = [line for line in table.splitlines() if 'busy' in line or 'idle' in line]
+        # Plugins with in-flight tasks are listed first
+        assert [row.split('|')[1].strip() for row in rows] == ['busy', 'idle']
+        assert [cell.strip() for cell in rows[0].split('|')[2:6]] == ['1', '1', '0', '0']
+        assert [cell.strip() for cell in rows[1].split('|')[2:6]] == ['0', '0', '0', '0']
+    finally:
+        task.cancel()
+        loop.run_until_complete(asyncio.wait([task]))
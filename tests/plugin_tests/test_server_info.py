@@ -0,0 +1,115 @@
+import asyncio
+
+from mock import MagicMock
+
+from cloudbot.util.casemap import get_casemap
+
+
+def make_conn(tokens=None):
+    conn = MagicMock()
+    conn.name = 'testconn'
+    conn.nick = 'TestBot'
+    conn.casemap = get_casemap()
+    conn.config = {}
+    conn.channels = []
+    conn.send_queue = None
+    conn.memory = {'server_info': {'isupport_tokens': tokens or {}}}
+    return conn
+
+
+def test_plan_joins_line_length():
+    from plugins.core.server_info import plan_joins
+
+    channels = ["#channel{:03d}".format(i) for i in range(100)]
+    lines = plan_joins(channels, line_length=100)
+
+    assert all(len(line) <= 100 for line in lines)
+    assert len(lines) == 13
+    assert len(lines[0]) == 100
+    assert [name for line in lines for name in line[5:].split(',')] == channels
+
+
+def test_plan_joins_keys():
+    from plugins.core.server_info import plan_joins
+
+    assert plan_joins(["#a", "#b key1", "#c  ", "#d key2"]) == ["JOIN #b,#d,#a,#c key1,key2"]
+    assert plan_joins([]) == []
+
+
+def test_join_limits():
+    from plugins.core.server_info import get_join_limits
+
+    conn = make_conn({'TARGMAX': 'PRIVMSG:4,JOIN:10', 'MAXTARGETS': '4', 'LINELEN': '1024', 'CHANLIMIT': '#:100'})
+    assert get_join_limits(conn) == (10, 510, [('#', 100)])
+
+    conn = make_conn({'MAXTARGETS': '4', 'LINELEN': '300'})
+    assert get_join_limits(conn) == (4, 298, [])
+
+    assert get_join_limits(make_conn()) == (None, 510, [])
+
+
+def test_join_channels():
+    from plugins.core.server_info import join_channels, on_join, on_join_error
+
+    conn = make_conn({'TARGMAX': 'JOIN:2'})
+    conn.config['join_throttle'] = 0
+    asyncio.get_event_loop().run_until_complete(join_channels(conn, ["#a", "#b", "#C"]))
+
+    assert [call[0][0] for call in conn.send.call_args_list] == ["JOIN #a,#b", "JOIN #C"]
+    assert conn.channels == ["#a", "#b", "#C"]
+    assert conn.memory["join_count"] == 3
+
+    on_join(conn, "#a", "testbot", conn.casemap)
+    on_join(conn, "#b", "SomeoneElse", conn.casemap)
+    on_join_error(conn, ["TestBot", "#c", "Cannot join channel (+i)"])
+    assert list(conn.memory["pending_joins"]) == ["#b"]
+
+    on_join(conn, "#b", "TestBot", conn.casemap)
+    assert not conn.memory["pending_joins"]
+
+
+def test_join_channels_casemap():
+    from plugins.core.server_info import join_channels, on_join
+
+    conn = make_conn()
+    conn.nick = 'Test[Bot]'
+    asyncio.get_event_loop().run_until_complete(join_channels(conn, ["#Chan[1]", "#other"]))
+
+    on_join(conn, "#chan{1}", "test{bot}", conn.casemap)
+    assert list(conn.memory["pending_joins"]) == ["#other"]
+
+
+def test_join_channels_left():
+    from plugins.core.server_info import clear_isupport, join_channels, on_disconnect, on_leave
+
+    conn = make_conn()
+    conn.server = 'irc.example.com'
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(join_channels(conn, ["#a", "#b", "#c", "#d"]))
+
+    # Leaving a channel before the server confirms the join stops waiting for it
+    on_leave(conn, "#a", "TestBot", 'PART', ["#a"], conn.casemap)
+    on_leave(conn, "#b", "Op", 'KICK', ["#b", "SomeoneElse"], conn.casemap)
+    on_leave(conn, "#c", "Op", 'KICK', ["#c", "testbot", "Bye"], conn.casemap)
+    assert list(conn.memory["pending_joins"]) == ["#b", "#d"]
+
+    on_disconnect(conn)
+    assert "pending_joins" not in conn.memory
+
+    loop.run_until_complete(join_channels(conn, ["#a"]))
+    clear_isupport(conn)
+    assert "pending_joins" not in conn.memory
+
+
+def test_join_channels_chanlimit():
+    from plugins.core.server_info import join_channels, on_join_error
+
+    conn = make_conn({'CHANLIMIT': '#:2'})
+    asyncio.get_event_loop().run_until_complete(join_channels(conn, ["#a", "#b key", "#c", "&d"]))
+
+    assert [call[0][0] for call in conn.send.call_args_list] == ["JOIN #b,#a,&d key"]
+    assert conn.channels == ["#a", "#b key", "&d"]
+
+    on_join_error(conn, ["TestBot", "#a", "Bad channel mask"])
+    on_join_error(conn, ["TestBot", "#b", "Cannot join channel (+k)"])
+    assert list(conn.memory["pending_joins"]) == ["&d"]